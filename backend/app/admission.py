@@ -0,0 +1,173 @@
+import os
+import math
+import time
+import threading
+import kernels
+from decomposition import DECOMPOSITION_THRESHOLD
+from worker_pool import SERVER_WORKERS
+
+# Requests estimated above this many ms go to the bulk lane
+INTERACTIVE_MAX_COST_MS = float(os.environ.get('INTERACTIVE_MAX_COST_MS', '5000'))
+# Typical time for one road leg lookup, the dominant cost of scoring a candidate
+ROUTING_LEG_MS = float(os.environ.get('ROUTING_LEG_MS', '50'))
+# Heuristic alternatives, calibrated on one core with uniform random stops: every
+# construction and the 2-opt pass run on one shared matrix, roughly linear plus a
+# small quadratic term; the NumPy fallbacks are several times slower than the kernels
+HEURISTIC_MS_PER_STOP = 0.06 if kernels.ENABLED else 0.25
+HEURISTIC_MS_PER_STOP_SQUARED = 3e-4 if kernels.ENABLED else 5e-4
+# Clustering plus per-cluster construction above DECOMPOSITION_THRESHOLD
+DECOMPOSITION_MS_PER_STOP = 0.09 if kernels.ENABLED else 1.4
+# Candidates that typically survive bound pruning and need road routing
+ROUTED_CANDIDATES = 2
+
+def worker_share(total):
+    """This server process's share of a node-wide limit"""
+    return max(1, math.ceil(total / SERVER_WORKERS))
+
+# Workers publish their lane stats this often (seconds) when there is a shared cache
+STATS_PUBLISH_S = float(os.environ.get('ADMISSION_STATS_PUBLISH_S', '1'))
+
+# Slots and queue lengths are for the whole node; each server worker enforces an equal share
+LANE_DEFAULTS = {
+    # name: (concurrent slots, queue length, max wait in the queue in seconds)
+    'interactive': (worker_share(int(os.environ.get('ADMISSION_INTERACTIVE_SLOTS', '8'))),
+                    worker_share(int(os.environ.get('ADMISSION_INTERACTIVE_QUEUE', '32'))),
+                    float(os.environ.get('ADMISSION_INTERACTIVE_WAIT_S', '2'))),
+    'bulk': (worker_share(int(os.environ.get('ADMISSION_BULK_SLOTS', '2'))),
+             worker_share(int(os.environ.get('ADMISSION_BULK_QUEUE', '8'))),
+             float(os.environ.get('ADMISSION_BULK_WAIT_S', '30')))
+}
+
+class Overloaded(Exception):
+    """Request rejected because its lane is saturated"""
+
+    def __init__(self, lane, retry_after):
+        super().__init__(f"{lane} lane is saturated, retry in {retry_after}s")
+        self.lane = lane
+        self.retry_after = retry_after
+
+def estimate_cost(n_stops, time_budget_ms=None, metaheuristic=None, candidates=ROUTED_CANDIDATES):
+    """Rough wall-clock cost (ms) of an optimize request from its shape
+
+    Road routing of the candidates dominates at every size; the heuristics
+    add a few ms up to DECOMPOSITION_THRESHOLD and decomposition beyond it.
+    """
+    legs = max(n_stops - 1, 0)
+    if time_budget_ms is not None or metaheuristic is not None:
+        # Search returns a single tour, so only one candidate is routed
+        search_ms = time_budget_ms if time_budget_ms is not None else 1000.0
+        return search_ms + legs * ROUTING_LEG_MS
+    if n_stops > DECOMPOSITION_THRESHOLD:
+        search_ms = n_stops * DECOMPOSITION_MS_PER_STOP
+    else:
+        search_ms = HEURISTIC_MS_PER_STOP * n_stops + HEURISTIC_MS_PER_STOP_SQUARED * n_stops ** 2
+    return search_ms + candidates * legs * ROUTING_LEG_MS
+
+def lane_for(cost_ms):
+    return 'interactive' if cost_ms <= INTERACTIVE_MAX_COST_MS else 'bulk'
+
+class Lane:
+    """Bounded concurrency plus a bounded wait queue for one traffic class"""
+
+    def __init__(self, name, slots, max_queue, max_wait_s):
+        self.name = name
+        self.slots = slots
+        self.max_queue = max_queue
+        self.max_wait_s = max_wait_s
+        self.running = 0
+        self.waiting = 0
+        self.peak_waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        # Smoothed service time drives the Retry-After hint
+        self.service_ms = None
+        self._ready = threading.Condition()
+
+    def retry_after(self):
+        service_s = (self.service_ms or 1000.0) / 1000.0
+        return max(1, math.ceil(service_s * (self.waiting + 1) / self.slots))
+
+    def acquire(self):
+        with self._ready:
+            if self.running >= self.slots:
+                if self.waiting >= self.max_queue:
+                    self.rejected += 1
+                    raise Overloaded(self.name, self.retry_after())
+                self.waiting += 1
+                self.peak_waiting = max(self.peak_waiting, self.waiting)
+                deadline = time.monotonic() + self.max_wait_s
+                try:
+                    while self.running >= self.slots:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0 or not self._ready.wait(remaining):
+                            if self.running >= self.slots:
+                                self.timed_out += 1
+                                raise Overloaded(self.name, self.retry_after())
+                finally:
+                    self.waiting -= 1
+            self.running += 1
+            self.admitted += 1
+
+    def release(self, elapsed_ms):
+        with self._ready:
+            self.running -= 1
+            self.service_ms = elapsed_ms if self.service_ms is None else 0.8 * self.service_ms + 0.2 * elapsed_ms
+            self._ready.notify()
+
+    def stats(self):
+        with self._ready:
+            return {
+                'slots': self.slots,
+                'running': self.running,
+                'queue_depth': self.waiting,
+                'queue_limit': self.max_queue,
+                'peak_queue_depth': self.peak_waiting,
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+                'timed_out': self.timed_out,
+                'service_ms': round(self.service_ms, 1) if self.service_ms is not None else None
+            }
+
+class AdmissionController:
+    """Routes requests into interactive or bulk lanes by estimated cost
+
+    Bulk work has its own few slots, so a burst of large plans queues (or is
+    turned away) behind itself instead of starving drivers' small requests.
+    """
+
+    def __init__(self, lanes=LANE_DEFAULTS):
+        self.lanes = {name: Lane(name, *config) for name, config in lanes.items()}
+
+    def acquire(self, cost_ms):
+        """Block until the request's lane has a slot; raises Overloaded when it can't get one"""
+        lane = self.lanes[lane_for(cost_ms)]
+        lane.acquire()
+        return lane
+
+    def stats(self):
+        return {name: lane.stats() for name, lane in self.lanes.items()}
+
+    def start_publisher(self, shared, interval=STATS_PUBLISH_S):
+        """Publish this worker's lane stats to the shared cache so any worker can report the node"""
+        def publish():
+            while True:
+                shared.put_worker_stats('admission', self.stats())
+                time.sleep(interval)
+
+        threading.Thread(target=publish, daemon=True).start()
+
+    def node_stats(self, shared, interval=STATS_PUBLISH_S):
+        """Lane stats summed over every worker that has published recently, this one included"""
+        workers = shared.worker_stats('admission', max_age=3 * interval)
+        workers[os.getpid()] = self.stats()
+        node = {}
+        for name in self.lanes:
+            lanes = [stats[name] for stats in workers.values() if name in stats]
+            service = [lane['service_ms'] for lane in lanes if lane['service_ms'] is not None]
+            node[name] = {
+                **{key: sum(lane[key] for lane in lanes) for key in lanes[0] if key != 'service_ms'},
+                'service_ms': round(sum(service) / len(service), 1) if service else None,
+                'workers': len(lanes)
+            }
+        return node
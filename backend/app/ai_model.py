@@ -1,3 +1,4 @@
+import os
 import torch
 import torch.nn as nn
 from utils import haversine_distance
@@ -6,19 +7,27 @@ import joblib
 import numpy as np
 
 class RouteScorer(nn.Module):
-    def __init__(self):
+    def __init__(self, hidden_sizes=(16, 8), input_size=5):
         super(RouteScorer, self).__init__()
-        self.net = nn.Sequential(
-            nn.Linear(5, 16),
-            nn.ReLU(),
-            nn.Linear(16, 8),
-            nn.ReLU(),
-            nn.Linear(8, 1)
-        )
+        # Linear/ReLU pairs keep the original layer indices for (16, 8)
+        layers = []
+        previous = input_size
+        for width in hidden_sizes:
+            layers.append(nn.Linear(previous, width))
+            layers.append(nn.ReLU())
+            previous = width
+        layers.append(nn.Linear(previous, 1))
+        self.hidden_sizes = tuple(hidden_sizes)
+        self.net = nn.Sequential(*layers)
 
     def forward(self, x):
         return self.net(x)
 
+def hidden_sizes_from_state(state_dict):
+    """Recover the hidden layer widths from a saved state dict"""
+    weights = [v for k, v in state_dict.items() if k.startswith('net.') and k.endswith('.weight')]
+    return tuple(w.shape[0] for w in weights[:-1])
+
 def route_features(route, vehicle_type, traffic_level=0.5):
     """Extract features for CO2 prediction using real traffic analysis"""
     
@@ -52,12 +61,18 @@ def route_features(route, vehicle_type, traffic_level=0.5):
     
     return features, traffic_analysis
 
-def load_model_with_scaler():
+MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def load_model_with_scaler(model_path=os.path.join(MODEL_DIR, "route_scorer.pt"),
+                           scaler_path=os.path.join(MODEL_DIR, "feature_scaler.pkl")):
     """Load trained model and scaler"""
     model = RouteScorer()
     try:
-        model.load_state_dict(torch.load("route_scorer.pt", weights_only=True))
-        scaler = joblib.load('feature_scaler.pkl')
+        state = torch.load(model_path, weights_only=True)
+        # Sweeps may have picked a different architecture
+        model = RouteScorer(hidden_sizes_from_state(state))
+        model.load_state_dict(state)
+        scaler = joblib.load(scaler_path)
         model.eval()
         print("✅ Loaded trained model and scaler")
         return model, scaler
@@ -0,0 +1,70 @@
+import time
+import numpy as np
+from utils import haversine_matrix
+from local_search import tour_length, start_tour, local_search, double_bridge, EPS
+from time_windows import WARP_EPS
+
+def anytime_optimize(stops, time_budget_ms, seed=None, D=None, time_windows=None):
+    """Return the best tour found within the time budget
+
+    A nearest-neighbour tour is available almost immediately; the rest of the
+    budget goes to local search and iterated double-bridge kicks. Search stops
+    early once kicks stop paying off, so small manifests don't burn the budget.
+
+    With time_windows, tours are ranked by lateness first and length second,
+    and local search never takes a move that adds lateness.
+    """
+    start = time.perf_counter()
+    deadline = start + time_budget_ms / 1000.0
+    rng = np.random.default_rng(seed)
+    n = len(stops)
+
+    if D is None:
+        D = haversine_matrix(stops)
+
+    # Cheap construction first so there is always an answer
+    best = start_tour(D, time_windows) if n else np.arange(0, dtype=np.intp)
+    construction_length = tour_length(best, D)
+    best_length = construction_length
+    best_warp = time_windows.time_warp(best, D) if time_windows is not None else 0.0
+    iterations = 0
+    improvements = 0
+
+    if n >= 4:
+        best = local_search(best, D, deadline, time_windows)
+        best_length = tour_length(best, D)
+        if time_windows is not None:
+            best_warp = time_windows.time_warp(best, D)
+
+        # Iterated local search until the deadline or until kicks stall
+        max_stale = max(200, 20 * n)
+        stale = 0
+        while time.perf_counter() < deadline and stale < max_stale:
+            candidate = local_search(double_bridge(best, rng), D, deadline, time_windows)
+            candidate_length = tour_length(candidate, D)
+            candidate_warp = time_windows.time_warp(candidate, D) if time_windows is not None else 0.0
+            iterations += 1
+            if candidate_warp < best_warp - WARP_EPS or (
+                    candidate_warp <= best_warp + WARP_EPS and candidate_length < best_length - EPS):
+                best, best_length, best_warp = candidate, candidate_length, candidate_warp
+                improvements += 1
+                stale = 0
+            else:
+                stale += 1
+
+    used_ms = (time.perf_counter() - start) * 1000.0
+    return {
+        'tour': [int(i) for i in best],
+        'route': [stops[i] for i in best],
+        'length_km': best_length,
+        'stats': {
+            'time_budget_ms': time_budget_ms,
+            'used_ms': round(used_ms, 1),
+            'budget_used': round(min(used_ms / time_budget_ms, 1.0), 3) if time_budget_ms else 1.0,
+            'iterations': iterations,
+            'improvements': improvements,
+            'construction_length_km': round(construction_length, 3),
+            'final_length_km': round(best_length, 3),
+            **({'time_warp_minutes': round(best_warp, 1)} if time_windows is not None else {})
+        }
+    }
@@ -1,46 +1,50 @@
 import random
-from utils import haversine_distance
+from utils import haversine_distance, haversine_matrix, stop_coordinates
+from decomposition import decomposed_alternatives, DECOMPOSITION_THRESHOLD
+from insertion_heuristics import (farthest_insertion_tour, nearest_insertion_tour, cheapest_insertion_tour,
+                                  convex_hull_indices)
+from local_search import nearest_neighbor_tour, two_opt
 
 def create_route_alternatives(stops):
     """Create optimized route alternatives using proper TSP techniques"""
+    # The heuristics below are quadratic or worse; split bulk days into clusters first
+    if len(stops) > DECOMPOSITION_THRESHOLD:
+        return decomposed_alternatives(stops)
+
     routes = []
+    # One distance matrix shared by the insertion heuristics
+    D = haversine_matrix(stops)
     
     # Route 1: Nearest neighbor (greedy)
-    routes.append(nearest_neighbor_route(stops))
+    nn_tour = nearest_neighbor_tour(D) if len(stops) > 1 else list(range(len(stops)))
+    routes.append([stops[i] for i in nn_tour])
     
-    # Route 2: 2-opt improvement on nearest neighbor
-    nn_route = nearest_neighbor_route(stops)
-    routes.append(two_opt_improve(nn_route))
+    # Route 2: 2-opt improvement on nearest neighbor (works on a copy)
+    routes.append([stops[i] for i in two_opt(nn_tour, D)])
     
     # Route 3: Convex hull + insertion
-    routes.append(convex_hull_route(stops))
+    routes.append(convex_hull_route(stops, D))
     
     # Route 4: Farthest insertion
-    routes.append(farthest_insertion_route(stops))
+    routes.append(farthest_insertion_route(stops, D))
     
     # Route 5: Nearest insertion
-    routes.append(nearest_insertion_route(stops))
+    routes.append(nearest_insertion_route(stops, D))
     
     # Route 6: Highway bypass (Electronic City to Hebbal avoiding city)
     routes.append(create_highway_bypass(stops))
     
+    # Route 7: Cheapest insertion
+    routes.append(cheapest_insertion_route(stops, D))
+    
     return routes
 
-def nearest_neighbor_route(stops):
-    """Standard nearest neighbor algorithm"""
+def nearest_neighbor_route(stops, D=None):
+    """Standard nearest neighbor algorithm from the first stop, on a distance matrix"""
     if len(stops) <= 1:
         return stops
-    
-    unvisited = stops.copy()
-    route = [unvisited.pop(0)]
-    
-    while unvisited:
-        last = route[-1]
-        next_stop = min(unvisited, key=lambda s: haversine_distance(last, s))
-        route.append(next_stop)
-        unvisited.remove(next_stop)
-    
-    return route
+    D = haversine_matrix(stops) if D is None else D
+    return [stops[i] for i in nearest_neighbor_tour(D)]
 
 def create_outer_loop(stops):
     """Create a route that goes around the perimeter first"""
@@ -53,177 +57,56 @@ def create_outer_loop(stops):
     sorted_stops = sorted(stops, key=lambda s: haversine_distance(center, s), reverse=True)
     return sorted_stops
 
-def two_opt_improve(route):
-    """Improve route using 2-opt swaps"""
-    best_route = route.copy()
-    best_distance = calculate_total_distance(best_route)
-    improved = True
-    
-    while improved:
-        improved = False
-        for i in range(1, len(route) - 2):
-            for j in range(i + 1, len(route)):
-                if j - i == 1: continue
-                new_route = route.copy()
-                new_route[i:j] = route[i:j][::-1]
-                new_distance = calculate_total_distance(new_route)
-                if new_distance < best_distance:
-                    best_route = new_route
-                    best_distance = new_distance
-                    route = new_route
-                    improved = True
-    return best_route
+def two_opt_improve(route, D=None):
+    """Improve route using 2-opt swaps, first stop fixed
 
-def calculate_total_distance(route):
-    """Calculate total distance of a route"""
-    if len(route) < 2:
-        return 0
-    return sum(haversine_distance(route[i], route[i+1]) for i in range(len(route)-1))
+    D, when given, is the distance matrix of the route's stops in route order.
+    """
+    if len(route) < 4:
+        return list(route)
+    D = haversine_matrix(route) if D is None else D
+    return [route[i] for i in two_opt(range(len(route)), D)]
 
-def convex_hull_route(stops):
+def convex_hull_route(stops, D=None):
     """Create route using convex hull approach"""
     if len(stops) <= 3:
         return stops
     
-    # Find convex hull points
-    hull = convex_hull(stops)
-    interior = [s for s in stops if s not in hull]
-    
-    # Insert interior points optimally
-    route = hull.copy()
-    for point in interior:
-        best_pos = 0
-        best_increase = float('inf')
-        for i in range(len(route)):
-            # Calculate increase in distance if inserted at position i
-            if i == len(route) - 1:
-                increase = (haversine_distance(route[i], point) + 
-                           haversine_distance(point, route[0]) - 
-                           haversine_distance(route[i], route[0]))
-            else:
-                increase = (haversine_distance(route[i], point) + 
-                           haversine_distance(point, route[i+1]) - 
-                           haversine_distance(route[i], route[i+1]))
-            if increase < best_increase:
-                best_increase = increase
-                best_pos = i + 1
-        route.insert(best_pos, point)
-    
-    return route
+    # Hull on coordinate arrays, then interior points by global cheapest insertion
+    lats, lons = stop_coordinates(stops)
+    hull = convex_hull_indices(lats, lons)
+    D = haversine_matrix(stops) if D is None else D
+    return [stops[i] for i in cheapest_insertion_tour(D, hull)]
 
 def convex_hull(points):
-    """Find convex hull using Graham scan"""
-    def cross(o, a, b):
-        return (a['lat'] - o['lat']) * (b['lon'] - o['lon']) - (a['lon'] - o['lon']) * (b['lat'] - o['lat'])
-    
-    points = sorted(set([(p['lat'], p['lon']) for p in points]))
-    if len(points) <= 1:
-        return [{'lat': p[0], 'lon': p[1]} for p in points]
-    
-    # Build lower hull
-    lower = []
-    for p in points:
-        while len(lower) >= 2 and cross({'lat': lower[-2][0], 'lon': lower[-2][1]}, 
-                                       {'lat': lower[-1][0], 'lon': lower[-1][1]}, 
-                                       {'lat': p[0], 'lon': p[1]}) <= 0:
-            lower.pop()
-        lower.append(p)
-    
-    # Build upper hull
-    upper = []
-    for p in reversed(points):
-        while len(upper) >= 2 and cross({'lat': upper[-2][0], 'lon': upper[-2][1]}, 
-                                       {'lat': upper[-1][0], 'lon': upper[-1][1]}, 
-                                       {'lat': p[0], 'lon': p[1]}) <= 0:
-            upper.pop()
-        upper.append(p)
-    
-    return [{'lat': p[0], 'lon': p[1]} for p in lower[:-1] + upper[:-1]]
+    """Find convex hull using a monotone chain over coordinate arrays"""
+    lats, lons = stop_coordinates(points)
+    return [{'lat': float(lats[i]), 'lon': float(lons[i])} for i in convex_hull_indices(lats, lons)]
 
-def farthest_insertion_route(stops):
+def farthest_insertion_route(stops, D=None):
     """Farthest insertion TSP heuristic"""
     if len(stops) <= 2:
         return stops
     
-    # Start with two farthest points
-    max_dist = 0
-    start_pair = (0, 1)
-    for i in range(len(stops)):
-        for j in range(i+1, len(stops)):
-            dist = haversine_distance(stops[i], stops[j])
-            if dist > max_dist:
-                max_dist = dist
-                start_pair = (i, j)
-    
-    route = [stops[start_pair[0]], stops[start_pair[1]]]
-    remaining = [s for i, s in enumerate(stops) if i not in start_pair]
-    
-    while remaining:
-        # Find farthest point from current route
-        farthest_point = None
-        max_min_dist = 0
-        for point in remaining:
-            min_dist = min(haversine_distance(point, r) for r in route)
-            if min_dist > max_min_dist:
-                max_min_dist = min_dist
-                farthest_point = point
-        
-        # Insert at best position
-        best_pos = 0
-        best_increase = float('inf')
-        for i in range(len(route)):
-            next_i = (i + 1) % len(route)
-            increase = (haversine_distance(route[i], farthest_point) + 
-                       haversine_distance(farthest_point, route[next_i]) - 
-                       haversine_distance(route[i], route[next_i]))
-            if increase < best_increase:
-                best_increase = increase
-                best_pos = i + 1
-        
-        route.insert(best_pos, farthest_point)
-        remaining.remove(farthest_point)
-    
-    return route
+    # Distance-to-tour is maintained incrementally on the matrix, O(n^2) overall
+    D = haversine_matrix(stops) if D is None else D
+    return [stops[i] for i in farthest_insertion_tour(D)]
 
-def nearest_insertion_route(stops):
+def nearest_insertion_route(stops, D=None):
     """Nearest insertion TSP heuristic"""
     if len(stops) <= 2:
         return stops
     
-    # Start with first point
-    route = [stops[0]]
-    remaining = stops[1:]
-    
-    while remaining:
-        # Find nearest point to current route
-        nearest_point = None
-        min_dist = float('inf')
-        for point in remaining:
-            dist = min(haversine_distance(point, r) for r in route)
-            if dist < min_dist:
-                min_dist = dist
-                nearest_point = point
-        
-        # Insert at best position
-        if len(route) == 1:
-            route.append(nearest_point)
-        else:
-            best_pos = 0
-            best_increase = float('inf')
-            for i in range(len(route)):
-                next_i = (i + 1) % len(route)
-                increase = (haversine_distance(route[i], nearest_point) + 
-                           haversine_distance(nearest_point, route[next_i]) - 
-                           haversine_distance(route[i], route[next_i]))
-                if increase < best_increase:
-                    best_increase = increase
-                    best_pos = i + 1
-            
-            route.insert(best_pos, nearest_point)
-        
-        remaining.remove(nearest_point)
+    D = haversine_matrix(stops) if D is None else D
+    return [stops[i] for i in nearest_insertion_tour(D)]
+
+def cheapest_insertion_route(stops, D=None):
+    """Cheapest insertion TSP heuristic, starting from the first stop"""
+    if len(stops) <= 2:
+        return stops
     
-    return route
+    D = haversine_matrix(stops) if D is None else D
+    return [stops[i] for i in cheapest_insertion_tour(D)]
 
 def create_highway_bypass(stops):
     """Create highway route: Electronic City → Hebbal → others (avoiding city center)"""
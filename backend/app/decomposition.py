@@ -0,0 +1,175 @@
+import os
+import time
+import numpy as np
+from utils import stop_coordinates, haversine_matrix_from_coords, haversine_pairs
+from local_search import nearest_neighbor_tour, local_search, two_opt, or_opt, tour_length, EPS
+from worker_pool import get_process_pool
+
+# Inputs above this size are split into clusters instead of solved whole
+DECOMPOSITION_THRESHOLD = int(os.environ.get('DECOMPOSITION_THRESHOLD', '300'))
+# Target stops per cluster; the per-cluster matrix and search stay small at this size
+CLUSTER_SIZE = int(os.environ.get('CLUSTER_SIZE', '150'))
+# Positions either side of a cluster boundary that stitching repair may touch
+BOUNDARY_RADIUS = 10
+
+PARTITION_METHODS = ('kmeans', 'hilbert')
+
+def _project(lats, lons):
+    """Equirectangular projection to km; accurate enough for partitioning a city"""
+    lat0 = np.radians(lats.mean())
+    x = np.radians(lons) * 6371 * np.cos(lat0)
+    y = np.radians(lats) * 6371
+    return np.column_stack((x, y))
+
+def kmeans_partition(xy, k, rng, iterations=25):
+    """Cluster labels from k-means++ seeding and Lloyd iterations"""
+    n = len(xy)
+    centers = np.empty((k, 2))
+    centers[0] = xy[rng.integers(n)]
+    closest = ((xy - centers[0]) ** 2).sum(axis=1)
+    for c in range(1, k):
+        # Next seed drawn proportional to squared distance from the chosen ones
+        total = closest.sum()
+        pick = rng.choice(n, p=closest / total) if total > 0 else rng.integers(n)
+        centers[c] = xy[pick]
+        closest = np.minimum(closest, ((xy - centers[c]) ** 2).sum(axis=1))
+
+    labels = np.full(n, -1)
+    for _ in range(iterations):
+        d2 = ((xy[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2)
+        new_labels = np.argmin(d2, axis=1)
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        counts = np.bincount(labels, minlength=k)
+        sums = np.zeros((k, 2))
+        np.add.at(sums, labels, xy)
+        filled = counts > 0
+        centers[filled] = sums[filled] / counts[filled, None]
+    # Empty clusters simply drop out
+    _, labels = np.unique(labels, return_inverse=True)
+    return labels
+
+def _hilbert_index(x, y, order):
+    """Position of integer grid points along a Hilbert curve of side 2**order"""
+    x, y = x.astype(np.int64), y.astype(np.int64)
+    d = np.zeros(len(x), dtype=np.int64)
+    side = 1 << order
+    s = side >> 1
+    while s > 0:
+        rx = (x & s) > 0
+        ry = (y & s) > 0
+        d += s * s * ((3 * rx) ^ ry)
+        # Rotate the quadrant so the curve stays continuous
+        flip = ~ry
+        swap_x = flip & rx
+        x = np.where(swap_x, side - 1 - x, x)
+        y = np.where(swap_x, side - 1 - y, y)
+        x, y = np.where(flip, y, x), np.where(flip, x, y)
+        s >>= 1
+    return d
+
+def hilbert_partition(xy, cluster_size, order=16):
+    """Cluster labels from equal-sized runs along a Hilbert curve"""
+    span = np.ptp(xy, axis=0)
+    scale = ((1 << order) - 1) / np.where(span > 0, span, 1.0)
+    grid = ((xy - xy.min(axis=0)) * scale).astype(np.int64)
+    order_along_curve = np.argsort(_hilbert_index(grid[:, 0], grid[:, 1], order), kind='stable')
+    labels = np.empty(len(xy), dtype=np.intp)
+    labels[order_along_curve] = np.arange(len(xy)) // cluster_size
+    return labels
+
+def _cluster_order(centroid_lats, centroid_lons, first):
+    """Visit order of clusters: NN plus local search over centroids, starting at `first`"""
+    k = len(centroid_lats)
+    order = np.concatenate(([first], np.delete(np.arange(k), first)))
+    D = haversine_matrix_from_coords(centroid_lats[order], centroid_lons[order])
+    return order[local_search(nearest_neighbor_tour(D), D)]
+
+def _solve_cluster(lats, lons, entry):
+    """Worker entry: path through one cluster starting at its entry stop (local indices)"""
+    D = haversine_matrix_from_coords(lats, lons)
+    tour = local_search(nearest_neighbor_tour(D, entry), D)
+    return [int(i) for i in tour]
+
+def _repair_boundary(tour, lats, lons, position, radius):
+    """2-opt/Or-opt on the stops around one boundary, with both ends of the window fixed"""
+    lo, hi = max(0, position - radius), min(len(tour), position + radius)
+    nodes = tour[lo:hi]
+    if len(nodes) < 4:
+        return 0.0
+    D = haversine_matrix_from_coords(lats[nodes], lons[nodes])
+    local = np.arange(len(nodes))
+    window = (1, len(nodes) - 2)
+    best_length = before = tour_length(local, D)
+    while True:
+        local = or_opt(two_opt(local, D, window=window), D, window=window)
+        length = tour_length(local, D)
+        if length >= best_length - EPS:
+            break
+        best_length = length
+    tour[lo:hi] = nodes[local]
+    return before - best_length
+
+def decompose_route(stops, method='kmeans', cluster_size=CLUSTER_SIZE, seed=None):
+    """Cluster-first, route-second tour for very large stop sets
+
+    Stops are partitioned geographically, clusters are ordered by their
+    centroids, each cluster is solved in parallel from the stop closest to
+    the previous cluster, and the joins are repaired with windowed 2-opt.
+    The first stop stays first.
+    """
+    if method not in PARTITION_METHODS:
+        raise ValueError(f"Unknown partition method '{method}', expected one of {PARTITION_METHODS}")
+
+    start = time.perf_counter()
+    n = len(stops)
+    lats, lons = stop_coordinates(stops)
+    xy = _project(lats, lons)
+    k = max(1, -(-n // cluster_size))
+    if method == 'kmeans':
+        labels = kmeans_partition(xy, k, np.random.default_rng(seed))
+    else:
+        labels = hilbert_partition(xy, cluster_size)
+    k = int(labels.max()) + 1
+
+    counts = np.bincount(labels, minlength=k)
+    centroid_lats = np.bincount(labels, weights=lats, minlength=k) / counts
+    centroid_lons = np.bincount(labels, weights=lons, minlength=k) / counts
+    order = _cluster_order(centroid_lats, centroid_lons, int(labels[0]))
+
+    # Entry stops: the depot for the first cluster, otherwise the stop nearest the previous centroid
+    members = [np.flatnonzero(labels == c) for c in order]
+    futures = []
+    for position, nodes in enumerate(members):
+        if position == 0:
+            entry = int(np.flatnonzero(nodes == 0)[0])
+        else:
+            prev = order[position - 1]
+            gaps = haversine_pairs(centroid_lats[prev], centroid_lons[prev], lats[nodes], lons[nodes])
+            entry = int(np.argmin(gaps))
+        futures.append(get_process_pool().submit(_solve_cluster, lats[nodes], lons[nodes], entry))
+    tour = np.concatenate([nodes[f.result()] for nodes, f in zip(members, futures)])
+
+    boundaries = np.cumsum([len(nodes) for nodes in members])[:-1]
+    boundary_gain = sum(_repair_boundary(tour, lats, lons, int(b), BOUNDARY_RADIUS) for b in boundaries)
+
+    length = float(haversine_pairs(lats[tour[:-1]], lons[tour[:-1]], lats[tour[1:]], lons[tour[1:]]).sum())
+    used_ms = (time.perf_counter() - start) * 1000.0
+    return {
+        'tour': [int(i) for i in tour],
+        'route': [stops[i] for i in tour],
+        'length_km': length,
+        'stats': {
+            'method': method,
+            'clusters': k,
+            'largest_cluster': int(counts.max()),
+            'boundary_gain_km': round(boundary_gain, 3),
+            'final_length_km': round(length, 3),
+            'used_ms': round(used_ms, 1)
+        }
+    }
+
+def decomposed_alternatives(stops, seed=None):
+    """One decomposed tour per partition method"""
+    return [decompose_route(stops, method, seed=seed)['route'] for method in PARTITION_METHODS]
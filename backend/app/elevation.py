@@ -0,0 +1,132 @@
+import os
+import math
+import threading
+import numpy as np
+from utils import haversine_pairs
+
+# Directory of SRTM-style .hgt tiles (N12E077.hgt, ...); elevation is off when unset
+DEM_DIR = os.environ.get('DEM_DIR')
+# Road geometry is resampled at this spacing (m) so long straight edges still cross the terrain
+SAMPLE_SPACING_M = float(os.environ.get('DEM_SAMPLE_SPACING_M', '30'))
+
+# .hgt voids are stored as this value
+VOID = -32768
+
+def tile_name(lat0, lon0):
+    """SRTM file name of the 1°x1° tile whose south-west corner is (lat0, lon0)"""
+    return (f"{'N' if lat0 >= 0 else 'S'}{abs(lat0):02d}"
+            f"{'E' if lon0 >= 0 else 'W'}{abs(lon0):03d}.hgt")
+
+class ElevationService:
+    """Terrain heights from local DEM tiles, sampled along road geometry
+
+    Tiles are raw big-endian int16 grids (1201x1201 or 3601x3601, north row
+    first) opened as read-only memory maps the first time a point falls in
+    them. Each tile is opened once per process and kept, missing ones too:
+    a mapping costs no memory until pages are read, and the page cache
+    shares those pages between forked workers. Sampling groups points by
+    tile and interpolates bilinearly in one vectorized pass per tile.
+    """
+
+    def __init__(self, directory, spacing_m=SAMPLE_SPACING_M):
+        self.directory = directory
+        self.spacing_m = spacing_m
+        self._tiles = {}
+        self._lock = threading.Lock()
+
+    def tile(self, lat0, lon0):
+        """Memory-mapped tile, or None when there is no usable file for it"""
+        key = (lat0, lon0)
+        with self._lock:
+            if key in self._tiles:
+                return self._tiles[key]
+            tile = None
+            path = os.path.join(self.directory, tile_name(lat0, lon0))
+            if os.path.exists(path):
+                size = int(round(math.sqrt(os.path.getsize(path) / 2)))
+                if size * size * 2 == os.path.getsize(path) and size > 1:
+                    tile = np.memmap(path, dtype='>i2', mode='r', shape=(size, size))
+                else:
+                    print(f"⚠️  Ignoring DEM tile {path}: not a square int16 grid")
+            self._tiles[key] = tile
+            return tile
+
+    def sample(self, lats, lons):
+        """Elevation (m) at each point; NaN over voids and where no tile is present"""
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        heights = np.full(len(lats), np.nan)
+        lat0 = np.floor(lats).astype(np.int64)
+        lon0 = np.floor(lons).astype(np.int64)
+        keys, inverse = np.unique((lat0 + 90) * 360 + (lon0 + 180), return_inverse=True)
+        order = np.argsort(inverse, kind='stable')
+        bounds = np.searchsorted(inverse[order], np.arange(len(keys) + 1))
+        for u in range(len(keys)):
+            idx = order[bounds[u]:bounds[u + 1]]
+            tile = self.tile(int(lat0[idx[0]]), int(lon0[idx[0]]))
+            if tile is None:
+                continue
+            last = len(tile) - 1
+            row = (lat0[idx] + 1 - lats[idx]) * last
+            col = (lons[idx] - lon0[idx]) * last
+            r = np.clip(np.floor(row).astype(np.intp), 0, last - 1)
+            c = np.clip(np.floor(col).astype(np.intp), 0, last - 1)
+            fr, fc = row - r, col - c
+            corners = [tile[r + dr, c + dc].astype(np.float64) for dr in (0, 1) for dc in (0, 1)]
+            z00, z01, z10, z11 = (np.where(z == VOID, np.nan, z) for z in corners)
+            heights[idx] = ((z00 * (1 - fc) + z01 * fc) * (1 - fr) +
+                            (z10 * (1 - fc) + z11 * fc) * fr)
+        return heights
+
+    def climb_descent(self, route_geometry):
+        """Metres climbed and descended on each leg of a RouteGeometry
+
+        Every edge is split into ceil(length / spacing) steps, all points of
+        the route are sampled in one batch, and the rises and falls are
+        summed per leg. Heights missing from the DEM count as flat.
+        """
+        legs = len(route_geometry.offsets) - 1
+        coordinates = route_geometry.coordinates
+        if legs <= 0 or len(coordinates) < 2:
+            return np.zeros(max(legs, 0)), np.zeros(max(legs, 0))
+        lons, lats = coordinates[:, 0], coordinates[:, 1]
+        lengths_m = haversine_pairs(lats[:-1], lons[:-1], lats[1:], lons[1:]) * 1000.0
+        steps = np.maximum(np.ceil(lengths_m / self.spacing_m), 1).astype(np.intp)
+        edge = np.repeat(np.arange(len(steps)), steps)
+        fraction = (np.arange(len(edge)) - (np.cumsum(steps) - steps)[edge]) / steps[edge]
+        sample_lats = np.append(lats[edge] + fraction * (lats[edge + 1] - lats[edge]), lats[-1])
+        sample_lons = np.append(lons[edge] + fraction * (lons[edge + 1] - lons[edge]), lons[-1])
+
+        rise = np.nan_to_num(np.diff(self.sample(sample_lats, sample_lons)))
+        # Edge j belongs to leg k when offsets[k] <= j < offsets[k + 1]
+        leg = np.searchsorted(route_geometry.offsets[1:], edge, side='right')
+        climb = np.bincount(leg, weights=np.maximum(rise, 0.0), minlength=legs)
+        descent = np.bincount(leg, weights=np.maximum(-rise, 0.0), minlength=legs)
+        return climb, descent
+
+    def stats(self):
+        with self._lock:
+            opened = sum(1 for tile in self._tiles.values() if tile is not None)
+            return {
+                'enabled': True,
+                'directory': self.directory,
+                'sample_spacing_m': self.spacing_m,
+                'tiles_opened': opened,
+                'tiles_missing': len(self._tiles) - opened
+            }
+
+_service = None
+_lock = threading.Lock()
+
+def get_elevation_service():
+    """Process-wide elevation service, or None when DEM_DIR is unset or missing"""
+    global _service
+    if DEM_DIR is None:
+        return None
+    with _lock:
+        if _service is None:
+            if not os.path.isdir(DEM_DIR):
+                print(f"⚠️  DEM_DIR {DEM_DIR} is not a directory; emissions ignore elevation")
+                return None
+            _service = ElevationService(DEM_DIR)
+        return _service
@@ -0,0 +1,144 @@
+import numpy as np
+
+# Axis labels for the emission tensors
+VEHICLE_TYPES = ['Car', 'Motorcycle', 'Truck', 'Bus']
+FUEL_TYPES = ['Electric', 'Hybrid', 'Petrol', 'Diesel']
+TRAFFIC_CONDITIONS = ['Free flow', 'Moderate', 'Heavy']
+ROUTE_TYPES = ['highway', 'dense_urban', 'suburban', 'rural', 'mixed', 'unknown']
+
+# Use distance as primary factor for CO2 calculation
+# CO2 is roughly proportional to distance
+BASE_CO2_PER_KM = {
+    'Car': 0.15,      # 150g CO2/km
+    'Motorcycle': 0.10, # 100g CO2/km
+    'Truck': 0.40,    # 400g CO2/km
+    'Bus': 0.55       # 550g CO2/km
+}
+
+FUEL_MULTIPLIERS = {
+    'Electric': 0.3,
+    'Hybrid': 0.7,
+    'Petrol': 1.0,
+    'Diesel': 1.1
+}
+
+# Traffic impact on efficiency
+TRAFFIC_MULTIPLIERS = {
+    'Free flow': 0.9,   # More efficient at highway speeds
+    'Moderate': 1.0,    # Baseline
+    'Heavy': 1.3        # Stop-and-go increases consumption
+}
+
+# Extra CO2 for lifting the vehicle uphill: kg per tonne raised one metre.
+# m*g*h at ~30% tank-to-wheel efficiency, ~10 kWh and ~2.4 kg CO2 per litre of fuel;
+# scaled by FUEL_MULTIPLIERS like the per-km factors
+CLIMB_CO2_PER_TONNE_M = 9.81 / 0.3 / 3600 / 10 * 2.4
+
+# Typical laden mass (tonnes)
+VEHICLE_MASS_T = {
+    'Car': 1.5,
+    'Motorcycle': 0.25,
+    'Truck': 12.0,
+    'Bus': 15.0
+}
+
+# Share of a leg's descent that offsets its climb (regenerative braking)
+DESCENT_RECOVERY = {
+    'Electric': 0.6,
+    'Hybrid': 0.3,
+    'Petrol': 0.0,
+    'Diesel': 0.0
+}
+
+# Unknown labels fall back to the baseline factors (0.15/km, 1.0, 1.0)
+DEFAULT_VEHICLE = 'Car'
+DEFAULT_FUEL = 'Petrol'
+DEFAULT_TRAFFIC = 'Moderate'
+
+def congestion_penalty(route_type, vehicle_type, traffic_conditions):
+    """Efficiency factor for a route type under given vehicle and traffic"""
+    penalty = 1.0
+    if route_type == 'highway' and vehicle_type in ['Truck', 'Bus']:
+        penalty *= 0.2  # Highway efficiency for large vehicles
+    elif route_type == 'dense_urban' and traffic_conditions == 'Heavy':
+        penalty *= 2.2  # Dense city congestion penalty
+    elif route_type == 'suburban' and traffic_conditions == 'Heavy':
+        penalty *= 1.6  # Moderate suburban congestion
+    elif route_type == 'rural' and vehicle_type in ['Truck', 'Bus']:
+        penalty *= 0.8  # Rural roads good for large vehicles
+    return penalty
+
+def build_emission_tensor():
+    """kg CO2 per km for every vehicle x fuel x traffic combination"""
+    base = np.array([BASE_CO2_PER_KM[v] for v in VEHICLE_TYPES])
+    fuel = np.array([FUEL_MULTIPLIERS[f] for f in FUEL_TYPES])
+    traffic = np.array([TRAFFIC_MULTIPLIERS[t] for t in TRAFFIC_CONDITIONS])
+    return base[:, None, None] * fuel[None, :, None] * traffic[None, None, :]
+
+def build_congestion_tensor():
+    """Congestion penalty for every route type x vehicle x traffic combination"""
+    return np.array([
+        [[congestion_penalty(r, v, t) for t in TRAFFIC_CONDITIONS] for v in VEHICLE_TYPES]
+        for r in ROUTE_TYPES
+    ])
+
+def build_climb_tensor():
+    """kg CO2 per metre climbed for every vehicle x fuel combination"""
+    mass = np.array([VEHICLE_MASS_T[v] for v in VEHICLE_TYPES])
+    fuel = np.array([FUEL_MULTIPLIERS[f] for f in FUEL_TYPES])
+    return mass[:, None] * fuel[None, :] * CLIMB_CO2_PER_TONNE_M
+
+# Built once at import; shape (vehicle, fuel, traffic), (route_type, vehicle, traffic) and (vehicle, fuel)
+EMISSION_FACTORS = build_emission_tensor()
+CONGESTION_PENALTIES = build_congestion_tensor()
+CLIMB_FACTORS = build_climb_tensor()
+DESCENT_RECOVERIES = np.array([DESCENT_RECOVERY[f] for f in FUEL_TYPES])
+
+def _index(labels, value, default):
+    return labels.index(value) if value in labels else labels.index(default)
+
+def combination_index(vehicle_type, fuel_type, traffic_conditions):
+    """Tensor indices for one request's vehicle, fuel and traffic"""
+    return (_index(VEHICLE_TYPES, vehicle_type, DEFAULT_VEHICLE),
+            _index(FUEL_TYPES, fuel_type, DEFAULT_FUEL),
+            _index(TRAFFIC_CONDITIONS, traffic_conditions, DEFAULT_TRAFFIC))
+
+def route_type_indices(route_types):
+    """Map route type labels to congestion tensor rows"""
+    return np.array([_index(ROUTE_TYPES, r, 'mixed') for r in route_types], dtype=np.intp)
+
+def co2_matrix(distances, route_type_idx, grade=None):
+    """CO2 (kg) for every candidate x vehicle x fuel x traffic in one broadcast
+
+    grade, if given, is each candidate's grade_co2_matrix stacked to
+    (candidate, vehicle, fuel) and is added under every traffic condition.
+    """
+    distances = np.asarray(distances, dtype=np.float64)
+    penalties = CONGESTION_PENALTIES[route_type_idx]  # (candidate, vehicle, traffic)
+    co2 = distances[:, None, None, None] * EMISSION_FACTORS[None] * penalties[:, :, None, :]
+    if grade is not None:
+        co2 = co2 + np.asarray(grade)[:, :, :, None]
+    return co2
+
+def co2_scores(distances, route_type_idx, vehicle_type, fuel_type, traffic_conditions):
+    """CO2 (kg) per candidate for a single vehicle/fuel/traffic combination"""
+    v, f, t = combination_index(vehicle_type, fuel_type, traffic_conditions)
+    distances = np.asarray(distances, dtype=np.float64)
+    return distances * EMISSION_FACTORS[v, f, t] * CONGESTION_PENALTIES[route_type_idx, v, t]
+
+def grade_co2_matrix(climb_m, descent_m):
+    """Extra CO2 (kg) for a route's per-leg climb and descent, for every vehicle x fuel
+
+    On each leg, the recoverable share of the descent offsets the climb, but
+    a leg never comes out below flat ground. The term is never negative, so
+    distance-based lower bounds stay valid with elevation on.
+    """
+    climb_m = np.asarray(climb_m, dtype=np.float64)
+    descent_m = np.asarray(descent_m, dtype=np.float64)
+    net = np.maximum(climb_m[None, :] - DESCENT_RECOVERIES[:, None] * descent_m[None, :], 0.0).sum(axis=1)
+    return CLIMB_FACTORS * net[None, :]
+
+def grade_co2(climb_m, descent_m, vehicle_type, fuel_type):
+    """Extra CO2 (kg) from a route's per-leg climb and descent for one vehicle and fuel"""
+    v, f, _ = combination_index(vehicle_type, fuel_type, DEFAULT_TRAFFIC)
+    return float(grade_co2_matrix(climb_m, descent_m)[v, f])
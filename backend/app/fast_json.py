@@ -0,0 +1,35 @@
+import json
+import numpy as np
+from fastapi import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _default(obj):
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def dumps(content):
+    """UTF-8 JSON bytes for a response body
+
+    Uses orjson when installed, which writes contiguous NumPy arrays straight
+    from their buffers; otherwise the stdlib encoder with the same compact
+    output as Starlette's JSONResponse. Either way there is no
+    jsonable_encoder walk over the response first.
+    """
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content, default=_default, ensure_ascii=False, allow_nan=False,
+                      separators=(",", ":")).encode("utf-8")
+
+class FastJSONResponse(Response):
+    """JSON response rendered by dumps(); return it from an endpoint to skip FastAPI's encoder"""
+    media_type = "application/json"
+
+    def render(self, content):
+        return dumps(content)
@@ -0,0 +1,229 @@
+import time
+import bisect
+import numpy as np
+from utils import haversine_matrix
+
+# Moves must beat this to count, so float noise can't cause endless swapping
+EPS = 1e-9
+
+class FleetError(ValueError):
+    """The vehicles can't carry the stops' demand"""
+
+def parse_fleet(stops, vehicles):
+    """Per-node demand (node 0 is the depot) and per-vehicle capacity, validated"""
+    if not vehicles:
+        raise FleetError("At least one vehicle is required")
+    demand = np.zeros(len(stops) + 1)
+    for k, stop in enumerate(stops):
+        demand[k + 1] = float(stop.get('demand', 1))
+        if demand[k + 1] < 0:
+            raise FleetError(f"Stop {k + 1} has a negative demand")
+    capacities = np.array([float(v.get('capacity', 0)) for v in vehicles])
+    if (capacities <= 0).any():
+        raise FleetError("Every vehicle needs a positive capacity")
+    too_big = np.flatnonzero(demand > capacities.max())
+    if len(too_big):
+        raise FleetError(f"Stops {too_big.tolist()} need more than the largest vehicle carries")
+    if demand.sum() > capacities.sum():
+        raise FleetError(f"Total demand {demand.sum():g} exceeds fleet capacity {capacities.sum():g}")
+    return demand, capacities
+
+def route_length(route, D):
+    """Closed depot -> stops -> depot length of one route of stop nodes"""
+    if not route:
+        return 0.0
+    nodes = np.concatenate(([0], route, [0]))
+    return float(D[nodes[:-1], nodes[1:]].sum())
+
+def fleet_covers(held, a, b, caps):
+    """Whether, after merging routes of load a and b, the heaviest routes each still get a vehicle
+
+    held is every route's load ascending and caps the capacities descending;
+    only the len(caps) heaviest routes matter, as later merges must fold the
+    rest into them anyway.
+    """
+    top = held[-(len(caps) + 2):]
+    for load in (a, b):
+        if load in top:
+            top.remove(load)
+    bisect.insort(top, a + b)
+    return all(load <= cap for load, cap in zip(reversed(top), caps))
+
+def savings_routes(D, demand, capacities):
+    """Clarke-Wright parallel savings: merge depot round trips in order of saving
+
+    Savings for every pair come from one broadcast over the shared matrix and
+    one sort; the merge pass then only checks that both stops sit at the open
+    ends of different routes and that the loads still fit the fleet: the
+    k-th heaviest route must fit the k-th largest vehicle, so a mixed fleet
+    doesn't end up with more big routes than big vehicles.
+    """
+    caps = sorted(np.atleast_1d(capacities).tolist(), reverse=True)
+    n = len(D) - 1
+    i, j = np.triu_indices(n, 1)
+    i, j = i + 1, j + 1
+    savings = D[0, i] + D[0, j] - D[i, j]
+    order = np.argsort(-savings, kind='stable')
+    order = order[savings[order] > EPS]
+
+    route_of = np.arange(n + 1)
+    routes = {k: [k] for k in range(1, n + 1)}
+    loads = {k: float(demand[k]) for k in range(1, n + 1)}
+    held = sorted(loads.values())
+    for a, b in zip(i[order].tolist(), j[order].tolist()):
+        ra, rb = route_of[a], route_of[b]
+        if ra == rb or loads[ra] + loads[rb] > caps[0]:
+            continue
+        A, B = routes[ra], routes[rb]
+        if A[-1] == a and B[0] == b:
+            merged = A + B
+        elif A[0] == a and B[-1] == b:
+            merged = B + A
+        elif A[-1] == a and B[-1] == b:
+            merged = A + B[::-1]
+        elif A[0] == a and B[0] == b:
+            merged = A[::-1] + B
+        else:
+            # One of them is already interior to its route
+            continue
+        if not fleet_covers(held, loads[ra], loads[rb], caps):
+            continue
+        held.remove(loads[ra])
+        held.remove(loads[rb])
+        routes[ra] = merged
+        loads[ra] += loads.pop(rb)
+        bisect.insort(held, loads[ra])
+        route_of[B] = ra
+        del routes[rb]
+    return list(routes.values())
+
+def assign_vehicles(routes, demand, capacities):
+    """Heaviest route first onto the smallest free vehicle that carries it; returns vehicle per route"""
+    loads = [float(demand[r].sum()) for r in routes]
+    free = sorted(range(len(capacities)), key=lambda v: capacities[v])
+    assigned = [None] * len(routes)
+    for r in sorted(range(len(routes)), key=lambda r: -loads[r]):
+        fits = [v for v in free if capacities[v] >= loads[r]]
+        if not fits:
+            raise FleetError(f"Savings built {len(routes)} routes but the fleet can't cover them all "
+                             f"({len(capacities)} vehicles); add vehicles or capacity")
+        assigned[r] = fits[0]
+        free.remove(fits[0])
+    return assigned
+
+def improve_routes(D, demand, routes, capacities, deadline=None):
+    """Relocate and exchange moves across routes until neither helps
+
+    Each round prices every move at once: relocating any stop onto any edge
+    of any route is a (stops x edges) broadcast, swapping any two stops of
+    different routes a (stops x stops) one. Moves that overload the receiving
+    vehicle are masked out; relocation within a route is allowed too. The
+    best move of each stop is then applied cheapest first, skipping any whose
+    routes an earlier move in the round already changed.
+    """
+    routes = [list(r) for r in routes]
+    n = len(D) - 1
+    stops = np.arange(1, n + 1)
+    relocations = exchanges = 0
+    while deadline is None or time.perf_counter() < deadline:
+        prev = np.zeros(n + 1, dtype=np.intp)
+        nxt = np.zeros(n + 1, dtype=np.intp)
+        route_id = np.zeros(n + 1, dtype=np.intp)
+        edge_from, edge_to, edge_route = [], [], []
+        for r, route in enumerate(routes):
+            if not route:
+                continue
+            nodes = [0] + route + [0]
+            prev[route] = nodes[:-2]
+            nxt[route] = nodes[2:]
+            route_id[route] = r
+            edge_from += nodes[:-1]
+            edge_to += nodes[1:]
+            edge_route += [r] * (len(nodes) - 1)
+        edge_from, edge_to, edge_route = (np.array(x, dtype=np.intp) for x in (edge_from, edge_to, edge_route))
+        loads = np.array([demand[r].sum() for r in routes])
+        room = capacities - loads
+
+        # Relocate stop u onto edge e
+        p, q, r_u, d_u = prev[stops], nxt[stops], route_id[stops], demand[stops]
+        gain = D[p, stops] + D[stops, q] - D[p, q]
+        added = D[np.ix_(stops, edge_from)] + D[np.ix_(stops, edge_to)] - D[edge_from, edge_to][None, :]
+        relocate = added - gain[:, None]
+        other = r_u[:, None] != edge_route[None, :]
+        relocate[other & (d_u[:, None] > room[edge_route][None, :])] = np.inf
+        # Edges touching u itself are not real slots
+        relocate[(edge_from[None, :] == stops[:, None]) | (edge_to[None, :] == stops[:, None])] = np.inf
+        best_edge = np.argmin(relocate, axis=1)
+        rows = np.arange(n)
+
+        # Exchange u and v in place
+        replace = D[p[:, None], stops[None, :]] + D[stops[None, :], q[:, None]] - (D[p, stops] + D[stops, q])[:, None]
+        exchange = replace + replace.T
+        swing = d_u[None, :] - d_u[:, None]  # load change on u's route when v replaces u
+        exchange[(r_u[:, None] == r_u[None, :]) | (swing > room[r_u][:, None]) | (-swing > room[r_u][None, :])] = np.inf
+        best_partner = np.argmin(exchange, axis=1)
+
+        # Best move per stop, cheapest first; a move's price holds while its routes are untouched
+        moves = [(float(relocate[k, best_edge[k]]), 0, k) for k in np.flatnonzero(relocate[rows, best_edge] < -EPS)]
+        moves += [(float(exchange[k, best_partner[k]]), 1, k)
+                  for k in np.flatnonzero(exchange[rows, best_partner] < -EPS)]
+        if not moves:
+            break
+        touched = set()
+        for _, kind, k in sorted(moves):
+            u = int(stops[k])
+            if kind == 0:
+                e = best_edge[k]
+                involved = {int(route_id[u]), int(edge_route[e])}
+                if involved & touched:
+                    continue
+                a, target = int(edge_from[e]), routes[edge_route[e]]
+                routes[route_id[u]].remove(u)
+                target.insert(target.index(a) + 1 if a else 0, u)
+                relocations += 1
+            else:
+                v = int(stops[best_partner[k]])
+                involved = {int(route_id[u]), int(route_id[v])}
+                if involved & touched:
+                    continue
+                ru, rv = routes[route_id[u]], routes[route_id[v]]
+                iu, iv = ru.index(u), rv.index(v)
+                ru[iu], rv[iv] = v, u
+                exchanges += 1
+            touched |= involved
+    return routes, {'relocations': relocations, 'exchanges': exchanges}
+
+def solve_fleet(depot, stops, vehicles, time_budget_ms=None):
+    """Routes for a depot's stops across a heterogeneous fleet
+
+    Savings construction capped by the capacities the fleet still has free,
+    routes assigned to vehicles heaviest first, then relocate/exchange improvement within
+    each vehicle's capacity. Returns the routes as stop indices (0-based into
+    stops) with their vehicle and load, plus search stats.
+    """
+    start = time.perf_counter()
+    demand, capacities = parse_fleet(stops, vehicles)
+    D = haversine_matrix([depot] + list(stops))
+    deadline = start + time_budget_ms / 1000.0 if time_budget_ms else None
+
+    routes = savings_routes(D, demand, capacities) if stops else []
+    vehicle_of = assign_vehicles(routes, demand, capacities)
+    savings_km = sum(route_length(r, D) for r in routes)
+    moves = {'relocations': 0, 'exchanges': 0}
+    if routes:
+        routes, moves = improve_routes(D, demand, routes, capacities[vehicle_of], deadline)
+
+    solved = []
+    for route, v in zip(routes, vehicle_of):
+        if route:
+            solved.append({'vehicle': v, 'stops': [k - 1 for k in route], 'load': float(demand[route].sum()),
+                           'length_km': route_length(route, D)})
+    return {
+        'routes': solved,
+        'stats': {
+            'solve_ms': round((time.perf_counter() - start) * 1000.0, 1),
+            'savings_length_km': round(savings_km, 3),
+            'final_length_km': round(sum(r['length_km'] for r in solved), 3),
+            **moves
+        }
+    }
@@ -0,0 +1,54 @@
+import numpy as np
+
+class RouteGeometry:
+    """Road geometry for a whole route: one (N, 2) [lon, lat] array plus leg offsets
+
+    Legs are copied once into a preallocated array instead of extending a
+    list of per-point dicts, which costs ~16 bytes per point rather than ~200.
+    Leg k spans coordinates[offsets[k]:offsets[k + 1] + 1]; consecutive legs
+    share their joining point.
+    """
+    __slots__ = ('coordinates', 'offsets')
+
+    def __init__(self, coordinates, offsets):
+        self.coordinates = coordinates
+        self.offsets = offsets
+
+    @classmethod
+    def from_legs(cls, legs):
+        """Concatenate leg geometries, dropping each leg's duplicate start point"""
+        legs = [np.asarray(leg, dtype=np.float64).reshape(-1, 2) for leg in legs]
+        if not legs:
+            return cls(np.zeros((0, 2)), np.zeros(1, dtype=np.int64))
+        sizes = np.array([len(leg) for leg in legs], dtype=np.int64)
+        # Every leg after the first loses its first point to the previous leg's end
+        added = np.concatenate(([sizes[0]], sizes[1:] - 1))
+        ends = np.cumsum(added)
+        coordinates = np.empty((int(ends[-1]), 2))
+        coordinates[:sizes[0]] = legs[0]
+        for k in range(1, len(legs)):
+            coordinates[ends[k - 1]:ends[k]] = legs[k][1:]
+        offsets = np.concatenate(([0], ends - 1))
+        return cls(coordinates, offsets)
+
+    def __len__(self):
+        return len(self.coordinates)
+
+    @property
+    def nbytes(self):
+        return self.coordinates.nbytes + self.offsets.nbytes
+
+    def leg(self, k):
+        return self.coordinates[self.offsets[k]:self.offsets[k + 1] + 1]
+
+    def to_waypoints(self):
+        """[{'lat', 'lon'}] dicts for the JSON response; built only at serialization"""
+        return [{'lat': lat, 'lon': lon} for lon, lat in self.coordinates.tolist()]
+
+    def to_columns(self):
+        """Compact columnar geometry: contiguous lats/lons arrays plus leg offsets"""
+        return {
+            'lats': np.ascontiguousarray(self.coordinates[:, 1]),
+            'lons': np.ascontiguousarray(self.coordinates[:, 0]),
+            'leg_offsets': self.offsets
+        }
@@ -0,0 +1,149 @@
+import heapq
+import numpy as np
+import kernels
+
+def best_cyclic_position(tour, D, node):
+    """Slot (1..len) where inserting node into the closed tour adds the least length"""
+    t = np.asarray(tour, dtype=np.intp)
+    nxt = np.roll(t, -1)
+    costs = D[t, node] + D[node, nxt] - D[t, nxt]
+    return int(np.argmin(costs)) + 1
+
+def farthest_insertion_tour(D):
+    """Farthest insertion in O(n^2): distance-to-tour is kept per node and updated per insertion"""
+    n = len(D)
+    if n <= 2:
+        return np.arange(n, dtype=np.intp)
+    if kernels.ENABLED:
+        return kernels.insertion_tour(D, True)
+    # Farthest pair to start; row-major argmax keeps the first pair on ties
+    upper = np.triu(D, 1)
+    i, j = divmod(int(np.argmax(upper)), n)
+    if upper[i, j] <= 0:
+        i, j = 0, 1
+    tour = [i, j]
+    in_tour = np.zeros(n, dtype=bool)
+    in_tour[[i, j]] = True
+    dist_to_tour = np.minimum(D[i], D[j])
+
+    for _ in range(n - 2):
+        node = int(np.argmax(np.where(in_tour, -np.inf, dist_to_tour)))
+        tour.insert(best_cyclic_position(tour, D, node), node)
+        in_tour[node] = True
+        dist_to_tour = np.minimum(dist_to_tour, D[node])
+    return np.array(tour, dtype=np.intp)
+
+def nearest_insertion_tour(D):
+    """Nearest insertion from node 0 in O(n^2), same bookkeeping as farthest insertion"""
+    n = len(D)
+    if n <= 2:
+        return np.arange(n, dtype=np.intp)
+    if kernels.ENABLED:
+        return kernels.insertion_tour(D, False)
+    tour = [0]
+    in_tour = np.zeros(n, dtype=bool)
+    in_tour[0] = True
+    dist_to_tour = D[0].copy()
+
+    for _ in range(n - 1):
+        node = int(np.argmin(np.where(in_tour, np.inf, dist_to_tour)))
+        if len(tour) == 1:
+            tour.append(node)
+        else:
+            tour.insert(best_cyclic_position(tour, D, node), node)
+        in_tour[node] = True
+        dist_to_tour = np.minimum(dist_to_tour, D[node])
+    return np.array(tour, dtype=np.intp)
+
+def cheapest_insertion_tour(D, initial=(0,)):
+    """Cheapest insertion: repeatedly add the node/edge pair that adds the least length
+
+    A heap holds each outside node's best known insertion. After an insertion
+    splits edge a->b into a->u->b, outside nodes are checked against the two
+    new edges only. Entries whose edge was split are left in the heap as lower
+    bounds and re-evaluated lazily when they reach the top, so the whole
+    construction stays near O(n^2) instead of O(n^3).
+    """
+    n = len(D)
+    tour = [int(k) for k in initial] or [0]
+    if n <= len(tour):
+        return np.array(tour, dtype=np.intp)
+    if len(tour) == 1:
+        # Grow a single node into an edge with its nearest neighbour
+        row = D[tour[0]].copy()
+        row[tour[0]] = np.inf
+        tour.append(int(np.argmin(row)))
+
+    # Closed tour as a successor array; an edge is named by its start node
+    succ = np.full(n, -1, dtype=np.intp)
+    succ[tour] = np.roll(tour, -1)
+    outside = np.ones(n, dtype=bool)
+    outside[tour] = False
+
+    def best_edges(nodes):
+        starts = np.flatnonzero(~outside)
+        ends = succ[starts]
+        costs = D[np.ix_(starts, nodes)] + D[np.ix_(nodes, ends)].T - D[starts, ends][:, None]
+        k = np.argmin(costs, axis=0)
+        return costs[k, np.arange(len(nodes))], starts[k]
+
+    nodes = np.flatnonzero(outside)
+    best_cost = np.full(n, np.inf)
+    best_cost[nodes], edges = best_edges(nodes)
+    heap = [(float(c), int(u), int(a), int(succ[a])) for c, u, a in zip(best_cost[nodes], nodes, edges)]
+    heapq.heapify(heap)
+
+    while heap:
+        cost, u, a, b = heapq.heappop(heap)
+        if not outside[u]:
+            continue
+        if succ[a] != b:
+            # Edge was split since this entry was pushed; re-price against the current tour
+            cost, a = best_edges(np.array([u]))
+            best_cost[u] = cost[0]
+            heapq.heappush(heap, (float(cost[0]), u, int(a[0]), int(succ[a[0]])))
+            continue
+        succ[a] = u
+        succ[u] = b
+        outside[u] = False
+
+        # Only the two new edges can offer anyone a cheaper slot
+        rest = np.flatnonzero(outside)
+        for s, e in ((a, u), (u, b)):
+            costs = D[s, rest] + D[rest, e] - D[s, e]
+            better = costs < best_cost[rest]
+            for v, c in zip(rest[better].tolist(), costs[better].tolist()):
+                best_cost[v] = c
+                heapq.heappush(heap, (c, v, s, e))
+
+    order = np.empty(n, dtype=np.intp)
+    order[0] = tour[0]
+    for k in range(1, n):
+        order[k] = succ[order[k - 1]]
+    return order
+
+def convex_hull_indices(lats, lons):
+    """Indices of the convex hull (monotone chain), one per distinct coordinate"""
+    order = np.lexsort((lons, lats))
+    # Drop repeated coordinates, keeping the first stop at each
+    keep = np.ones(len(order), dtype=bool)
+    keep[1:] = (np.diff(lats[order]) != 0) | (np.diff(lons[order]) != 0)
+    order = order[keep]
+    if len(order) <= 2:
+        return order
+    xs, ys = lats[order].tolist(), lons[order].tolist()
+
+    def chain(indices):
+        hull = []
+        for k in indices:
+            while len(hull) >= 2:
+                o, p = hull[-2], hull[-1]
+                if (xs[p] - xs[o]) * (ys[k] - ys[o]) - (ys[p] - ys[o]) * (xs[k] - xs[o]) > 0:
+                    break
+                hull.pop()
+            hull.append(k)
+        return hull
+
+    lower = chain(range(len(order)))
+    upper = chain(range(len(order) - 1, -1, -1))
+    return order[lower[:-1] + upper[:-1]]
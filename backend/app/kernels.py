@@ -0,0 +1,220 @@
+"""Optional Numba-compiled inner loops for the distance matrix and tour searches
+
+Each kernel is a scalar-loop twin of a NumPy routine elsewhere (utils,
+local_search, insertion_heuristics) and makes the same choices in the same
+order: first index on ties, the same EPS, the same float expressions. Given
+the same matrix, tours come out identical whichever path runs. The matrix
+itself can differ in the last bit, since NumPy's vectorized sin isn't libm's.
+Callers check ENABLED and use their NumPy code when Numba is missing or
+ROUTING_KERNELS=numpy.
+"""
+import os
+import time
+import numpy as np
+
+# auto: use Numba when installed; numpy: always use the NumPy code paths
+ROUTING_KERNELS = os.environ.get('ROUTING_KERNELS', 'auto')
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+ENABLED = numba is not None and ROUTING_KERNELS != 'numpy'
+if ROUTING_KERNELS == 'numba' and numba is None:
+    print("⚠️  ROUTING_KERNELS=numba but Numba is not installed; using NumPy kernels")
+
+def _jit(fn):
+    # cache=True keeps compiled code on disk, so pool workers and restarts load it instead of recompiling
+    return numba.njit(cache=True, nogil=True)(fn) if ENABLED else None
+
+def _haversine_matrix(lat, lon, cos_lat):
+    """Pairwise distances (km) from coordinates already in radians"""
+    n = len(lat)
+    D = np.zeros((n, n))
+    for i in range(n):
+        for j in range(i + 1, n):
+            a_calc = np.sin((lat[i] - lat[j]) / 2) ** 2 + cos_lat[i] * cos_lat[j] * np.sin((lon[i] - lon[j]) / 2) ** 2
+            a_calc = min(max(a_calc, 0.0), 1.0)
+            D[i, j] = 2 * 6371 * np.arcsin(np.sqrt(a_calc))
+            D[j, i] = D[i, j]
+    return D
+
+def _nearest_neighbor_tour(D, start):
+    n = len(D)
+    visited = np.zeros(n, dtype=np.bool_)
+    tour = np.empty(n, dtype=np.intp)
+    tour[0] = start
+    visited[start] = True
+    for k in range(1, n):
+        row = D[tour[k - 1]]
+        best, best_d = -1, np.inf
+        for j in range(n):
+            if not visited[j] and (best < 0 or row[j] < best_d):
+                best, best_d = j, row[j]
+        tour[k] = best
+        visited[best] = True
+    return tour
+
+def _two_opt_sweep(t, D, lo, hi, eps):
+    """One pass of local_search.two_opt over positions lo..hi, in place; True if anything moved"""
+    n = len(t)
+    improved = False
+    for i in range(lo, min(hi - 1, n - 2) + 1):
+        a, b = t[i - 1], t[i]
+        best_j, best_delta = -1, np.inf
+        for j in range(i + 1, hi + 1):
+            c = t[j]
+            delta = D[a, c] - D[a, b]
+            if j < n - 1:
+                d = t[j + 1]
+                delta += D[b, d] - D[c, d]
+            if delta < best_delta:
+                best_j, best_delta = j, delta
+        if best_delta < -eps:
+            t[i:best_j + 1] = t[i:best_j + 1][::-1].copy()
+            improved = True
+    return improved
+
+def _or_opt_sweep(t, D, lo, hi, max_segment, windowed, eps):
+    """One pass of local_search.or_opt over every segment length; returns (tour, moved)"""
+    n = len(t)
+    improved = False
+    for length in range(1, min(max_segment, n - 2) + 1):
+        i = lo
+        while i + length <= min(n, hi + 1):
+            s0, s1 = t[i], t[i + length - 1]
+            p = t[i - 1]
+            if i + length < n:
+                nx = t[i + length]
+                removal_gain = D[p, s0] + D[s1, nx] - D[p, nx]
+            else:
+                removal_gain = D[p, s0]
+
+            m = n - length
+            rest = np.empty(m, dtype=np.intp)
+            rest[:i] = t[:i]
+            rest[i:] = t[i + length:]
+            # Slots "after rest[k]" allowed by the window: lo-1 .. hi-length
+            first = max(lo - 1, 0) if windowed else 0
+            last = max(hi - length + 1, 0) if windowed else m
+            k_fwd, best_fwd = -1, np.inf
+            k_bwd, best_bwd = -1, np.inf
+            for k in range(m):
+                if k < m - 1:
+                    left, right = rest[k], rest[k + 1]
+                    forward = D[left, s0] + D[s1, right] - D[left, right]
+                    backward = D[left, s1] + D[s0, right] - D[left, right]
+                else:
+                    forward = D[rest[m - 1], s0]
+                    backward = D[rest[m - 1], s1]
+                if k == i - 1:
+                    forward = np.inf  # original position
+                if k < first or k >= last:
+                    forward = np.inf
+                    backward = np.inf
+                if k_fwd < 0 or forward < best_fwd:
+                    k_fwd, best_fwd = k, forward
+                if k_bwd < 0 or backward < best_bwd:
+                    k_bwd, best_bwd = k, backward
+            reverse = best_bwd < best_fwd
+            k = k_bwd if reverse else k_fwd
+            cost = best_bwd if reverse else best_fwd
+
+            if cost - removal_gain < -eps:
+                moved = np.empty(n, dtype=np.intp)
+                moved[:k + 1] = rest[:k + 1]
+                for s in range(length):
+                    moved[k + 1 + s] = t[i + length - 1 - s] if reverse else t[i + s]
+                moved[k + 1 + length:] = rest[k + 1:]
+                t = moved
+                improved = True
+            else:
+                i += 1
+    return t, improved
+
+def _insertion_tour(D, farthest):
+    """Farthest (or nearest) insertion, as in insertion_heuristics"""
+    n = len(D)
+    tour = np.empty(n, dtype=np.intp)
+    in_tour = np.zeros(n, dtype=np.bool_)
+    if farthest:
+        # Farthest pair, first in row-major order
+        i, j, best = 0, 1, -1.0
+        for r in range(n):
+            for c in range(r + 1, n):
+                if D[r, c] > best:
+                    i, j, best = r, c, D[r, c]
+        if best <= 0:
+            i, j = 0, 1
+        tour[0], tour[1] = i, j
+    else:
+        tour[0] = 0
+        j, best = -1, np.inf
+        for c in range(1, n):
+            if j < 0 or D[0, c] < best:
+                j, best = c, D[0, c]
+        tour[1] = j
+    size = 2
+    in_tour[tour[0]] = True
+    in_tour[tour[1]] = True
+    dist_to_tour = np.minimum(D[tour[0]], D[tour[1]])
+
+    for _ in range(n - 2):
+        node, pick = -1, 0.0
+        for c in range(n):
+            if in_tour[c]:
+                continue
+            if node < 0 or (dist_to_tour[c] > pick if farthest else dist_to_tour[c] < pick):
+                node, pick = c, dist_to_tour[c]
+        # Cheapest slot in the closed tour
+        slot, best_cost = 0, np.inf
+        for k in range(size):
+            a = tour[k]
+            b = tour[k + 1] if k + 1 < size else tour[0]
+            cost = D[a, node] + D[node, b] - D[a, b]
+            if cost < best_cost:
+                slot, best_cost = k + 1, cost
+        tour[slot + 1:size + 1] = tour[slot:size].copy()
+        tour[slot] = node
+        size += 1
+        in_tour[node] = True
+        for c in range(n):
+            if D[node, c] < dist_to_tour[c]:
+                dist_to_tour[c] = D[node, c]
+    return tour
+
+haversine_matrix_kernel = _jit(_haversine_matrix)
+nearest_neighbor_kernel = _jit(_nearest_neighbor_tour)
+two_opt_sweep = _jit(_two_opt_sweep)
+or_opt_sweep = _jit(_or_opt_sweep)
+insertion_tour = _jit(_insertion_tour)
+
+def haversine_matrix(lats, lons):
+    """Compiled twin of utils.haversine_matrix_from_coords"""
+    lat = np.radians(np.asarray(lats, dtype=np.float64))
+    lon = np.radians(np.asarray(lons, dtype=np.float64))
+    return haversine_matrix_kernel(lat, lon, np.cos(lat))
+
+def warm_up():
+    """Compile (or load from the on-disk cache) every kernel on a tiny problem
+
+    Called once at startup so the first request doesn't pay for compilation.
+    Returns the time taken in ms, or None when the kernels are disabled.
+    """
+    if not ENABLED:
+        return None
+    start = time.perf_counter()
+    rng = np.random.default_rng(0)
+    D = haversine_matrix(12.9 + rng.random(8) * 0.1, 77.5 + rng.random(8) * 0.1)
+    # Plan sessions pass a view into a larger matrix, which compiles separately
+    padded = np.zeros((16, 16))
+    padded[:8, :8] = D
+    for matrix in (D, padded[:8, :8]):
+        t = nearest_neighbor_kernel(matrix, 0)
+        two_opt_sweep(t, matrix, 1, 7, 1e-9)
+        for windowed in (False, True):
+            or_opt_sweep(t.copy(), matrix, 1, 7, 3, windowed, 1e-9)
+        for farthest in (False, True):
+            insertion_tour(matrix, farthest)
+    return (time.perf_counter() - start) * 1000.0
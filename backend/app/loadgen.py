@@ -0,0 +1,179 @@
+import json
+import time
+import argparse
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import requests
+from stage_timing import parse_server_timing
+
+# Synthetic manifests are scattered around central Bengaluru
+CENTER_LAT, CENTER_LON = 12.9716, 77.5946
+SPREAD_DEG = 0.08
+
+def load_corpus(path):
+    """(path, payload) pairs from a JSONL file
+
+    Each line is either a bare /optimize payload or an object with a
+    'payload' (or 'body') field and an optional 'path'.
+    """
+    corpus = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            payload = entry.get('payload', entry.get('body', entry))
+            if isinstance(payload, str):
+                payload = json.loads(payload)
+            corpus.append((entry.get('path', '/optimize'), payload))
+    return corpus
+
+def synthetic_corpus(count, stops, seed=42, vehicle_type='Car', fuel_type='Petrol',
+                     traffic_conditions='Moderate', time_budget_ms=None):
+    """Random manifests of `stops` stops each"""
+    rng = np.random.default_rng(seed)
+    corpus = []
+    for _ in range(count):
+        offsets = rng.uniform(-SPREAD_DEG, SPREAD_DEG, size=(stops, 2))
+        payload = {
+            'stops': [{'lat': round(CENTER_LAT + dlat, 6), 'lon': round(CENTER_LON + dlon, 6)}
+                      for dlat, dlon in offsets],
+            'vehicle_type': vehicle_type,
+            'fuel_type': fuel_type,
+            'traffic_conditions': traffic_conditions
+        }
+        if time_budget_ms:
+            payload['time_budget_ms'] = time_budget_ms
+        corpus.append(('/optimize', payload))
+    return corpus
+
+def send(session, base_url, path, payload, timeout, scheduled=None):
+    """One request: (latency_ms, status, server stage timings)
+
+    Latency runs from `scheduled` (a perf_counter time) when given, so time
+    spent waiting for a free client counts against the server.
+    """
+    start = time.perf_counter() if scheduled is None else scheduled
+    try:
+        response = session.post(base_url + path, json=payload, timeout=timeout)
+        status = response.status_code
+        stages = parse_server_timing(response.headers.get('Server-Timing'))
+    except requests.RequestException as e:
+        status = type(e).__name__
+        stages = {}
+    return (time.perf_counter() - start) * 1000, status, stages
+
+def run_load(base_url, corpus, requests_total, concurrency=8, rate=None, timeout=120.0, warmup=0):
+    """Replay the corpus round-robin against a running server
+
+    Without a rate this is closed-loop: `concurrency` clients send back to
+    back. With a rate (requests/s) arrivals are open-loop Poisson, so queueing
+    delay shows up in the latencies instead of silently lowering the load:
+    each latency is measured from the request's scheduled arrival, including
+    any wait for one of the `concurrency` clients to free up.
+    """
+    local = threading.local()
+
+    def session():
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        return local.session
+
+    def job(k, scheduled=None):
+        path, payload = corpus[k % len(corpus)]
+        return send(session(), base_url, path, payload, timeout, scheduled)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for k in range(warmup):
+            pool.submit(job, k).result()
+
+        rng = np.random.default_rng(0)
+        start = time.perf_counter()
+        futures = []
+        next_arrival = start
+        for k in range(requests_total):
+            scheduled = None
+            if rate:
+                next_arrival += rng.exponential(1.0 / rate)
+                delay = next_arrival - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                scheduled = next_arrival
+            futures.append(pool.submit(job, warmup + k, scheduled))
+        results = [f.result() for f in futures]
+        elapsed = time.perf_counter() - start
+
+    return summarize(results, elapsed)
+
+def summarize(results, elapsed):
+    latencies = np.array([r[0] for r in results])
+    statuses = Counter(r[1] for r in results)
+    ok = np.array([r[1] == 200 for r in results])
+    stage_names = sorted({name for r in results for name in r[2]})
+    stages = {}
+    for name in stage_names:
+        values = np.array([r[2][name] for r in results if name in r[2]])
+        stages[name] = {
+            'mean_ms': round(float(values.mean()), 1),
+            'p95_ms': round(float(np.percentile(values, 95)), 1)
+        }
+
+    def percentiles(values):
+        if len(values) == 0:
+            return {}
+        return {f'p{q}_ms': round(float(np.percentile(values, q)), 1) for q in (50, 95, 99)}
+
+    return {
+        'requests': len(results),
+        'elapsed_s': round(elapsed, 2),
+        'throughput_rps': round(len(results) / elapsed, 2) if elapsed > 0 else 0.0,
+        'error_rate': round(1.0 - float(ok.mean()), 4) if len(results) else 0.0,
+        'statuses': {str(k): v for k, v in statuses.items()},
+        'latency': {**percentiles(latencies[ok]), 'max_ms': round(float(latencies.max()), 1)} if len(results) else {},
+        'stages': stages
+    }
+
+def print_report(report):
+    print(f"\n📈 {report['requests']} requests in {report['elapsed_s']}s "
+          f"→ {report['throughput_rps']} req/s, error rate {report['error_rate']:.2%}")
+    print(f"   Statuses: {report['statuses']}")
+    latency = report['latency']
+    if 'p50_ms' in latency:
+        print(f"   Latency (successful): p50 {latency['p50_ms']}ms | p95 {latency['p95_ms']}ms | "
+              f"p99 {latency['p99_ms']}ms | max {latency['max_ms']}ms")
+    if report['stages']:
+        print("   Server stages:")
+        for name, timing in report['stages'].items():
+            print(f"     {name:<12} mean {timing['mean_ms']:>8}ms  p95 {timing['p95_ms']:>8}ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Put a running API under load and report latency")
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument('--corpus', help="JSONL file of request payloads")
+    parser.add_argument('--synthetic', type=int, default=50, help="Synthetic manifests when no corpus is given")
+    parser.add_argument('--stops', type=int, default=10, help="Stops per synthetic manifest")
+    parser.add_argument('--time-budget-ms', type=int, default=None, help="Add an anytime budget to synthetic manifests")
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--rate', type=float, default=None, help="Open-loop arrival rate in requests/s")
+    parser.add_argument('--warmup', type=int, default=0)
+    parser.add_argument('--timeout', type=float, default=120.0)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', help="Also write the report to this file")
+    args = parser.parse_args()
+
+    if args.corpus:
+        corpus = load_corpus(args.corpus)
+    else:
+        corpus = synthetic_corpus(args.synthetic, args.stops, args.seed, time_budget_ms=args.time_budget_ms)
+    mode = f"{args.rate} req/s open-loop" if args.rate else f"{args.concurrency} concurrent clients"
+    print(f"🚚 Replaying {len(corpus)} payloads against {args.url} ({mode})")
+
+    report = run_load(args.url, corpus, args.requests, args.concurrency, args.rate, args.timeout, args.warmup)
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Report written to {args.json}")
@@ -0,0 +1,232 @@
+import time
+import numpy as np
+import kernels
+from time_windows import WARP_EPS
+
+# Moves must beat this to count, so float noise can't cause endless swapping
+EPS = 1e-9
+
+def tour_length(tour, D):
+    """Open-path length of an index tour over a distance matrix"""
+    tour = np.asarray(tour, dtype=np.intp)
+    if len(tour) < 2:
+        return 0.0
+    return float(D[tour[:-1], tour[1:]].sum())
+
+def nearest_neighbor_tour(D, start=0):
+    """Greedy nearest-neighbour construction on a distance matrix"""
+    if kernels.ENABLED:
+        return kernels.nearest_neighbor_kernel(D, start)
+    n = len(D)
+    visited = np.zeros(n, dtype=bool)
+    tour = np.empty(n, dtype=np.intp)
+    tour[0] = start
+    visited[start] = True
+    for k in range(1, n):
+        row = np.where(visited, np.inf, D[tour[k - 1]])
+        tour[k] = int(np.argmin(row))
+        visited[tour[k]] = True
+    return tour
+
+def start_tour(D, time_windows=None):
+    """Nearest neighbour, or with windows whichever of it and the deadline order is less late"""
+    tour = nearest_neighbor_tour(D)
+    if time_windows is None:
+        return tour
+    # Stops by window close (then open) after the fixed first stop; rarely late, often long
+    rest = np.lexsort((time_windows.opens[1:], time_windows.closes[1:])) + 1
+    by_deadline = np.concatenate(([0], rest)).astype(np.intp)
+    return min((tour, by_deadline), key=lambda t: (time_windows.time_warp(t, D), tour_length(t, D)))
+
+def _expired(deadline):
+    return deadline is not None and time.perf_counter() > deadline
+
+def _window_bounds(n, window):
+    """Clamp an optional (lo, hi) position window to the movable part of the path"""
+    if window is None:
+        return 1, n - 1
+    lo, hi = window
+    return max(1, lo), min(n - 1, hi)
+
+def two_opt(tour, D, deadline=None, window=None, time_windows=None):
+    """2-opt on an open path with a fixed first stop; best move per position, repeated to convergence
+
+    window=(lo, hi) limits moves to positions lo..hi for localized repair.
+    With time_windows, a move is only taken if it adds no lateness.
+    """
+    t = np.array(tour, dtype=np.intp)
+    n = len(t)
+    lo, hi = _window_bounds(n, window)
+    if kernels.ENABLED and time_windows is None:
+        # Compiled sweeps; the deadline is checked between sweeps rather than per position
+        while not _expired(deadline) and kernels.two_opt_sweep(t, D, lo, hi, EPS):
+            pass
+        return t
+    improved = True
+    while improved:
+        improved = False
+        if time_windows is not None:
+            prefix, suffix = time_windows.prefixes(t, D), time_windows.suffixes(t, D)
+        for i in range(lo, min(hi - 1, n - 2) + 1):
+            if _expired(deadline):
+                return t
+            # Reverse t[i..j] for every j > i at once
+            js = np.arange(i + 1, hi + 1)
+            a, b = t[i - 1], t[i]
+            c = t[js]
+            delta = D[a, c] - D[a, b]
+            inner = js < n - 1
+            d = t[js[inner] + 1]
+            delta[inner] += D[b, d] - D[c[inner], d]
+            if time_windows is not None:
+                j = time_windows.feasible_reversal(t, D, i, js, delta, prefix, suffix, suffix[0][1])
+                if j is not None:
+                    t[i:j + 1] = t[i:j + 1][::-1]
+                    prefix, suffix = time_windows.prefixes(t, D), time_windows.suffixes(t, D)
+                    improved = True
+                continue
+            k = int(np.argmin(delta))
+            if delta[k] < -EPS:
+                j = js[k]
+                t[i:j + 1] = t[i:j + 1][::-1]
+                improved = True
+    return t
+
+def or_opt(tour, D, deadline=None, max_segment=3, window=None, time_windows=None):
+    """Relocate segments of 1..max_segment stops (optionally reversed) to their cheapest position
+
+    window=(lo, hi) keeps both the moved segment and its new slot inside positions lo..hi.
+    With time_windows, the cheapest relocation that adds no lateness is taken.
+    """
+    t = np.array(tour, dtype=np.intp)
+    n = len(t)
+    lo, hi = _window_bounds(n, window)
+    if kernels.ENABLED and time_windows is None:
+        improved = True
+        while improved and not _expired(deadline):
+            t, improved = kernels.or_opt_sweep(t, D, lo, hi, max_segment, window is not None, EPS)
+        return t
+    if time_windows is not None:
+        prefix, suffix = time_windows.prefixes(t, D), time_windows.suffixes(t, D)
+    improved = True
+    while improved:
+        improved = False
+        for length in range(1, min(max_segment, n - 2) + 1):
+            i = lo
+            while i + length <= min(n, hi + 1):
+                if _expired(deadline):
+                    return t
+                s0, s1 = t[i], t[i + length - 1]
+                p = t[i - 1]
+                if i + length < n:
+                    nx = t[i + length]
+                    removal_gain = D[p, s0] + D[s1, nx] - D[p, nx]
+                else:
+                    removal_gain = D[p, s0]
+
+                rest = np.concatenate((t[:i], t[i + length:]))
+                left, right = rest[:-1], rest[1:]
+                # Insert after rest[k]; the last slot appends to the end of the path
+                forward = np.append(D[left, s0] + D[s1, right] - D[left, right], D[rest[-1], s0])
+                backward = np.append(D[left, s1] + D[s0, right] - D[left, right], D[rest[-1], s1])
+                forward[i - 1] = np.inf  # original position
+                if window is not None:
+                    # Slots are "after rest[k]"; keep them between lo-1 and the window end
+                    outside = np.ones(len(rest), dtype=bool)
+                    outside[max(lo - 1, 0):max(hi - length + 1, 0)] = False
+                    forward[outside] = np.inf
+                    backward[outside] = np.inf
+
+                if time_windows is not None:
+                    move = _feasible_relocation(t, D, i, length, forward, backward,
+                                                removal_gain, time_windows, prefix, suffix)
+                else:
+                    k_fwd = int(np.argmin(forward))
+                    k_bwd = int(np.argmin(backward))
+                    reverse = backward[k_bwd] < forward[k_fwd]
+                    k = k_bwd if reverse else k_fwd
+                    cost = backward[k] if reverse else forward[k]
+                    move = (k, reverse) if cost - removal_gain < -EPS else None
+
+                if move is not None:
+                    k, reverse = move
+                    segment = t[i:i + length][::-1] if reverse else t[i:i + length]
+                    t = np.concatenate((rest[:k + 1], segment, rest[k + 1:]))
+                    if time_windows is not None:
+                        prefix, suffix = time_windows.prefixes(t, D), time_windows.suffixes(t, D)
+                    improved = True
+                else:
+                    i += 1
+    return t
+
+def _feasible_relocation(t, D, i, length, forward, backward, removal_gain, time_windows, prefix, suffix):
+    """Cheapest improving (slot, reverse) for the segment at i that adds no lateness, or None"""
+    costs = np.concatenate((forward, backward)) - removal_gain
+    improving = np.flatnonzero(costs < -EPS)
+    if len(improving) == 0:
+        return None
+    improving = improving[np.argsort(costs[improving], kind='stable')]
+    slots = len(forward)
+    moves = [(int(k % slots), bool(k >= slots)) for k in improving]
+    return time_windows.feasible_relocation(t, D, i, length, moves, prefix, suffix, suffix[0][1])
+
+def local_search(tour, D, deadline=None, time_windows=None):
+    """Alternate 2-opt and Or-opt until neither improves or time runs out"""
+    t = np.array(tour, dtype=np.intp)
+    if len(t) < 4:
+        return t
+    best_length = tour_length(t, D)
+    while not _expired(deadline):
+        t = or_opt(two_opt(t, D, deadline, time_windows=time_windows), D, deadline,
+                   time_windows=time_windows)
+        length = tour_length(t, D)
+        if length >= best_length - EPS:
+            break
+        best_length = length
+    return t
+
+def cheapest_insertion(tour, D, node, time_windows=None):
+    """Best position (1..n, after the fixed first stop) to insert node, and its added length
+
+    With time_windows, the slot adding the least lateness wins and length breaks ties.
+    """
+    t = np.asarray(tour, dtype=np.intp)
+    if len(t) == 0:
+        return 0, 0.0
+    left, right = t[:-1], t[1:]
+    # Slot k means "insert before position k"; the last slot appends to the end
+    costs = np.append(D[left, node] + D[node, right] - D[left, right], D[t[-1], node])
+    if time_windows is not None:
+        warps = time_windows.insertion_warps(t, D, node)
+        costs = np.where(warps <= warps.min() + WARP_EPS, costs, np.inf)
+    k = int(np.argmin(costs))
+    return k + 1, float(costs[k])
+
+def repair(tour, D, positions, radius=8, deadline=None, time_windows=None):
+    """Localized 2-opt/Or-opt around the positions touched by an edit"""
+    t = np.array(tour, dtype=np.intp)
+    if len(t) < 4 or not positions:
+        return t
+    window = (min(positions) - radius, max(positions) + radius)
+    best_length = tour_length(t, D)
+    while not _expired(deadline):
+        t = or_opt(two_opt(t, D, deadline, window, time_windows), D, deadline, window=window,
+                   time_windows=time_windows)
+        length = tour_length(t, D)
+        if length >= best_length - EPS:
+            break
+        best_length = length
+    return t
+
+def double_bridge(tour, rng):
+    """Random double-bridge kick that keeps the first stop in place"""
+    t = np.asarray(tour, dtype=np.intp)
+    n = len(t)
+    if n < 5:
+        # Too small for a double bridge, reverse a random slice instead
+        i, j = sorted(rng.choice(np.arange(1, n), size=2, replace=False)) if n > 2 else (1, 1)
+        kicked = t.copy()
+        kicked[i:j + 1] = kicked[i:j + 1][::-1]
+        return kicked
+    p1, p2, p3 = sorted(rng.choice(np.arange(1, n), size=3, replace=False))
+    return np.concatenate((t[:p1], t[p2:p3], t[p1:p2], t[p3:]))
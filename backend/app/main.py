@@ -1,11 +1,31 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Response
 from pydantic import BaseModel
 from .create_route_alternatives import create_route_alternatives
-from .ai_model import RouteScorer, route_features, load_model_with_scaler
-from .traffic_service import get_route_traffic_analysis
-import torch
-import random
+from .model_registry import ModelRegistry
+from .anytime_search import anytime_optimize
+from .metaheuristics import multistart_optimize, METHODS as METAHEURISTICS
+from .route_fingerprint import dedupe_routes, route_permutation
+from .pruning import haversine_lengths, co2_bounds, routing_order
+from .plan_sessions import PlanStore, PlanConflict
+from .segment_store import SegmentStore
+from .stage_timing import StageTimer
+from .fast_json import FastJSONResponse, dumps as json_body
+from .shared_cache import get_shared_cache
+from .elevation import get_elevation_service
+from .admission import AdmissionController, Overloaded, estimate_cost
+from .routing_backends import backends as routing_backends, get_backend, default_backend_name, RoutingError
+from .fleet import solve_fleet, FleetError
+from .pareto import pareto_search, non_dominated, OBJECTIVES
+from .time_windows import TimeWindows, has_time_windows, minutes_per_km, TRAFFIC_SPEEDS_KMH
+from .utils import haversine_matrix
+from .emission_factors import (EMISSION_FACTORS, CONGESTION_PENALTIES, VEHICLE_TYPES, FUEL_TYPES,
+                               TRAFFIC_CONDITIONS, ROUTE_TYPES, combination_index, route_type_indices,
+                               co2_scores, co2_matrix, grade_co2, grade_co2_matrix)
+import os
+import time
+import numpy as np
 import hashlib
+import json
 from fastapi.middleware.cors import CORSMiddleware
 
 app = FastAPI(title="AI Green Routing API", version="1.0.0")
@@ -24,148 +44,689 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Load trained model and scaler
+# Load trained model and scaler from the versioned registry
 print("🚀 Starting AI Green Routing API...")
-model, scaler = load_model_with_scaler()
+model_registry = ModelRegistry()
+model_registry.load_initial()
+
+# Compile the optional Numba kernels now so the first request doesn't wait for them.
+# Bare import: the search modules import it that way, and this must be the same instance.
+import kernels
+kernels_ms = kernels.warm_up()
+if kernels_ms is not None:
+    print(f"⚡ Routing kernels compiled in {kernels_ms:.0f}ms")
+
+# Optionally pick up newly published versions without a restart
+if float(os.environ.get('MODEL_WATCH_INTERVAL', '0')) > 0:
+    model_registry.start_watcher(float(os.environ['MODEL_WATCH_INTERVAL']))
 
 class OptimizeRequest(BaseModel):
     stops: list
     vehicle_type: str = "Car"  # Car, Truck, Bus, Motorcycle
     fuel_type: str = "Petrol"  # Electric, Hybrid, Petrol, Diesel
     traffic_conditions: str = "Moderate"  # Free flow, Moderate, Heavy
+    time_budget_ms: int = None  # Anytime search budget, e.g. 300 for the UI, 30000 for batch
+    metaheuristic: str = None  # annealing or genetic, run as parallel seeded starts
+    metaheuristic_starts: int = None  # Defaults to one start per solver process
+    routing_backend: str = None  # Named routing backend; defaults to the deployment's
+    geometry_format: str = "waypoints"  # or "columns": route_geometry {lats, lons, leg_offsets}
+    pareto: bool = False  # Also return the CO2 / distance / duration trade-off front
+
+# "waypoints" is a list of {lat, lon} dicts; "columns" is parallel arrays, far cheaper to encode
+GEOMETRY_FORMATS = ("waypoints", "columns")
+
+# Search budget for requests with time windows that don't set their own
+TIME_WINDOW_BUDGET_MS = int(os.environ.get('TIME_WINDOW_BUDGET_MS', '1000'))
+# Search budget for Pareto requests that don't set their own, and the most routes the front returns
+PARETO_BUDGET_MS = int(os.environ.get('PARETO_BUDGET_MS', '1000'))
+PARETO_MAX_ROUTES = int(os.environ.get('PARETO_MAX_ROUTES', '8'))
+
+class ModelReloadRequest(BaseModel):
+    version: str = None  # Defaults to the newest registry version
+
+@app.get("/admin/model")
+def model_status():
+    return model_registry.status()
+
+@app.post("/admin/model/reload", status_code=202)
+def reload_model(req: ModelReloadRequest = None):
+    # Loading and smoke-testing happen off the request path; the swap is atomic
+    version = req.version if req else None
+    if version is not None and version not in model_registry.status()['available_versions']:
+        raise HTTPException(status_code=404, detail=f"Unknown model version: {version}")
+    if not model_registry.reload_in_background(version):
+        raise HTTPException(status_code=409, detail="A model reload is already in progress")
+    # Other server workers pick the request up from their registry watchers
+    model_registry.request_reload(version)
+    return {"status": "loading", "requested_version": version, "serving_version": model_registry.current().version}
+
+@app.get("/admin/routing")
+def routing_status():
+    return {
+        "default": default_backend_name(),
+        "backends": [backend.health() for backend in routing_backends().values()]
+    }
+
+def routing_backend_or_422(name):
+    try:
+        return get_backend(name)
+    except KeyError as e:
+        raise HTTPException(status_code=422, detail=str(e.args[0]))
+
+# Bounded interactive and bulk lanes in front of the expensive endpoints
+admission = AdmissionController()
+
+# Road legs and recent responses shared by every server worker (None unless SHARED_CACHE_PATH is set)
+shared_cache = get_shared_cache()
+
+# Terrain heights for gradient-aware CO2 (None unless DEM_DIR points at .hgt tiles)
+elevation = get_elevation_service()
+if elevation is not None:
+    print(f"⛰️  Elevation from DEM tiles in {elevation.directory}")
+
+@app.get("/admin/admission")
+def admission_status():
+    # With the shared cache (as under serve.py), totals cover every worker on the node
+    return admission.node_stats(shared_cache) if shared_cache else admission.stats()
+
+@app.get("/admin/cache")
+def cache_status():
+    return shared_cache.stats() if shared_cache else {"enabled": False}
+
+@app.get("/admin/elevation")
+def elevation_status():
+    return elevation.stats() if elevation else {"enabled": False}
+
+def result_cache_key(req):
+    payload = json.dumps(req.model_dump(), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def admit(cost_ms, timer):
+    """Take a slot in the request's lane, or reject with 503 and Retry-After"""
+    try:
+        with timer.stage("queue"):
+            return admission.acquire(cost_ms)
+    except Overloaded as e:
+        print(f"🚦 Rejected request estimated at {cost_ms:.0f}ms: {e}")
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
 
 @app.post("/optimize")
 def optimize(req: OptimizeRequest):
+    timer = StageTimer()
+    # Identical requests from any worker are answered from the shared cache without queueing
+    cache_key = result_cache_key(req) if shared_cache else None
+    if cache_key:
+        cached = shared_cache.get_result(cache_key)
+        if cached is not None:
+            return Response(content=cached, media_type="application/json",
+                            headers={"Server-Timing": "cache;desc=hit"})
+    
+    budget_ms = req.time_budget_ms
+    if budget_ms is None and has_time_windows(req.stops):
+        budget_ms = TIME_WINDOW_BUDGET_MS
+    elif budget_ms is None and req.pareto:
+        budget_ms = PARETO_BUDGET_MS
+    lane = admit(estimate_cost(len(req.stops), budget_ms, req.metaheuristic), timer)
+    start = time.perf_counter()
+    try:
+        response = run_optimize(req, timer)
+    finally:
+        lane.release((time.perf_counter() - start) * 1000)
+    # Encode once, straight to bytes; the same body goes to the shared cache
+    with timer.stage("serialize"):
+        body = json_body(response)
+    if cache_key:
+        shared_cache.put_result(cache_key, body)
+    # Per-stage timings for load tests and browser devtools
+    return Response(content=body, media_type="application/json", headers={"Server-Timing": timer.header()})
+
+def run_optimize(req, timer):
     # Remove deterministic seeding to allow route variation
     
-    # Generate dramatically different route alternatives
-    candidates = create_route_alternatives(req.stops)
+    search_stats = None
+    if req.time_budget_ms is not None and req.time_budget_ms <= 0:
+        raise HTTPException(status_code=422, detail="time_budget_ms must be positive")
+    backend = routing_backend_or_422(req.routing_backend)
+    geometry_format_or_422(req.geometry_format)
+    time_windows = time_windows_or_422(req.stops, req.traffic_conditions)
     
-    # Find the route with lowest adjusted score for these specific parameters
-    best_route = None
-    best_score = float("inf")
-    best_distance = 0
-    best_co2 = 0
+    if req.pareto:
+        if time_windows is not None or req.metaheuristic is not None:
+            raise HTTPException(status_code=422, detail="pareto search does not support time windows or metaheuristics")
+        return run_pareto(req, backend, timer)
     
+    if time_windows is not None:
+        # Windows are enforced inside the search; the heuristic alternatives would ignore them
+        if req.metaheuristic is not None:
+            raise HTTPException(status_code=422, detail="metaheuristic search does not support time windows")
+        budget_ms = req.time_budget_ms or TIME_WINDOW_BUDGET_MS
+        with timer.stage("search"):
+            D = haversine_matrix(req.stops)
+            search = anytime_optimize(req.stops, budget_ms, D=D, time_windows=time_windows)
+        candidates = [search['route']]
+        search_stats = search['stats']
+        print(f"🕒 Time-window search: {search_stats['final_length_km']:.2f}km, "
+              f"{search_stats['time_warp_minutes']:.1f} min late in {search_stats['used_ms']:.0f}/{budget_ms}ms")
+    elif req.metaheuristic is not None:
+        if req.metaheuristic not in METAHEURISTICS:
+            raise HTTPException(status_code=422, detail=f"metaheuristic must be one of {list(METAHEURISTICS)}")
+        # Independent seeded starts across the process pool; best of all workers wins
+        with timer.stage("search"):
+            search = multistart_optimize(req.stops, req.metaheuristic, starts=req.metaheuristic_starts,
+                                         time_budget_ms=req.time_budget_ms)
+        candidates = [search['route']]
+        search_stats = search['stats']
+        print(f"🧬 {req.metaheuristic}: {search_stats['final_length_km']:.2f}km best of "
+              f"{search_stats['starts']} starts in {search_stats['used_ms']:.0f}ms")
+    elif req.time_budget_ms is not None:
+        # Anytime search: best tour found before the deadline
+        with timer.stage("search"):
+            search = anytime_optimize(req.stops, req.time_budget_ms)
+        candidates = [search['route']]
+        search_stats = search['stats']
+        print(f"⏱️  Anytime search: {search_stats['final_length_km']:.2f}km in "
+              f"{search_stats['used_ms']:.0f}/{req.time_budget_ms}ms")
+    else:
+        # Generate dramatically different route alternatives
+        with timer.stage("candidates"):
+            candidates = create_route_alternatives(req.stops)
+    
+    # Identical tours (or reversals) would only repeat the same routing calls
+    with timer.stage("dedupe"):
+        candidates, permutations = unique_candidates(candidates, req.stops)
     print(f"\n🔍 Evaluating {len(candidates)} route alternatives...")
     
+    # Road-route candidates in order of promise, skipping any that cannot win.
+    # Legs are fetched once per request and reused for the winner's waypoints.
+    segments = SegmentStore(backend, shared=shared_cache)
+    with timer.stage("scoring"):
+        best_index, best_distance, best_co2 = select_best_candidate(candidates, permutations, req, segments)
+    best_route = candidates[best_index]
+    
+    # Create mapping of optimized route to original input indices (1-based)
+    route_mapping = route_mapping_for(best_route, req.stops)
+    print(f"\n✅ Selected: {' → '.join(map(str, route_mapping))} | {best_distance:.2f}km | {best_co2:.2f}kg CO2\n")
+    
+    # Road waypoints for map visualization, sliced from legs routed during scoring
+    with timer.stage("geometry"):
+        route_geometry = segments.geometry(best_route)
+        geometry = geometry_fields(route_geometry, req.geometry_format)
+        profile = elevation_profile(route_grade(route_geometry), req.vehicle_type, req.fuel_type)
+    print(f"🗺️  Road legs: {segments.fetched} fetched, {segments.reused} reused")
+    
+    response = {
+        "best_route": best_route, 
+        **geometry,  # For map visualization
+        "route_mapping": route_mapping,
+        "predicted_co2": round(best_co2, 2),
+        "total_distance": round(best_distance, 2),
+        "input_features": input_features(req)
+    }
+    if profile is not None:
+        response["elevation"] = profile
+    if search_stats is not None:
+        response["search"] = search_stats
+    if time_windows is not None:
+        response["schedule"] = time_windows.report(search['tour'], D)
+    return response
+
+def input_features(req):
+    # Default engine sizes for the response
+    default_engines = {'Car': 2.0, 'Truck': 4.5, 'Bus': 5.0, 'Motorcycle': 1.5}
+    return {
+        "vehicle_type": req.vehicle_type,
+        "fuel_type": req.fuel_type,
+        "traffic_conditions": req.traffic_conditions,
+        "derived_engine_size": default_engines.get(req.vehicle_type, 2.0),
+        "derived_speed": TRAFFIC_SPEEDS_KMH.get(req.traffic_conditions, 45)
+    }
+
+def run_pareto(req, backend, timer):
+    """Lowest-CO2 route plus the CO2 / distance / duration trade-off front it belongs to
+
+    Trade-off tours are searched on the road distance and duration tables,
+    keeping only non-dominated ones. Each survivor is then road-routed and
+    scored once for all three objectives, and the front is filtered again
+    on the exact values, since CO2 also depends on route type and climb.
+    """
+    if not req.stops:
+        raise HTTPException(status_code=422, detail="pareto search needs at least one stop")
+    budget_ms = req.time_budget_ms or PARETO_BUDGET_MS
+    with timer.stage("search"):
+        distance, duration = road_tables(backend, req.stops)
+        archive, search_stats = pareto_search(distance, duration, budget_ms, max_size=PARETO_MAX_ROUTES)
+    _, tours = archive.front()
+    candidates = [[req.stops[k] for k in tour] for tour in tours]
+    print(f"\n⚖️  Pareto search: {len(candidates)} trade-off tours from {search_stats['tours']} searched "
+          f"in {search_stats['used_ms']:.0f}/{budget_ms}ms")
+    
+    segments = SegmentStore(backend, shared=shared_cache)
+    with timer.stage("scoring"):
+        F, grades = score_objectives(candidates, req, segments)
+        front = np.flatnonzero(non_dominated(F))
+        # Greenest first; it is the route returned at the top level
+        front = front[np.lexsort(F[front].T[::-1])]
+    best = int(front[0])
+    best_route = candidates[best]
+    print(f"✅ Front of {len(front)}: {F[front, 0].min():.2f}-{F[front, 0].max():.2f}kg CO2, "
+          f"{F[front, 2].min():.0f}-{F[front, 2].max():.0f} min")
+    
+    with timer.stage("geometry"):
+        geometry = geometry_fields(segments.geometry(best_route), req.geometry_format)
+    print(f"🗺️  Road legs: {segments.fetched} fetched, {segments.reused} reused")
+    
+    # Objectives each front member is best at
+    winners = front[np.argmin(F[front], axis=0)]
+    response = {
+        "best_route": best_route,
+        **geometry,
+        "route_mapping": route_mapping_for(best_route, req.stops),
+        "predicted_co2": round(float(F[best, 0]), 2),
+        "total_distance": round(float(F[best, 1]), 2),
+        "input_features": input_features(req),
+        "pareto_front": [
+            {
+                "route_mapping": route_mapping_for(candidates[k], req.stops),
+                "predicted_co2": round(float(F[k, 0]), 2),
+                "total_distance": round(float(F[k, 1]), 2),
+                "duration_minutes": round(float(F[k, 2]), 1),
+                "best_for": [name for name, winner in zip(OBJECTIVES, winners) if winner == k]
+            }
+            for k in front.tolist()
+        ],
+        "search": {**search_stats, "front_size": len(front)}
+    }
+    profile = elevation_profile(grades[best], req.vehicle_type, req.fuel_type)
+    if profile is not None:
+        response["elevation"] = profile
+    return response
+
+def road_tables(backend, stops):
+    """Road distance (km) and duration (s) tables, with straight-line estimates where the router has none"""
+    estimate = get_backend('haversine')
+    try:
+        distance, duration = backend.table(stops)
+    except RoutingError as e:
+        print(f"Routing table error: {e}, using straight-line estimates")
+        return estimate.table(stops)
+    missing = ~(np.isfinite(distance) & np.isfinite(duration))
+    if missing.any():
+        fallback_distance, fallback_duration = estimate.table(stops)
+        distance = np.where(missing, fallback_distance, distance)
+        duration = np.where(missing, fallback_duration, duration)
+    return distance, duration
+
+def score_objectives(candidates, req, segments):
+    """(candidate, objective) array of CO2, road distance and minutes, each route's legs fetched once"""
+    F = np.zeros((len(candidates), len(OBJECTIVES)))
+    grades = []
     for i, route in enumerate(candidates):
-        # Calculate distance using road-aware routing
-        from .utils import calculate_route_distance
-        distance = calculate_route_distance(route)
-        
-        # Create route mapping for debugging
-        route_indices = []
-        for stop in route:
-            for j, original_stop in enumerate(req.stops):
-                if stop['lat'] == original_stop['lat'] and stop['lon'] == original_stop['lon']:
-                    route_indices.append(j + 1)
-                    break
-        
-        print(f"Route {i+1}: {' → '.join(map(str, route_indices))} | Distance: {distance:.2f}km")
-        
-        # Use distance as primary factor for CO2 calculation
-        # CO2 is roughly proportional to distance
-        base_co2_per_km = {
-            'Car': 0.15,      # 150g CO2/km
-            'Motorcycle': 0.10, # 100g CO2/km  
-            'Truck': 0.40,    # 400g CO2/km
-            'Bus': 0.55       # 550g CO2/km
-        }
-        
-        fuel_multipliers = {
-            'Electric': 0.3,
-            'Hybrid': 0.7, 
-            'Petrol': 1.0,
-            'Diesel': 1.1
-        }
-        
-        # Calculate CO2 based on distance and vehicle characteristics
-        co2_per_km = base_co2_per_km.get(req.vehicle_type, 0.15)
-        fuel_factor = fuel_multipliers.get(req.fuel_type, 1.0)
+        legs = segments.legs(route)
+        distance = sum(leg.distance_km for leg in legs)
+        type_idx = route_type_indices([analyze_route_characteristics(route, distance)['type']])
+        co2 = float(co2_scores([distance], type_idx, req.vehicle_type, req.fuel_type, req.traffic_conditions)[0])
+        grade = route_grade(segments.geometry(route))
+        if grade is not None:
+            co2 += grade_co2(*grade, req.vehicle_type, req.fuel_type)
+        F[i] = co2, distance, sum(leg.duration_s for leg in legs) / 60.0
+        grades.append(grade)
+    return F, grades
+
+def geometry_format_or_422(geometry_format):
+    if geometry_format not in GEOMETRY_FORMATS:
+        raise HTTPException(status_code=422, detail=f"geometry_format must be one of {list(GEOMETRY_FORMATS)}")
+
+def geometry_fields(route_geometry, geometry_format):
+    """route_waypoints dicts, or columnar route_geometry arrays encoded straight from NumPy"""
+    if geometry_format == "columns":
+        return {"route_geometry": route_geometry.to_columns()}
+    return {"route_waypoints": route_geometry.to_waypoints()}
+
+def route_grade(route_geometry):
+    """Per-leg climb and descent (m) along road geometry, or None without DEM tiles"""
+    if elevation is None:
+        return None
+    return elevation.climb_descent(route_geometry)
+
+def elevation_profile(grade, vehicle_type, fuel_type):
+    """Response summary of a route_grade result, or None without DEM tiles"""
+    if grade is None:
+        return None
+    climb, descent = grade
+    return {
+        "climb_m": round(float(climb.sum()), 1),
+        "descent_m": round(float(descent.sum()), 1),
+        "grade_co2": round(grade_co2(climb, descent, vehicle_type, fuel_type), 2),
+        "leg_climb_m": np.round(climb, 1),
+        "leg_descent_m": np.round(descent, 1)
+    }
+
+def time_windows_or_422(stops, traffic_conditions):
+    try:
+        return TimeWindows.from_stops(stops, minutes_per_km(traffic_conditions))
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=422, detail=f"Invalid time window: {e}")
+
+# Live plans for incremental edits during a shift, shared by every worker through the shared cache
+plan_store = PlanStore(shared=shared_cache, backend_for=lambda params: get_backend(params["routing_backend"]))
+
+class PlanCreateRequest(BaseModel):
+    stops: list
+    vehicle_type: str = "Car"
+    fuel_type: str = "Petrol"
+    traffic_conditions: str = "Moderate"
+    routing_backend: str = None
+
+class PlanPatchRequest(BaseModel):
+    insert: list = []  # New stops, placed by cheapest insertion
+    remove: list = []  # stop_ids returned by earlier plan responses
+
+@app.post("/plans", status_code=201)
+def create_plan(req: PlanCreateRequest):
+    start = time.perf_counter()
+    backend = routing_backend_or_422(req.routing_backend)
+    time_windows_or_422(req.stops, req.traffic_conditions)
+    session = plan_store.create({
+        "vehicle_type": req.vehicle_type,
+        "fuel_type": req.fuel_type,
+        "traffic_conditions": req.traffic_conditions,
+        "routing_backend": backend.name
+    }, backend, shared_cache)
+    with session.lock:
+        session.solve(req.stops)
+        save_plan_or_409(session)
+        response = plan_response(session, {"solve_ms": round((time.perf_counter() - start) * 1000, 2)})
+    return FastJSONResponse(response, status_code=201)
+
+@app.get("/plans/{plan_id}")
+def get_plan(plan_id: str):
+    session = get_plan_or_404(plan_id)
+    with session.lock:
+        return FastJSONResponse(plan_response(session, {}))
+
+@app.patch("/plans/{plan_id}")
+def patch_plan(plan_id: str, req: PlanPatchRequest):
+    session = get_plan_or_404(plan_id)
+    with session.lock:
+        unknown = [stop_id for stop_id in req.remove if stop_id not in session.node_of]
+        if unknown:
+            raise HTTPException(status_code=422, detail=f"Unknown stop_ids: {unknown}")
+        time_windows_or_422(req.insert, session.params["traffic_conditions"])
         
-        # Traffic impact on efficiency
-        traffic_multipliers = {
-            'Free flow': 0.9,   # More efficient at highway speeds
-            'Moderate': 1.0,    # Baseline
-            'Heavy': 1.3        # Stop-and-go increases consumption
-        }
+        # Repair only around the edited positions, reusing the matrix and cached legs
+        start = time.perf_counter()
+        touched = []
+        if req.remove:
+            touched += session.remove(req.remove)
+        if req.insert:
+            touched += session.insert(req.insert)
+        repair_ms = (time.perf_counter() - start) * 1000
+        print(f"🩹 Plan {plan_id[:8]}: +{len(req.insert)}/-{len(req.remove)} stops repaired in {repair_ms:.1f}ms")
+        save_plan_or_409(session)
+        response = plan_response(session, {"repair_ms": round(repair_ms, 2), "touched_positions": touched})
+    return FastJSONResponse(response)
+
+@app.delete("/plans/{plan_id}", status_code=204)
+def delete_plan(plan_id: str):
+    if not plan_store.delete(plan_id):
+        raise HTTPException(status_code=404, detail="Plan not found or expired")
+
+def save_plan_or_409(session):
+    try:
+        plan_store.touch(session)
+    except PlanConflict as e:
+        raise HTTPException(status_code=409, detail=f"{e}; fetch it again and retry")
+
+def get_plan_or_404(plan_id):
+    session = plan_store.get(plan_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Plan not found or expired")
+    return session
+
+def plan_response(session, stats):
+    """Current plan with road distance and CO2, fetching only new road legs"""
+    params = session.params
+    route = session.route()
+    distance, route_geometry, fetched = session.road_legs()
+    route_type = analyze_route_characteristics(route, distance)['type']
+    co2 = float(co2_scores([distance], route_type_indices([route_type]), params["vehicle_type"],
+                           params["fuel_type"], params["traffic_conditions"])[0])
+    grade = route_grade(route_geometry)
+    if grade is not None:
+        co2 += grade_co2(*grade, params["vehicle_type"], params["fuel_type"])
+    profile = elevation_profile(grade, params["vehicle_type"], params["fuel_type"])
+    response = {
+        "plan_id": session.plan_id,
+        "route": route,
+        "route_waypoints": route_geometry.to_waypoints(),
+        "predicted_co2": round(co2, 2),
+        "total_distance": round(distance, 2),
+        "input_features": params,
+        "stats": {**stats, "road_legs_fetched": fetched, "stops": len(route)},
+        "expires_at": session.updated_at + plan_store.ttl
+    }
+    if profile is not None:
+        response["elevation"] = profile
+    time_windows = session.time_windows()
+    if time_windows is not None:
+        response["schedule"] = time_windows.report(session.tour, session.D)
+    return response
+
+class CompareRequest(BaseModel):
+    stops: list
+    # Restrict the matrix to a subset of each axis; defaults to every known value
+    vehicle_types: list = VEHICLE_TYPES
+    fuel_types: list = FUEL_TYPES
+    traffic_conditions: list = TRAFFIC_CONDITIONS
+    routing_backend: str = None
+
+@app.post("/optimize/compare")
+def optimize_compare(req: CompareRequest):
+    """Score every candidate against every vehicle x fuel x traffic combination"""
+    # Compare road-routes every candidate rather than only the promising ones
+    lane = admit(estimate_cost(len(req.stops), candidates=6), StageTimer())
+    start = time.perf_counter()
+    try:
+        return run_compare(req)
+    finally:
+        lane.release((time.perf_counter() - start) * 1000)
+
+def run_compare(req):
+    for values, labels in ((req.vehicle_types, VEHICLE_TYPES), (req.fuel_types, FUEL_TYPES),
+                           (req.traffic_conditions, TRAFFIC_CONDITIONS)):
+        unknown = [value for value in values if value not in labels]
+        if unknown or not values:
+            raise HTTPException(status_code=422, detail=f"Unsupported values {unknown}; expected some of {labels}")
+    
+    backend = routing_backend_or_422(req.routing_backend)
+    candidates, _ = unique_candidates(create_route_alternatives(req.stops), req.stops)
+    print(f"\n🔍 Comparing {len(candidates)} route alternatives across the fleet matrix...")
+    segments = SegmentStore(backend, shared=shared_cache)
+    distances, route_types = measure_candidates(candidates, req.stops, segments)
+    
+    # (candidate, vehicle, fuel, traffic) in one broadcast, then slice the requested axes
+    v_idx = [VEHICLE_TYPES.index(v) for v in req.vehicle_types]
+    f_idx = [FUEL_TYPES.index(f) for f in req.fuel_types]
+    t_idx = [TRAFFIC_CONDITIONS.index(t) for t in req.traffic_conditions]
+    # Climb CO2 per (candidate, vehicle, fuel), added under every traffic condition
+    grade = (np.array([grade_co2_matrix(*route_grade(segments.geometry(route))) for route in candidates])
+             if elevation else None)
+    matrix = co2_matrix(distances, route_type_indices(route_types), grade)[:, v_idx][:, :, f_idx][:, :, :, t_idx]
+    best = np.argmin(matrix, axis=0)  # (vehicle, fuel, traffic)
+    
+    best_per_combination = []
+    for vi, vehicle_type in enumerate(req.vehicle_types):
+        for fi, fuel_type in enumerate(req.fuel_types):
+            for ti, traffic in enumerate(req.traffic_conditions):
+                c = int(best[vi, fi, ti])
+                best_per_combination.append({
+                    "vehicle_type": vehicle_type,
+                    "fuel_type": fuel_type,
+                    "traffic_conditions": traffic,
+                    "candidate": c,
+                    "predicted_co2": round(float(matrix[c, vi, fi, ti]), 2)
+                })
+    
+    return {
+        "candidates": [
+            {
+                "route_mapping": route_mapping_for(route, req.stops),
+                "total_distance": round(float(distances[i]), 2),
+                "route_type": route_types[i]
+            }
+            for i, route in enumerate(candidates)
+        ],
+        "axes": {
+            "candidate": list(range(len(candidates))),
+            "vehicle_type": req.vehicle_types,
+            "fuel_type": req.fuel_types,
+            "traffic_conditions": req.traffic_conditions
+        },
+        "co2_matrix": np.round(matrix, 2).tolist(),
+        "best_per_combination": best_per_combination
+    }
+
+class FleetRequest(BaseModel):
+    depot: dict
+    stops: list  # each may carry "demand" (default 1)
+    vehicles: list  # {"id", "capacity", "vehicle_type", "fuel_type"}
+    traffic_conditions: str = "Moderate"
+    time_budget_ms: int = None  # Cap on the improvement phase; unbounded by default
+    routing_backend: str = None
+    geometry_format: str = "waypoints"
+
+@app.post("/optimize/fleet")
+def optimize_fleet(req: FleetRequest):
+    """Split a depot's stops across the fleet and score each vehicle's route"""
+    # Every stop is road-routed once, as one candidate would be
+    lane = admit(estimate_cost(len(req.stops), req.time_budget_ms, candidates=1), StageTimer())
+    start = time.perf_counter()
+    try:
+        return FastJSONResponse(run_fleet(req))
+    finally:
+        lane.release((time.perf_counter() - start) * 1000)
+
+def run_fleet(req):
+    if req.time_budget_ms is not None and req.time_budget_ms <= 0:
+        raise HTTPException(status_code=422, detail="time_budget_ms must be positive")
+    backend = routing_backend_or_422(req.routing_backend)
+    geometry_format_or_422(req.geometry_format)
+    try:
+        solution = solve_fleet(req.depot, req.stops, req.vehicles, req.time_budget_ms)
+    except (FleetError, KeyError, TypeError) as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    stats = solution['stats']
+    print(f"\n🚚 Fleet: {len(solution['routes'])} routes for {len(req.stops)} stops, "
+          f"{stats['savings_length_km']:.1f} → {stats['final_length_km']:.1f}km "
+          f"({stats['relocations']} relocations, {stats['exchanges']} exchanges) in {stats['solve_ms']:.0f}ms")
+    
+    segments = SegmentStore(backend, shared=shared_cache)
+    routes = []
+    for solved in solution['routes']:
+        vehicle = req.vehicles[solved['vehicle']]
+        route = [req.depot] + [req.stops[k] for k in solved['stops']] + [req.depot]
+        distance = segments.route_distance(route)
+        type_idx = route_type_indices([analyze_route_characteristics(route, distance)['type']])
+        vehicle_type = vehicle.get('vehicle_type', 'Car')
+        fuel_type = vehicle.get('fuel_type', 'Petrol')
+        co2 = float(co2_scores([distance], type_idx, vehicle_type, fuel_type, req.traffic_conditions)[0])
+        route_geometry = segments.geometry(route)
+        grade = route_grade(route_geometry)
+        if grade is not None:
+            co2 += grade_co2(*grade, vehicle_type, fuel_type)
+        routes.append({
+            "vehicle_id": vehicle.get('id', f"vehicle-{solved['vehicle'] + 1}"),
+            "vehicle_type": vehicle_type,
+            "fuel_type": fuel_type,
+            "capacity": vehicle['capacity'],
+            "load": solved['load'],
+            "route": route,
+            "route_mapping": [k + 1 for k in solved['stops']],
+            **geometry_fields(route_geometry, req.geometry_format),
+            "total_distance": round(distance, 2),
+            "predicted_co2": round(co2, 2)
+        })
+        profile = elevation_profile(grade, vehicle_type, fuel_type)
+        if profile is not None:
+            routes[-1]["elevation"] = profile
+    print(f"🗺️  Road legs: {segments.fetched} fetched, {segments.reused} reused")
+    
+    used = {solved['vehicle'] for solved in solution['routes']}
+    return {
+        "routes": routes,
+        "unused_vehicles": [v.get('id', f"vehicle-{k + 1}") for k, v in enumerate(req.vehicles) if k not in used],
+        "total_distance": round(sum(r["total_distance"] for r in routes), 2),
+        "predicted_co2": round(sum(r["predicted_co2"] for r in routes), 2),
+        "stats": {**stats, "road_legs_fetched": segments.fetched}
+    }
+
+def route_mapping_for(route, stops):
+    """1-based positions of a route's stops in the original request"""
+    return [j + 1 for j in route_permutation(route, stops)]
+
+def unique_candidates(candidates, stops):
+    """Drop duplicate candidates before any routing or scoring"""
+    unique, permutations = dedupe_routes(candidates, stops)
+    if len(unique) < len(candidates):
+        print(f"♻️  Dropped {len(candidates) - len(unique)} duplicate route alternatives")
+    return unique, permutations
+
+def select_best_candidate(candidates, permutations, req, segments):
+    """Lowest-CO2 candidate, road-routing only those whose lower bound can still win"""
+    from .utils import calculate_route_distance
+    lower, upper = co2_bounds(haversine_lengths(req.stops, permutations),
+                              req.vehicle_type, req.fuel_type, req.traffic_conditions)
+    v, f, t = combination_index(req.vehicle_type, req.fuel_type, req.traffic_conditions)
+    
+    best_index, best_distance, best_co2 = None, 0.0, float("inf")
+    pruned = 0
+    for i in routing_order(lower, upper):
+        # Ties keep the earlier candidate, so an equal bound only prunes later ones
+        if best_index is not None and (lower[i] > best_co2 or (lower[i] == best_co2 and i > best_index)):
+            pruned += 1
+            continue
         
-        traffic_factor = traffic_multipliers.get(req.traffic_conditions, 1.0)
+        # Calculate distance using road-aware routing
+        route = candidates[i]
+        distance = calculate_route_distance(route, segments)
+        print(f"Route {i+1}: {' → '.join(map(str, route_mapping_for(route, req.stops)))} | Distance: {distance:.2f}km")
         
         # Generic route analysis (works for any city worldwide)
-        route_analysis = analyze_route_characteristics(route, distance)
-        congestion_penalty = 1.0
-        
-        # Apply efficiency factors based on route type
-        if route_analysis['type'] == 'highway' and req.vehicle_type in ['Truck', 'Bus']:
-            congestion_penalty *= 0.2  # Highway efficiency for large vehicles
-        elif route_analysis['type'] == 'dense_urban' and req.traffic_conditions == 'Heavy':
-            congestion_penalty *= 2.2  # Dense city congestion penalty
-        elif route_analysis['type'] == 'suburban' and req.traffic_conditions == 'Heavy':
-            congestion_penalty *= 1.6  # Moderate suburban congestion
-        elif route_analysis['type'] == 'rural' and req.vehicle_type in ['Truck', 'Bus']:
-            congestion_penalty *= 0.8  # Rural roads good for large vehicles
-        
-        co2_score = distance * co2_per_km * fuel_factor * traffic_factor * congestion_penalty
+        type_idx = route_type_indices([analyze_route_characteristics(route, distance)['type']])
+        co2 = float(co2_scores([distance], type_idx, req.vehicle_type, req.fuel_type, req.traffic_conditions)[0])
+        print(f"  CO2: {co2:.2f}kg ({EMISSION_FACTORS[v, f, t]:.3f}/km × "
+              f"{CONGESTION_PENALTIES[type_idx[0], v, t]:.2f} {ROUTE_TYPES[type_idx[0]]}) | bound ≥ {lower[i]:.2f}kg")
+        # Climbing only ever adds CO2, so the distance-only lower bounds above still hold
+        grade = route_grade(segments.geometry(route))
+        if grade is not None:
+            climb_co2 = grade_co2(*grade, req.vehicle_type, req.fuel_type)
+            co2 += climb_co2
+            print(f"  ⛰️  +{climb_co2:.2f}kg for {grade[0].sum():.0f}m climb / {grade[1].sum():.0f}m descent")
         
-        print(f"  CO2: {co2_score:.2f}kg ({co2_per_km:.2f}/km × {fuel_factor} fuel × {traffic_factor} traffic × {congestion_penalty:.2f} route)")
+        if co2 < best_co2 or (co2 == best_co2 and i < best_index):
+            print(f"  ⭐ NEW BEST: Route {i+1} with {co2:.2f}kg CO2")
+            best_index, best_distance, best_co2 = int(i), distance, co2
+    
+    if pruned:
+        print(f"✂️  Pruned {pruned} of {len(candidates)} candidates without road routing")
+    return best_index, best_distance, best_co2
+
+def measure_candidates(candidates, stops, segments):
+    """Road distance and route type for each candidate"""
+    from .utils import calculate_route_distance
+    distances = np.zeros(len(candidates))
+    route_types = []
+    
+    for i, route in enumerate(candidates):
+        # Calculate distance using road-aware routing
+        distances[i] = calculate_route_distance(route, segments)
         
-        # Use CO2 score directly (distance-based)
-        adjusted_score = co2_score
+        print(f"Route {i+1}: {' → '.join(map(str, route_mapping_for(route, stops)))} | Distance: {distances[i]:.2f}km")
         
-        if adjusted_score < best_score:
-            print(f"  ⭐ NEW BEST: Route {i+1} with {adjusted_score:.2f}kg CO2")
-            best_score = adjusted_score
-            best_route = route
-            best_distance = distance
-            best_co2 = co2_score
-    
-    # Debug: Show selected route
-    selected_indices = []
-    for stop in best_route:
-        for i, original_stop in enumerate(req.stops):
-            if stop['lat'] == original_stop['lat'] and stop['lon'] == original_stop['lon']:
-                selected_indices.append(i + 1)
-                break
-    print(f"\n✅ Selected: {' → '.join(map(str, selected_indices))} | {best_distance:.2f}km | {best_co2:.2f}kg CO2\n")
-    
-    # Get default values for response
-    default_engines = {'Car': 2.0, 'Truck': 4.5, 'Bus': 5.0, 'Motorcycle': 1.5}
-    default_speeds = {'Free flow': 70, 'Moderate': 45, 'Heavy': 25}
-    
-    # Create mapping of optimized route to original input indices
-    route_mapping = []
-    for stop in best_route:
-        for i, original_stop in enumerate(req.stops):
-            if stop['lat'] == original_stop['lat'] and stop['lon'] == original_stop['lon']:
-                route_mapping.append(i + 1)  # 1-based indexing
-                break
-    
-    # Generate road waypoints for map visualization
-    from .utils import generate_road_waypoints
-    route_waypoints = []
-    for i in range(len(best_route) - 1):
-        segment_waypoints = generate_road_waypoints(best_route[i], best_route[i + 1])
-        if i == 0:
-            route_waypoints.extend(segment_waypoints)
-        else:
-            route_waypoints.extend(segment_waypoints[1:])  # Skip duplicate start point
+        # Generic route analysis (works for any city worldwide)
+        route_types.append(analyze_route_characteristics(route, distances[i])['type'])
     
-    return {
-        "best_route": best_route, 
-        "route_waypoints": route_waypoints,  # For map visualization
-        "route_mapping": route_mapping,
-        "predicted_co2": round(best_co2, 2),
-        "total_distance": round(best_distance, 2),
-        "input_features": {
-            "vehicle_type": req.vehicle_type,
-            "fuel_type": req.fuel_type,
-            "traffic_conditions": req.traffic_conditions,
-            "derived_engine_size": default_engines.get(req.vehicle_type, 2.0),
-            "derived_speed": default_speeds.get(req.traffic_conditions, 45)
-        }
-    }
+    return distances, route_types
 
 def apply_realistic_corrections(raw_co2, vehicle_type, fuel_type, engine_size, speed):
     """Apply realistic physics-based corrections to AI predictions"""
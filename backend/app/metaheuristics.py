@@ -0,0 +1,189 @@
+import math
+import time
+from multiprocessing import shared_memory
+import numpy as np
+from utils import haversine_matrix
+from local_search import tour_length, nearest_neighbor_tour, local_search, double_bridge
+from worker_pool import get_process_pool, SOLVER_PROCESSES
+
+METHODS = ('annealing', 'genetic')
+
+# Defaults when the caller gives neither an iteration count nor a time budget
+DEFAULT_ANNEALING_ITERATIONS = 50000
+DEFAULT_GENETIC_GENERATIONS = 200
+POPULATION_SIZE = 60
+
+def _reversal_delta(t, D, i, j):
+    """Change in open-path length from reversing t[i..j] (i >= 1)"""
+    a, b, c = t[i - 1], t[i], t[j]
+    delta = D[a, c] - D[a, b]
+    if j < len(t) - 1:
+        d = t[j + 1]
+        delta += D[b, d] - D[c, d]
+    return delta
+
+def simulated_annealing(D, rng, iterations=None, deadline=None):
+    """Reversal-move annealing from a kicked nearest-neighbour start"""
+    n = len(D)
+    t = double_bridge(nearest_neighbor_tour(D), rng)
+    current = tour_length(t, D)
+    best, best_length = t.copy(), current
+    iterations = iterations or (None if deadline else DEFAULT_ANNEALING_ITERATIONS)
+
+    # Initial temperature from the typical size of a random move
+    samples = [abs(_reversal_delta(t, D, *sorted(rng.choice(np.arange(1, n), 2, replace=False))))
+               for _ in range(50)]
+    t0 = max(float(np.mean(samples)), 1e-6)
+    t_end = t0 * 1e-3
+    start = time.perf_counter()
+
+    it = 0
+    chunk = 1024
+    while True:
+        if iterations is not None and it >= iterations:
+            break
+        # Fraction of the schedule completed drives geometric cooling
+        if iterations is not None:
+            progress = it / iterations
+        else:
+            progress = (time.perf_counter() - start) / max(deadline - start, 1e-9)
+        if deadline is not None and time.perf_counter() > deadline:
+            break
+        temperature = t0 * (t_end / t0) ** min(progress, 1.0)
+
+        # Draw random numbers in chunks; per-call rng overhead dominates otherwise
+        size = chunk if iterations is None else min(chunk, iterations - it)
+        pairs = np.sort(rng.integers(1, n, size=(size, 2)), axis=1)
+        accept_draws = rng.random(size)
+        for k in range(size):
+            i, j = pairs[k]
+            if i == j:
+                continue
+            delta = _reversal_delta(t, D, i, j)
+            if delta < 0 or accept_draws[k] < math.exp(-delta / temperature):
+                t[i:j + 1] = t[i:j + 1][::-1]
+                current += delta
+                if current < best_length - 1e-9:
+                    best, best_length = t.copy(), current
+        it += size
+
+    return best
+
+def _order_crossover(p1, p2, rng):
+    """OX: copy a slice from one parent, fill the rest in the other's order"""
+    m = len(p1)
+    a, b = sorted(rng.choice(m + 1, size=2, replace=False))
+    segment = p1[a:b]
+    rotated = np.roll(p2, -b)
+    fill = rotated[~np.isin(rotated, segment)]
+    child = np.empty(m, dtype=np.intp)
+    child[a:b] = segment
+    child[np.arange(b, b + m - (b - a)) % m] = fill
+    return child
+
+def genetic_algorithm(D, rng, generations=None, deadline=None, population_size=POPULATION_SIZE):
+    """Order-crossover GA over permutations of stops 1..n-1 (stop 0 stays first)"""
+    n = len(D)
+    m = n - 1
+    generations = generations or (None if deadline else DEFAULT_GENETIC_GENERATIONS)
+
+    population = np.array([rng.permutation(np.arange(1, n)) for _ in range(population_size)])
+    population[0] = nearest_neighbor_tour(D)[1:]
+
+    def lengths(pop):
+        return D[0, pop[:, 0]] + D[pop[:, :-1], pop[:, 1:]].sum(axis=1)
+
+    fitness = lengths(population)
+    generation = 0
+    while (generations is None or generation < generations) and \
+            (deadline is None or time.perf_counter() < deadline):
+        order = np.argsort(fitness)
+        children = [population[order[0]], population[order[1]]]  # elitism
+
+        # Tournament selection, three contenders per parent
+        contenders = rng.integers(0, population_size, size=(population_size, 2, 3))
+        winners = contenders[np.arange(population_size)[:, None], np.arange(2)[None, :],
+                             np.argmin(fitness[contenders], axis=2)]
+        for p1, p2 in winners[:population_size - 2]:
+            child = _order_crossover(population[p1], population[p2], rng)
+            if rng.random() < 0.3 and m > 1:
+                i, j = sorted(rng.choice(m, size=2, replace=False))
+                child[i:j + 1] = child[i:j + 1][::-1]
+            children.append(child)
+
+        population = np.array(children)
+        fitness = lengths(population)
+        generation += 1
+
+    best = population[int(np.argmin(fitness))]
+    return np.concatenate(([0], best)).astype(np.intp)
+
+def _run_start(shm_name, n, method, seed, iterations, wall_deadline):
+    """Worker entry: attach to the shared matrix and run one seeded start"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        D = np.ndarray((n, n), dtype=np.float64, buffer=shm.buf)
+        rng = np.random.default_rng(seed)
+        # Wall-clock deadline is shared by all starts, including ones that waited in the queue
+        deadline = None
+        if wall_deadline is not None:
+            deadline = time.perf_counter() + (wall_deadline - time.time())
+        if method == 'annealing':
+            tour = simulated_annealing(D, rng, iterations, deadline)
+        else:
+            tour = genetic_algorithm(D, rng, iterations, deadline)
+        # Polish with the shared 2-opt/Or-opt moves
+        tour = local_search(tour, D, deadline)
+        length = tour_length(tour, D)
+        del D
+        return [int(i) for i in tour], length, seed
+    finally:
+        shm.close()
+
+def multistart_optimize(stops, method='annealing', starts=None, iterations=None,
+                        time_budget_ms=None, seed=None, D=None):
+    """Run independent seeded starts across the process pool and keep the best"""
+    if method not in METHODS:
+        raise ValueError(f"Unknown metaheuristic '{method}', expected one of {METHODS}")
+
+    start = time.perf_counter()
+    n = len(stops)
+    if D is None:
+        D = haversine_matrix(stops)
+    starts = starts or SOLVER_PROCESSES
+    base_seed = seed if seed is not None else int(np.random.SeedSequence().entropy % (2 ** 32))
+    seeds = [base_seed + k for k in range(starts)]
+
+    if n < 4:
+        tour = [int(i) for i in nearest_neighbor_tour(D)] if n else []
+        results = [(tour, tour_length(tour, D), base_seed)]
+    else:
+        shm = shared_memory.SharedMemory(create=True, size=D.nbytes)
+        try:
+            np.ndarray(D.shape, dtype=np.float64, buffer=shm.buf)[:] = D
+            wall_deadline = time.time() + time_budget_ms / 1000.0 if time_budget_ms else None
+            futures = [
+                get_process_pool().submit(_run_start, shm.name, n, method, s, iterations, wall_deadline)
+                for s in seeds
+            ]
+            results = [f.result() for f in futures]
+        finally:
+            shm.close()
+            shm.unlink()
+
+    best_tour, best_length, best_seed = min(results, key=lambda r: r[1])
+    used_ms = (time.perf_counter() - start) * 1000.0
+    return {
+        'tour': best_tour,
+        'route': [stops[i] for i in best_tour],
+        'length_km': best_length,
+        'stats': {
+            'method': method,
+            'starts': len(results),
+            'best_seed': best_seed,
+            'start_lengths_km': [round(r[1], 3) for r in results],
+            'final_length_km': round(best_length, 3),
+            'time_budget_ms': time_budget_ms,
+            'used_ms': round(used_ms, 1)
+        }
+    }
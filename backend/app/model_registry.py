@@ -0,0 +1,218 @@
+import os
+import json
+import math
+import time
+import uuid
+import shutil
+import threading
+from collections import namedtuple
+from datetime import datetime
+import torch
+import joblib
+from ai_model import RouteScorer, hidden_sizes_from_state
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+REGISTRY_DIR = os.environ.get('MODEL_REGISTRY_DIR', os.path.join(APP_DIR, 'models'))
+
+MODEL_FILE = 'route_scorer.pt'
+SCALER_FILE = 'feature_scaler.pkl'
+META_FILE = 'meta.json'
+# Latest admin reload request; every server worker's watcher applies it once
+RELOAD_REQUEST_FILE = '.reload-request.json'
+
+# Legacy single-model artifacts, used when the registry is empty
+LEGACY_MODEL_PATH = os.path.join(APP_DIR, MODEL_FILE)
+LEGACY_SCALER_PATH = os.path.join(APP_DIR, SCALER_FILE)
+
+# [Speed, Engine_Size, Traffic(0-2), Vehicle(0-3), Fuel(0-3)]
+SMOKE_CASES = [
+    [60.0, 2.0, 0, 0, 0],
+    [30.0, 2.0, 2, 0, 2],
+    [80.0, 4.0, 1, 1, 3],
+    [25.0, 6.0, 2, 2, 0],
+]
+
+ModelBundle = namedtuple('ModelBundle', ['version', 'model', 'scaler', 'loaded_at'])
+
+def list_versions(registry_dir=REGISTRY_DIR):
+    """Complete versions in the registry, oldest first"""
+    if not os.path.isdir(registry_dir):
+        return []
+    return sorted(
+        name for name in os.listdir(registry_dir)
+        if not name.startswith('.') and os.path.isfile(os.path.join(registry_dir, name, MODEL_FILE))
+    )
+
+def publish_model(model, scaler, version=None, registry_dir=REGISTRY_DIR, meta=None):
+    """Write a new model version; the directory appears atomically once complete"""
+    version = version or datetime.now().strftime('%Y%m%d-%H%M%S')
+    final_dir = os.path.join(registry_dir, version)
+    if os.path.exists(final_dir):
+        raise ValueError(f"Model version already exists: {version}")
+
+    staging_dir = os.path.join(registry_dir, f".staging-{version}-{os.getpid()}")
+    os.makedirs(staging_dir)
+    try:
+        torch.save(model.state_dict(), os.path.join(staging_dir, MODEL_FILE))
+        joblib.dump(scaler, os.path.join(staging_dir, SCALER_FILE))
+        with open(os.path.join(staging_dir, META_FILE), 'w') as f:
+            json.dump({'hidden_sizes': list(model.hidden_sizes), **(meta or {})}, f, indent=2)
+        os.rename(staging_dir, final_dir)
+    except Exception:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
+    return version
+
+def load_bundle(model_path, scaler_path, version):
+    """Load model weights and scaler from disk"""
+    state = torch.load(model_path, weights_only=True)
+    model = RouteScorer(hidden_sizes_from_state(state))
+    model.load_state_dict(state)
+    model.eval()
+    scaler = joblib.load(scaler_path) if os.path.exists(scaler_path) else None
+    return ModelBundle(version, model, scaler, time.time())
+
+def smoke_test(bundle):
+    """Run sample predictions and reject models that produce garbage"""
+    if bundle.scaler is None:
+        raise ValueError("Model version has no feature scaler")
+    features = torch.FloatTensor(bundle.scaler.transform(SMOKE_CASES))
+    with torch.no_grad():
+        predictions = bundle.model(features).squeeze(1).tolist()
+    if len(predictions) != len(SMOKE_CASES) or not all(math.isfinite(p) for p in predictions):
+        raise ValueError(f"Smoke predictions failed: {predictions}")
+    return predictions
+
+class ModelRegistry:
+    """Holds the serving model and swaps in new versions without a restart"""
+
+    def __init__(self, registry_dir=REGISTRY_DIR):
+        self.registry_dir = registry_dir
+        self._bundle = ModelBundle(None, RouteScorer().eval(), None, None)
+        self._swap_lock = threading.Lock()
+        self._loader = None
+        self._watcher = None
+        self._rejected = set()
+        self._seen_request = None
+        self.last_error = None
+
+    def current(self):
+        """Snapshot of the live model; callers keep it for the whole request"""
+        return self._bundle
+
+    def load_initial(self):
+        """Load the newest registry version, falling back to the legacy artifacts"""
+        # Requests made before this process started are already reflected in the newest version
+        request = self._read_request()
+        self._seen_request = request['id'] if request else None
+        versions = list_versions(self.registry_dir)
+        try:
+            if versions:
+                self._activate(self._load_version(versions[-1]))
+            elif os.path.exists(LEGACY_MODEL_PATH):
+                self._activate(load_bundle(LEGACY_MODEL_PATH, LEGACY_SCALER_PATH, 'legacy'))
+            else:
+                print("⚠️  Trained model not found. Please run: python train_model.py")
+                return self._bundle
+            print(f"✅ Loaded model version {self._bundle.version}")
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"⚠️  Failed to load model: {e}")
+        return self._bundle
+
+    def _load_version(self, version):
+        version_dir = os.path.join(self.registry_dir, version)
+        return load_bundle(os.path.join(version_dir, MODEL_FILE),
+                           os.path.join(version_dir, SCALER_FILE), version)
+
+    def _activate(self, bundle):
+        # Rebinding a single reference is atomic; in-flight requests keep their snapshot
+        with self._swap_lock:
+            self._bundle = bundle
+
+    def reload(self, version=None):
+        """Load, validate and activate a version (the newest by default)"""
+        versions = list_versions(self.registry_dir)
+        version = version or (versions[-1] if versions else None)
+        if version is None or version not in versions:
+            raise ValueError(f"Unknown model version: {version}")
+
+        bundle = self._load_version(version)
+        smoke_test(bundle)
+        self._activate(bundle)
+        self.last_error = None
+        print(f"🔄 Swapped in model version {version}")
+        return bundle
+
+    def reload_in_background(self, version=None):
+        """Start a reload thread; returns False if one is already running"""
+        with self._swap_lock:
+            if self._loader is not None and self._loader.is_alive():
+                return False
+            self._loader = threading.Thread(target=self._safe_reload, args=(version,), daemon=True)
+            self._loader.start()
+        return True
+
+    def _safe_reload(self, version):
+        try:
+            self.reload(version)
+        except Exception as e:
+            self.last_error = str(e)
+            self._rejected.add(version)
+            print(f"⚠️  Model reload failed, keeping {self._bundle.version}: {e}")
+
+    def request_reload(self, version=None):
+        """Ask every process watching this registry to reload; this process is marked as done
+
+        The request is one small file replaced atomically, so the prefork
+        workers, which share nothing else, all see the same latest request.
+        """
+        request_id = uuid.uuid4().hex
+        os.makedirs(self.registry_dir, exist_ok=True)
+        path = os.path.join(self.registry_dir, RELOAD_REQUEST_FILE)
+        staging = f"{path}.{os.getpid()}"
+        with open(staging, 'w') as f:
+            json.dump({'id': request_id, 'version': version, 'requested_at': time.time()}, f)
+        os.replace(staging, path)
+        self._seen_request = request_id
+
+    def _read_request(self):
+        try:
+            with open(os.path.join(self.registry_dir, RELOAD_REQUEST_FILE)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def start_watcher(self, interval=30.0, follow_newest=True):
+        """Poll for reload requests and, with follow_newest, hot-load any newer version that appears"""
+        if self._watcher is not None:
+            return
+
+        def watch():
+            while True:
+                time.sleep(interval)
+                request = self._read_request()
+                if request and request.get('id') != self._seen_request:
+                    self._seen_request = request.get('id')
+                    self._safe_reload(request.get('version'))
+                    continue
+                if not follow_newest:
+                    continue
+                versions = [v for v in list_versions(self.registry_dir) if v not in self._rejected]
+                current = self._bundle.version
+                if versions and versions[-1] != current and (current in (None, 'legacy') or versions[-1] > current):
+                    self._safe_reload(versions[-1])
+
+        self._watcher = threading.Thread(target=watch, daemon=True)
+        self._watcher.start()
+
+    def status(self):
+        """Registry state for the admin endpoint"""
+        bundle = self._bundle
+        return {
+            'version': bundle.version,
+            'loaded_at': bundle.loaded_at,
+            'available_versions': list_versions(self.registry_dir),
+            'loading': self._loader is not None and self._loader.is_alive(),
+            'last_error': self.last_error
+        }
@@ -0,0 +1,130 @@
+import json
+import time
+import argparse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+from utils import haversine_distance, FALLBACK_SPEED_KMH
+from routing_replay import RouteArchive, ReplaySource, route_key, ROUTING_ARCHIVE
+
+class StandinRouter:
+    """OSRM route/table answers from a recorded archive, synthesized where a leg is missing"""
+
+    def __init__(self, archive, latency_ms, jitter_ms, error_rate, seed=None):
+        self.archive = archive
+        self.replay = ReplaySource(archive, latency_ms, jitter_ms, error_rate, seed)
+
+    def leg(self, a, b):
+        entry = self.archive.get(route_key(a, b))
+        if entry is not None:
+            return entry
+        distance = haversine_distance(a, b) * 1.3 * 1000
+        return {
+            'route': {
+                'distance': distance,
+                'duration': distance / 1000 / FALLBACK_SPEED_KMH * 3600,
+                'geometry': {'type': 'LineString', 'coordinates': [[a['lon'], a['lat']], [b['lon'], b['lat']]]}
+            },
+            'latency_ms': 0.0
+        }
+
+    def route(self, points):
+        legs = [self.leg(points[k], points[k + 1]) for k in range(len(points) - 1)]
+        coordinates = []
+        for k, entry in enumerate(legs):
+            leg_coordinates = entry['route']['geometry']['coordinates']
+            coordinates.extend(leg_coordinates if k == 0 else leg_coordinates[1:])
+        route = {
+            'distance': sum(e['route']['distance'] for e in legs),
+            'duration': sum(e['route']['duration'] for e in legs),
+            'geometry': {'type': 'LineString', 'coordinates': coordinates},
+            'legs': [{'distance': e['route']['distance'], 'duration': e['route']['duration']} for e in legs]
+        }
+        return {'code': 'Ok', 'routes': [route], 'waypoints': waypoints(points)}, legs
+
+    def table(self, points, sources, destinations):
+        legs = [[self.leg(points[i], points[j]) if i != j else None for j in destinations] for i in sources]
+        distances = [[e['route']['distance'] if e else 0.0 for e in row] for row in legs]
+        durations = [[e['route']['duration'] if e else 0.0 for e in row] for row in legs]
+        answer = {'code': 'Ok', 'distances': distances, 'durations': durations,
+                  'sources': waypoints([points[i] for i in sources]),
+                  'destinations': waypoints([points[j] for j in destinations])}
+        # A table costs about as much as its slowest leg, not the sum
+        return answer, [max((e for row in legs for e in row if e), key=lambda e: e['latency_ms'], default=None)]
+
+def waypoints(points):
+    return [{'location': [p['lon'], p['lat']], 'name': ''} for p in points]
+
+def parse_coordinates(text):
+    points = []
+    for pair in text.split(';'):
+        lon, lat = pair.split(',')
+        points.append({'lat': float(lat), 'lon': float(lon)})
+    return points
+
+def parse_indices(query, name, n):
+    if name not in query or query[name][0] == 'all':
+        return list(range(n))
+    return [int(i) for i in query[name][0].split(';')]
+
+def make_handler(router):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlsplit(self.path)
+            parts = url.path.strip('/').split('/')
+            # /{service}/v1/{profile}/{coordinates}
+            if len(parts) != 4 or parts[0] not in ('route', 'table'):
+                return self.reply(400, {'code': 'InvalidUrl', 'message': f'Unsupported path {url.path}'})
+            try:
+                points = parse_coordinates(parts[3])
+            except ValueError:
+                return self.reply(400, {'code': 'InvalidQuery', 'message': 'Malformed coordinates'})
+            if len(points) < 2 and parts[0] == 'route':
+                return self.reply(400, {'code': 'InvalidQuery', 'message': 'Need at least two coordinates'})
+
+            if parts[0] == 'route':
+                answer, legs = router.route(points)
+            else:
+                query = parse_qs(url.query)
+                answer, legs = router.table(points, parse_indices(query, 'sources', len(points)),
+                                            parse_indices(query, 'destinations', len(points)))
+            delay_ms = sum(router.replay.delay_ms(e) for e in legs)
+            time.sleep(delay_ms / 1000)
+            if router.replay.inject_error():
+                return self.reply(503, {'code': 'TooBusy', 'message': 'Injected failure'})
+            self.reply(200, answer)
+
+        def reply(self, status, body):
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+def serve(host='127.0.0.1', port=5000, archive_path=ROUTING_ARCHIVE, latency_ms='recorded',
+          jitter_ms=0.0, error_rate=0.0, seed=None):
+    archive = RouteArchive(archive_path)
+    router = StandinRouter(archive, latency_ms, jitter_ms, error_rate, seed)
+    server = ThreadingHTTPServer((host, port), make_handler(router))
+    print(f"🛰️  OSRM stand-in on http://{host}:{port} with {len(archive)} archived legs "
+          f"(latency={latency_ms}, jitter={jitter_ms}ms, errors={error_rate:.1%})")
+    print(f"   Point the API at it with OSRM_URL=http://{host}:{port}")
+    return server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local OSRM stand-in serving recorded routes")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--archive', default=ROUTING_ARCHIVE, help="JSONL archive written in ROUTING_MODE=record")
+    parser.add_argument('--latency-ms', default='recorded', help="'recorded' or a fixed delay per leg")
+    parser.add_argument('--jitter-ms', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests answered with 503")
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+    serve(args.host, args.port, args.archive, args.latency_ms, args.jitter_ms, args.error_rate,
+          args.seed).serve_forever()
@@ -0,0 +1,124 @@
+import time
+import numpy as np
+from local_search import start_tour, local_search
+
+# Objective columns of a scored front, all minimised
+OBJECTIVES = ('co2_kg', 'distance_km', 'duration_min')
+
+def non_dominated(F):
+    """Mask of rows of F that no other row dominates; of equal rows only the first is kept
+
+    One (k, k, m) comparison instead of a Python loop over pairs.
+    """
+    F = np.asarray(F, dtype=np.float64)
+    if len(F) == 0:
+        return np.zeros(0, dtype=bool)
+    weakly = (F[:, None, :] <= F[None, :, :]).all(axis=2)  # weakly[i, j]: i is nowhere worse than j
+    strictly = (F[:, None, :] < F[None, :, :]).any(axis=2)
+    dominated = (weakly & strictly).any(axis=0)
+    duplicate = np.triu(weakly & weakly.T, 1).any(axis=0)
+    return ~(dominated | duplicate)
+
+def crowding_distance(F):
+    """NSGA-II crowding distance per row; the extremes of every objective get inf"""
+    F = np.asarray(F, dtype=np.float64)
+    k, m = F.shape
+    distance = np.zeros(k)
+    if k <= 2:
+        return np.full(k, np.inf)
+    order = np.argsort(F, axis=0, kind='stable')
+    ranked = np.take_along_axis(F, order, axis=0)
+    span = ranked[-1] - ranked[0]
+    gaps = (ranked[2:] - ranked[:-2]) / np.where(span > 0, span, 1.0)
+    for j in range(m):
+        distance[order[1:-1, j]] += gaps[:, j]
+        distance[order[[0, -1], j]] = np.inf
+    return distance
+
+class ParetoArchive:
+    """Non-dominated set of (objective vector, item) pairs
+
+    Objective vectors live in one (k, m) array, so each insertion is a pair
+    of vectorized comparisons against the whole archive. Past max_size the
+    most crowded member is dropped, which keeps the ends of the front.
+    """
+
+    def __init__(self, objectives=len(OBJECTIVES), max_size=None):
+        self.objectives = np.zeros((0, objectives))
+        self.items = []
+        self.max_size = max_size
+
+    def __len__(self):
+        return len(self.items)
+
+    def add(self, f, item):
+        """Insert unless an existing member is at least as good everywhere; True if kept"""
+        f = np.asarray(f, dtype=np.float64)
+        if (self.objectives <= f).all(axis=1).any():
+            return False
+        # No member equals f, so anything f is nowhere worse than is strictly dominated
+        keep = ~(self.objectives >= f).all(axis=1)
+        self.objectives = np.vstack((self.objectives[keep], f))
+        self.items = [x for x, kept in zip(self.items, keep.tolist()) if kept] + [item]
+        if self.max_size is not None and len(self.items) > self.max_size:
+            drop = int(np.argmin(crowding_distance(self.objectives)))
+            self.objectives = np.delete(self.objectives, drop, axis=0)
+            del self.items[drop]
+        return True
+
+    def extend(self, F, items):
+        """Insert a batch: filtered against itself first, then merged member by member"""
+        F = np.asarray(F, dtype=np.float64)
+        for k in np.flatnonzero(non_dominated(F)):
+            self.add(F[k], items[k])
+
+    def front(self, by=0):
+        """(objectives, items) sorted by one objective column"""
+        order = np.argsort(self.objectives[:, by], kind='stable')
+        return self.objectives[order], [self.items[k] for k in order]
+
+def path_costs(tours, *matrices):
+    """Cost of each open path under each matrix; (tours, matrices) in one gather per matrix"""
+    T = np.asarray(tours, dtype=np.intp)
+    return np.stack([M[T[:, :-1], T[:, 1:]].sum(axis=1) for M in matrices], axis=1)
+
+def weight_order(count):
+    """Weights in [0, 1], both ends first and then by bisection, so a short budget still spans the front"""
+    weights = [1.0, 0.0]
+    step = 0.5
+    while len(weights) < count:
+        weights += np.arange(step, 1.0, 2 * step).tolist()
+        step /= 2
+    return weights[:count]
+
+def pareto_search(distance, duration, time_budget_ms, max_tours=17, max_size=None):
+    """Distance/duration trade-off tours from road tables, kept in a non-dominated archive
+
+    Each tour is local search on a weighted sum of the two tables, each
+    scaled by its mean, from weight 1 (shortest) to 0 (fastest). Road tables
+    can be asymmetric while the search moves assume symmetry, so the search
+    sees (W + W.T) / 2 and the archive is fed exact costs of the paths as
+    driven.
+    """
+    start = time.perf_counter()
+    deadline = start + time_budget_ms / 1000.0
+    n = len(distance)
+    archive = ParetoArchive(objectives=2, max_size=max_size)
+
+    scaled = [M / max(M.mean(), 1e-12) for M in (distance, duration)]
+    tours = 0
+    for w in weight_order(max_tours if n else 0):
+        if time.perf_counter() >= deadline:
+            break
+        W = w * scaled[0] + (1.0 - w) * scaled[1]
+        W = (W + W.T) / 2
+        tour = start_tour(W)
+        if n >= 4:
+            tour = local_search(tour, W, deadline)
+        archive.add(path_costs([tour], distance, duration)[0], tour)
+        tours += 1
+    return archive, {
+        'used_ms': round((time.perf_counter() - start) * 1000.0, 1),
+        'tours': tours,
+        'archive_size': len(archive)
+    }
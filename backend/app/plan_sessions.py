@@ -0,0 +1,303 @@
+import os
+import time
+import uuid
+import threading
+from collections import OrderedDict
+import numpy as np
+from utils import haversine_row, haversine_matrix_from_coords, stop_coordinates
+from local_search import start_tour, local_search, cheapest_insertion, repair
+from segment_store import SegmentStore
+from time_windows import TimeWindows, minutes_per_km
+
+PLAN_TTL_SECONDS = float(os.environ.get('PLAN_TTL_SECONDS', str(6 * 3600)))
+PLAN_STORE_MAX_BYTES = int(os.environ.get('PLAN_STORE_MAX_BYTES', str(256 * 1024 * 1024)))
+PLAN_STORE_MAX_SESSIONS = int(os.environ.get('PLAN_STORE_MAX_SESSIONS', '10000'))
+
+# Positions either side of an edit that local repair may touch
+REPAIR_RADIUS = 8
+
+# Rough per-stop overhead used for memory accounting
+STOP_BYTES = 400
+
+class PlanConflict(Exception):
+    """Another request changed the plan first; the edit was not saved"""
+
+class PlanSession:
+    """One driver's live plan: stops, tour, distance matrix and cached road legs"""
+
+    def __init__(self, plan_id, params, backend=None, shared=None):
+        self.plan_id = plan_id
+        self.params = params
+        self.stops = []          # every stop ever added; list position is the matrix node
+        self.stop_ids = []       # stable external id per node
+        self.node_of = {}        # stop_id -> node
+        self.active = []
+        self.tour = np.zeros(0, dtype=np.intp)
+        self.segments = SegmentStore(backend, shared=shared)  # road legs reused across edits
+        self.lock = threading.Lock()
+        self.next_stop_id = 1
+        self.updated_at = time.time()
+        self.version = 0         # bumped on every save to the shared store
+        self._D = np.zeros((0, 0))
+        self._lats = np.zeros(0)
+        self._lons = np.zeros(0)
+
+    def state(self):
+        """JSON-safe snapshot from which any worker can rebuild this session"""
+        return {
+            'params': self.params,
+            'stops': self.stops,
+            'stop_ids': self.stop_ids,
+            'active': self.active,
+            'tour': self.tour.tolist(),
+            'next_stop_id': self.next_stop_id
+        }
+
+    @classmethod
+    def from_state(cls, plan_id, state, version, backend=None, shared=None):
+        """Rebuild a saved session; the matrix is recomputed and road legs come from the shared cache"""
+        session = cls(plan_id, state['params'], backend, shared)
+        session.stops = state['stops']
+        session.stop_ids = state['stop_ids']
+        session.active = state['active']
+        session.node_of = {stop_id: node for node, stop_id in enumerate(session.stop_ids) if session.active[node]}
+        session.tour = np.array(state['tour'], dtype=np.intp)
+        session.next_stop_id = state['next_stop_id']
+        session.version = version
+        if session.stops:
+            session._lats, session._lons = stop_coordinates(session.stops)
+            session._D = np.array(haversine_matrix_from_coords(session._lats, session._lons))
+        return session
+
+    @property
+    def D(self):
+        m = len(self.stops)
+        return self._D[:m, :m]
+
+    def _add_node(self, stop):
+        """Append a stop and grow the matrix by one row/column"""
+        m = len(self.stops)
+        if m == len(self._D):
+            # Double capacity so repeated inserts stay amortised O(n) each
+            capacity = max(8, 2 * m)
+            grown = np.zeros((capacity, capacity))
+            grown[:m, :m] = self._D[:m, :m]
+            self._D = grown
+            self._lats = np.resize(self._lats, capacity)
+            self._lons = np.resize(self._lons, capacity)
+        row = haversine_row(stop, self._lats[:m], self._lons[:m])
+        self._D[m, :m] = row
+        self._D[:m, m] = row
+        self._D[m, m] = 0.0
+        self._lats[m] = stop['lat']
+        self._lons[m] = stop['lon']
+
+        stop_id = self.next_stop_id
+        self.next_stop_id += 1
+        self.stops.append(stop)
+        self.stop_ids.append(stop_id)
+        self.node_of[stop_id] = m
+        self.active.append(True)
+        return m
+
+    def time_windows(self):
+        """Windows indexed like self.D, or None while no active stop has one
+
+        Removed stops keep their matrix rows until compaction; they get an
+        always-open window, so they can't turn on windowed search or fail
+        validation, and node numbers still match the matrix.
+        """
+        stops = [stop if alive else {} for stop, alive in zip(self.stops, self.active)]
+        return TimeWindows.from_stops(stops, minutes_per_km(self.params['traffic_conditions']))
+
+    def solve(self, stops):
+        """Initial plan: nearest neighbour (or deadline order) plus full local search"""
+        for stop in stops:
+            self._add_node(stop)
+        if self.stops:
+            time_windows = self.time_windows()
+            self.tour = local_search(start_tour(self.D, time_windows), self.D, time_windows=time_windows)
+
+    def insert(self, stops):
+        """Cheapest-insert new stops, then repair locally; returns touched positions"""
+        touched = []
+        for stop in stops:
+            node = self._add_node(stop)
+            position, _ = cheapest_insertion(self.tour, self.D, node, self.time_windows())
+            self.tour = np.insert(self.tour, position, node)
+            # Earlier positions at or after this slot have shifted by one
+            touched = [p + 1 if p >= position else p for p in touched] + [position]
+        self.tour = repair(self.tour, self.D, touched, REPAIR_RADIUS, time_windows=self.time_windows())
+        return touched
+
+    def remove(self, stop_ids):
+        """Drop stops by id, then repair around the gaps; returns touched positions"""
+        nodes = {self.node_of[s] for s in stop_ids}
+        removed_positions = sorted(int(p) for p in np.flatnonzero(np.isin(self.tour, list(nodes))))
+        self.tour = self.tour[~np.isin(self.tour, list(nodes))]
+        for node in nodes:
+            self.active[node] = False
+            del self.node_of[self.stop_ids[node]]
+        # Each gap closes up to where the next surviving stop now sits
+        touched = sorted({p - k for k, p in enumerate(removed_positions)})
+        self.tour = repair(self.tour, self.D, touched, REPAIR_RADIUS, time_windows=self.time_windows())
+        self._compact_if_sparse()
+        return touched
+
+    def _compact_if_sparse(self):
+        """Rebuild the matrix once removed stops outnumber live ones"""
+        live = [i for i, alive in enumerate(self.active) if alive]
+        if len(live) * 2 >= len(self.stops):
+            return
+        remap = {old: new for new, old in enumerate(live)}
+        self._D = self._D[np.ix_(live, live)].copy()
+        self._lats = self._lats[live].copy()
+        self._lons = self._lons[live].copy()
+        self.stops = [self.stops[i] for i in live]
+        self.stop_ids = [self.stop_ids[i] for i in live]
+        self.active = [True] * len(live)
+        self.node_of = {stop_id: node for node, stop_id in enumerate(self.stop_ids)}
+        self.tour = np.array([remap[int(n)] for n in self.tour], dtype=np.intp)
+        # Road legs whose endpoints are gone can't be reused
+        self.segments.retain({(s['lat'], s['lon']) for s in self.stops})
+
+    def route(self):
+        """Stops in visiting order, each tagged with its stable stop_id"""
+        return [{**self.stops[n], 'stop_id': self.stop_ids[n]} for n in self.tour]
+
+    def road_legs(self):
+        """Road distance and geometry for the tour, fetching only legs not seen before"""
+        fetched_before = self.segments.fetched
+        route = [self.stops[n] for n in self.tour]
+        distance = self.segments.route_distance(route)
+        geometry = self.segments.geometry(route)
+        return distance, geometry, self.segments.fetched - fetched_before
+
+    def nbytes(self):
+        """Approximate memory held by this session"""
+        return self._D.nbytes + len(self.stops) * STOP_BYTES + self.segments.nbytes()
+
+class PlanStore:
+    """LRU session store bounded by total bytes and count, with idle expiry
+
+    With a SharedCache, every saved edit is also written to the shared
+    SQLite file with a version number, so any server worker can serve any
+    plan. The in-memory sessions are then a per-worker cache: a session is
+    rebuilt from the shared copy when this worker has none or another
+    worker has saved a newer version. An edit made against an outdated
+    version is refused with PlanConflict instead of overwriting the newer one.
+    """
+
+    def __init__(self, max_bytes=PLAN_STORE_MAX_BYTES, max_sessions=PLAN_STORE_MAX_SESSIONS,
+                 ttl=PLAN_TTL_SECONDS, shared=None, backend_for=None):
+        self.max_bytes = max_bytes
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.shared = shared
+        # Routing backend for a session rebuilt from its params
+        self.backend_for = backend_for or (lambda params: None)
+        self._sessions = OrderedDict()
+        self._sizes = {}
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def create(self, params, backend=None, shared=None):
+        session = PlanSession(uuid.uuid4().hex, params, backend, shared)
+        with self._lock:
+            self._sessions[session.plan_id] = session
+            self._sizes[session.plan_id] = 0
+        return session
+
+    def get(self, plan_id):
+        with self._lock:
+            session = self._sessions.get(plan_id)
+            if session is not None and time.time() - session.updated_at > self.ttl:
+                self._drop(plan_id)
+                session = None
+            if self.shared is not None:
+                session = self._sync(plan_id, session)
+            if session is None:
+                return None
+            if self.shared is not None:
+                self.shared.touch_plan(plan_id)
+            session.updated_at = time.time()
+            self._sessions.move_to_end(plan_id)
+            return session
+
+    def _sync(self, plan_id, session):
+        """This worker's copy of a shared plan, rebuilt when another worker has saved a newer one"""
+        version = self.shared.get_plan_version(plan_id)
+        if version is not None and session is not None and session.version == version:
+            return session
+        saved = self.shared.get_plan(plan_id) if version is not None else None
+        if session is not None:
+            self._drop(plan_id)
+        if saved is None:
+            return None
+        version, state = saved
+        session = PlanSession.from_state(plan_id, state, version, self.backend_for(state['params']), self.shared)
+        self._sessions[plan_id] = session
+        self._sizes[plan_id] = 0
+        return session
+
+    def delete(self, plan_id):
+        with self._lock:
+            dropped = self._drop(plan_id)
+        if self.shared is not None:
+            dropped = self.shared.delete_plan(plan_id) or dropped
+        return dropped
+
+    def touch(self, session):
+        """Save a changed session, record its new size and last use, then enforce the limits
+
+        Call with session.lock held. Raises PlanConflict when another worker
+        saved the plan since this copy was loaded; the stale copy is dropped.
+        """
+        if self.shared is not None:
+            if not self.shared.put_plan(session.plan_id, session.state(), session.version + 1):
+                with self._lock:
+                    if self._sessions.get(session.plan_id) is session:
+                        self._drop(session.plan_id)
+                raise PlanConflict(f"Plan {session.plan_id} was changed by another request")
+            session.version += 1
+        size = session.nbytes()
+        with self._lock:
+            if session.plan_id not in self._sessions:
+                return
+            session.updated_at = time.time()
+            self._total_bytes += size - self._sizes[session.plan_id]
+            self._sizes[session.plan_id] = size
+            self._sessions.move_to_end(session.plan_id)
+            self._evict()
+
+    def _drop(self, plan_id):
+        if plan_id not in self._sessions:
+            return False
+        del self._sessions[plan_id]
+        self._total_bytes -= self._sizes.pop(plan_id)
+        return True
+
+    def _evict(self):
+        # Sessions are kept in last-use order, so expired ones sit at the front
+        now = time.time()
+        while self._sessions:
+            plan_id, session = next(iter(self._sessions.items()))
+            if now - session.updated_at <= self.ttl:
+                break
+            self._drop(plan_id)
+        # Least recently used first, but never the session just touched
+        while len(self._sessions) > 1 and (self._total_bytes > self.max_bytes or
+                                           len(self._sessions) > self.max_sessions):
+            self._drop(next(iter(self._sessions)))
+            self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'sessions': len(self._sessions),
+                'bytes': self._total_bytes,
+                'max_bytes': self.max_bytes,
+                'evictions': self.evictions,
+                'shared': self.shared is not None
+            }
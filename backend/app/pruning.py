@@ -0,0 +1,44 @@
+import os
+import numpy as np
+from utils import stop_coordinates, haversine_pairs
+from emission_factors import EMISSION_FACTORS, CONGESTION_PENALTIES, combination_index
+
+# Road distance over straight-line distance. Great-circle distance is a true lower
+# bound between the same two points, but the router snaps stops onto the road
+# network, which can shave a little off; keep some slack below 1.0.
+MIN_DETOUR_FACTOR = float(os.environ.get('MIN_DETOUR_FACTOR', '0.9'))
+# Only used to order candidates with equal lower bounds
+MAX_DETOUR_FACTOR = float(os.environ.get('MAX_DETOUR_FACTOR', '2.0'))
+
+def haversine_lengths(stops, permutations):
+    """Straight-line length of every candidate at once
+
+    Legs are computed directly from coordinates rather than through a full
+    matrix, which would not fit in memory for decomposed bulk days.
+    """
+    if not permutations or len(permutations[0]) < 2:
+        return np.zeros(len(permutations))
+    lats, lons = stop_coordinates(stops)
+    P = np.asarray(permutations, dtype=np.intp)
+    legs = haversine_pairs(lats[P[:, :-1]], lons[P[:, :-1]], lats[P[:, 1:]], lons[P[:, 1:]])
+    return legs.sum(axis=1)
+
+def co2_bounds(straight_lengths, vehicle_type, fuel_type, traffic_conditions):
+    """Lower and upper CO2 bounds per candidate before any road routing
+
+    The route type (and so its congestion penalty) is only known after routing,
+    so the bounds take the most and least favourable penalty for this vehicle
+    and traffic combination. Climb CO2 is never negative, so the lower bound
+    also holds when elevation is added after routing.
+    """
+    v, f, t = combination_index(vehicle_type, fuel_type, traffic_conditions)
+    penalties = CONGESTION_PENALTIES[:, v, t]
+    factor = EMISSION_FACTORS[v, f, t]
+    lengths = np.asarray(straight_lengths, dtype=np.float64)
+    lower = lengths * MIN_DETOUR_FACTOR * factor * penalties.min()
+    upper = lengths * MAX_DETOUR_FACTOR * factor * penalties.max()
+    return lower, upper
+
+def routing_order(lower, upper):
+    """Most promising candidates first: by lower bound, then upper bound"""
+    return np.lexsort((upper, lower))
@@ -0,0 +1,46 @@
+import hashlib
+import numpy as np
+
+def stop_index(stops):
+    """Map each (lat, lon) to the input positions that carry it"""
+    index = {}
+    for i, stop in enumerate(stops):
+        index.setdefault((stop['lat'], stop['lon']), []).append(i)
+    return index
+
+def route_permutation(route, stops, index=None):
+    """Input positions (0-based) of a route's stops; repeated coordinates map to distinct positions"""
+    index = index if index is not None else stop_index(stops)
+    used = {}
+    permutation = []
+    for stop in route:
+        key = (stop['lat'], stop['lon'])
+        positions = index[key]
+        k = used.get(key, 0)
+        permutation.append(positions[min(k, len(positions) - 1)])
+        used[key] = k + 1
+    return permutation
+
+def route_fingerprint(permutation):
+    """Hash of a stop permutation that is identical for a tour and its reversal"""
+    forward = np.asarray(permutation, dtype=np.int64)
+    backward = forward[::-1]
+    # Lexicographically smaller direction is the canonical one
+    canonical = forward if tuple(forward) <= tuple(backward) else backward
+    return hashlib.blake2b(np.ascontiguousarray(canonical).tobytes(), digest_size=16).hexdigest()
+
+def dedupe_routes(routes, stops):
+    """Drop repeated tours, keeping the first occurrence; returns (routes, permutations)"""
+    index = stop_index(stops)
+    seen = set()
+    unique_routes = []
+    permutations = []
+    for route in routes:
+        permutation = route_permutation(route, stops, index)
+        fingerprint = route_fingerprint(permutation)
+        if fingerprint in seen:
+            continue
+        seen.add(fingerprint)
+        unique_routes.append(route)
+        permutations.append(permutation)
+    return unique_routes, permutations
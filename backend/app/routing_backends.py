@@ -0,0 +1,205 @@
+import os
+import json
+import time
+import threading
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+from utils import haversine_distance, haversine_matrix, straight_line, FALLBACK_SPEED_KMH
+from routing_replay import source_from_env, table_key
+
+# Deployment defaults; more named backends can be declared in ROUTING_BACKENDS_CONFIG
+ROUTING_BACKEND = os.environ.get('ROUTING_BACKEND', 'osrm')
+ROUTING_BACKENDS_CONFIG = os.environ.get('ROUTING_BACKENDS_CONFIG')
+OSRM_URL = os.environ.get('OSRM_URL', 'http://router.project-osrm.org')
+OSRM_POOL_SIZE = int(os.environ.get('OSRM_POOL_SIZE', '10'))
+OSRM_MAX_IN_FLIGHT = int(os.environ.get('OSRM_MAX_IN_FLIGHT', '16'))
+OSRM_TIMEOUT = float(os.environ.get('OSRM_TIMEOUT', '10'))
+DETOUR_FACTOR = 1.3
+
+class RoutingError(Exception):
+    """A backend could not answer; callers fall back to an estimate"""
+
+class RoutingBackend:
+    """Road routing engine: single legs, distance/duration tables and a health probe
+
+    route() returns (distance_km, duration_s, (N, 2) [lon, lat] geometry) or
+    None when the engine has no route; it raises RoutingError when the engine
+    itself fails. table() returns (distances_km, durations_s) matrices.
+    """
+    kind = None
+    road_network = False
+
+    def __init__(self, name):
+        self.name = name
+
+    def route(self, a, b):
+        raise NotImplementedError
+
+    def table(self, points):
+        raise NotImplementedError
+
+    def health(self):
+        start = time.perf_counter()
+        try:
+            ok = self.route(HEALTH_POINT, HEALTH_POINT) is not None
+            error = None
+        except (RoutingError, ConnectionError) as e:
+            # ConnectionError covers failures injected by ROUTING_MODE=replay
+            ok, error = False, str(e)
+        return {'name': self.name, 'type': self.kind, 'ok': ok, 'error': error,
+                'latency_ms': round((time.perf_counter() - start) * 1000, 1), **self.config()}
+
+    def config(self):
+        return {}
+
+# Any valid coordinate works for a liveness probe
+HEALTH_POINT = {'lat': 12.9716, 'lon': 77.5946}
+
+class HaversineBackend(RoutingBackend):
+    """Straight-line distance times a detour factor; never fails, never leaves the process"""
+    kind = 'haversine'
+
+    def __init__(self, name='haversine', detour_factor=DETOUR_FACTOR, speed_kmh=FALLBACK_SPEED_KMH):
+        super().__init__(name)
+        self.detour_factor = detour_factor
+        self.speed_kmh = speed_kmh
+
+    def route(self, a, b):
+        distance = haversine_distance(a, b) * self.detour_factor
+        return distance, distance / self.speed_kmh * 3600, straight_line(a, b)
+
+    def table(self, points):
+        distances = haversine_matrix(points) * self.detour_factor
+        return distances, distances / self.speed_kmh * 3600
+
+    def config(self):
+        return {'detour_factor': self.detour_factor, 'speed_kmh': self.speed_kmh}
+
+class OSRMBackend(RoutingBackend):
+    """OSRM-compatible HTTP engine with its own connection pool and in-flight cap
+
+    Calls beyond max_in_flight wait up to the timeout for a slot rather than
+    piling more concurrent requests onto the engine. Route and table lookups
+    go through ROUTING_MODE, so they can be recorded or replayed offline.
+    """
+    kind = 'osrm'
+    road_network = True
+
+    def __init__(self, name='osrm', base_url=OSRM_URL, pool_size=OSRM_POOL_SIZE,
+                 max_in_flight=OSRM_MAX_IN_FLIGHT, timeout=OSRM_TIMEOUT, profile='driving'):
+        super().__init__(name)
+        self.base_url = base_url.rstrip('/')
+        self.pool_size = pool_size
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self.profile = profile
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._in_flight = 0
+        self._count_lock = threading.Lock()
+        self._lookup = source_from_env(self._request_route)
+        self._lookup_table = source_from_env(self._request_table, key=table_key)
+
+    def _get(self, path, params):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise RoutingError(f"{self.name}: {self.max_in_flight} requests already in flight")
+        with self._count_lock:
+            self._in_flight += 1
+        try:
+            response = self.session.get(f"{self.base_url}{path}", params=params, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise RoutingError(f"{self.name}: {e}") from e
+        finally:
+            with self._count_lock:
+                self._in_flight -= 1
+            self._slots.release()
+        if response.status_code != 200:
+            raise RoutingError(f"{self.name}: HTTP {response.status_code}")
+        return response.json()
+
+    def _request_route(self, a, b):
+        """Raw OSRM route object, or None when OSRM has no route"""
+        data = self._get(f"/route/v1/{self.profile}/{a['lon']},{a['lat']};{b['lon']},{b['lat']}",
+                         {'overview': 'full', 'geometries': 'geojson'})
+        return data['routes'][0] if data.get('routes') else None
+
+    def route(self, a, b):
+        route = self._lookup(a, b)
+        if route is None:
+            return None
+        # Distance in meters, convert to km
+        coordinates = np.asarray(route['geometry']['coordinates'], dtype=np.float64).reshape(-1, 2)
+        return route['distance'] / 1000, route['duration'], coordinates
+
+    def _request_table(self, points):
+        """Raw OSRM distance (m) and duration (s) rows"""
+        coordinates = ';'.join(f"{p['lon']},{p['lat']}" for p in points)
+        data = self._get(f"/table/v1/{self.profile}/{coordinates}", {'annotations': 'distance,duration'})
+        return {'distances': data['distances'], 'durations': data['durations']}
+
+    def table(self, points):
+        try:
+            data = self._lookup_table(points)
+        except ConnectionError as e:
+            raise RoutingError(f"{self.name}: {e}") from e
+        if data is None:
+            raise RoutingError(f"{self.name}: table not in the replay archive")
+        distances = np.array(data['distances'], dtype=np.float64) / 1000
+        return distances, np.array(data['durations'], dtype=np.float64)
+
+    def config(self):
+        return {'base_url': self.base_url, 'pool_size': self.pool_size, 'max_in_flight': self.max_in_flight,
+                'in_flight': self._in_flight, 'timeout': self.timeout}
+
+BACKEND_TYPES = {'osrm': OSRMBackend, 'haversine': HaversineBackend}
+
+_backends = None
+_default = ROUTING_BACKEND
+_lock = threading.Lock()
+
+def _load_backends():
+    """Built-in 'osrm' and 'haversine' backends plus any declared in the config file
+
+    The config file is JSON: {"default": name, "backends": {name: {"type": ..., options}}}
+    """
+    global _default
+    backends = {'osrm': OSRMBackend(), 'haversine': HaversineBackend()}
+    if ROUTING_BACKENDS_CONFIG:
+        with open(ROUTING_BACKENDS_CONFIG) as f:
+            config = json.load(f)
+        for name, options in config.get('backends', {}).items():
+            options = dict(options)
+            kind = options.pop('type', 'osrm')
+            if kind not in BACKEND_TYPES:
+                raise ValueError(f"Unknown routing backend type '{kind}' for '{name}'")
+            backends[name] = BACKEND_TYPES[kind](name=name, **options)
+        _default = config.get('default', _default)
+    if _default not in backends:
+        raise ValueError(f"Default routing backend '{_default}' is not configured")
+    return backends
+
+def backends():
+    global _backends
+    with _lock:
+        if _backends is None:
+            _backends = _load_backends()
+        return _backends
+
+def backend_names():
+    return list(backends())
+
+def get_backend(name=None):
+    """Named backend, or the deployment default"""
+    configured = backends()
+    name = name or _default
+    if name not in configured:
+        raise KeyError(f"Unknown routing backend '{name}', expected one of {list(configured)}")
+    return configured[name]
+
+def default_backend_name():
+    backends()
+    return _default
@@ -0,0 +1,143 @@
+import os
+import json
+import time
+import random
+import threading
+
+ROUTING_MODES = ('live', 'record', 'replay')
+
+# live: call OSRM directly; record: call OSRM and archive every answer;
+# replay: answer only from the archive, never touching the network
+ROUTING_MODE = os.environ.get('ROUTING_MODE', 'live')
+ROUTING_ARCHIVE = os.environ.get(
+    'ROUTING_ARCHIVE', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.routing_archive.jsonl'))
+
+# Replay timing: 'recorded' sleeps for each entry's recorded latency, a number sleeps that many ms
+REPLAY_LATENCY_MS = os.environ.get('REPLAY_LATENCY_MS', 'recorded')
+REPLAY_JITTER_MS = float(os.environ.get('REPLAY_JITTER_MS', '0'))
+REPLAY_ERROR_RATE = float(os.environ.get('REPLAY_ERROR_RATE', '0'))
+REPLAY_SEED = os.environ.get('REPLAY_SEED')
+
+class ReplayError(ConnectionError):
+    """Synthetic routing failure injected during replay"""
+
+def route_key(a, b):
+    """Archive key for a leg, in OSRM's lon,lat;lon,lat order at ~0.1 m precision"""
+    return f"{a['lon']:.6f},{a['lat']:.6f};{b['lon']:.6f},{b['lat']:.6f}"
+
+def table_key(points):
+    """Archive key for a distance/duration table over the points, in request order"""
+    return 'table:' + ';'.join(f"{p['lon']:.6f},{p['lat']:.6f}" for p in points)
+
+class RouteArchive:
+    """Append-only JSONL archive of raw OSRM answers keyed by leg or table"""
+
+    def __init__(self, path=ROUTING_ARCHIVE):
+        self.path = path
+        self._routes = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._routes[entry['key']] = entry
+
+    def get(self, key):
+        return self._routes.get(key)
+
+    def put(self, key, route, latency_ms):
+        entry = {'key': key, 'route': route, 'latency_ms': round(latency_ms, 2)}
+        with self._lock:
+            self._routes[key] = entry
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(entry) + '\n')
+
+    def __len__(self):
+        return len(self._routes)
+
+class RecordingSource:
+    """Live lookups that also archive each answer with its observed latency"""
+
+    def __init__(self, live, archive, key=route_key):
+        self.live = live
+        self.archive = archive
+        self.key = key
+
+    def __call__(self, *args):
+        start = time.perf_counter()
+        route = self.live(*args)
+        latency_ms = (time.perf_counter() - start) * 1000
+        if route is not None:
+            self.archive.put(self.key(*args), route, latency_ms)
+        return route
+
+class ReplaySource:
+    """Archived answers with synthetic latency and error injection
+
+    Legs and tables missing from the archive return None, so callers take
+    the same haversine fallback they would when OSRM has no answer.
+    """
+
+    def __init__(self, archive, latency_ms=REPLAY_LATENCY_MS, jitter_ms=REPLAY_JITTER_MS,
+                 error_rate=REPLAY_ERROR_RATE, seed=REPLAY_SEED, key=route_key):
+        self.archive = archive
+        self.key = key
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def delay_ms(self, entry):
+        if self.latency_ms == 'recorded':
+            base = entry['latency_ms'] if entry else 0.0
+        else:
+            base = float(self.latency_ms)
+        with self._lock:
+            jitter = self._rng.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+        return max(0.0, base + jitter)
+
+    def inject_error(self):
+        with self._lock:
+            return self.error_rate > 0 and self._rng.random() < self.error_rate
+
+    def __call__(self, *args):
+        entry = self.archive.get(self.key(*args))
+        time.sleep(self.delay_ms(entry) / 1000)
+        failed = self.inject_error()
+        with self._lock:
+            if failed:
+                self.errors += 1
+            elif entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if failed:
+            raise ReplayError("injected routing failure")
+        return entry['route'] if entry is not None else None
+
+_archive = None
+_archive_lock = threading.Lock()
+
+def shared_archive():
+    """The ROUTING_ARCHIVE archive, opened once per process so every source appends to one file"""
+    global _archive
+    with _archive_lock:
+        if _archive is None:
+            _archive = RouteArchive(ROUTING_ARCHIVE)
+            print(f"🎞️  Routing {ROUTING_MODE} mode with {len(_archive)} archived answers at {ROUTING_ARCHIVE}")
+        return _archive
+
+def source_from_env(live, key=route_key):
+    """Lookup for the configured ROUTING_MODE, wrapping a live OSRM call archived under key(*args)"""
+    if ROUTING_MODE not in ROUTING_MODES:
+        raise ValueError(f"Unknown ROUTING_MODE '{ROUTING_MODE}', expected one of {ROUTING_MODES}")
+    if ROUTING_MODE == 'live':
+        return live
+    if ROUTING_MODE == 'record':
+        return RecordingSource(live, shared_archive(), key=key)
+    return ReplaySource(shared_archive(), key=key)
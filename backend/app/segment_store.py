@@ -0,0 +1,86 @@
+from collections import namedtuple
+from functools import partial
+from utils import fetch_road_segment
+from geometry import RouteGeometry
+
+# estimated: a straight-line fallback rather than a real road route
+Segment = namedtuple('Segment', ['distance_km', 'duration_s', 'coordinates', 'estimated'], defaults=(False,))
+
+class SegmentStore:
+    """Road legs keyed by endpoint coordinates, each fetched at most once
+
+    Candidate scoring, response waypoints and plan sessions read from the
+    same store, so a leg routed while scoring is never routed again just to
+    draw the winner on the map. Geometry is kept as (N, 2) [lon, lat] arrays;
+    waypoint dicts are only built for the route that is returned.
+
+    With a SharedCache, real road legs are also looked up in and written to
+    the cache shared by all server workers before anything is fetched.
+    """
+
+    def __init__(self, backend=None, fetch=None, shared=None):
+        # Legs come from one routing backend for the store's lifetime
+        self.backend = backend
+        self._fetch = fetch or partial(fetch_road_segment, backend=backend)
+        # Estimated backends are cheaper to recompute than to look up
+        self._shared = shared if backend is not None and backend.road_network else None
+        self._segments = {}
+        self.fetched = 0
+        self.reused = 0
+
+    @staticmethod
+    def key(a, b):
+        return (a['lat'], a['lon']), (b['lat'], b['lon'])
+
+    def segment(self, a, b):
+        key = self.key(a, b)
+        segment = self._segments.get(key)
+        if segment is None:
+            segment = self._shared_segment(key)
+        if segment is None:
+            segment = Segment(*self._fetch(a, b))
+            self._segments[key] = segment
+            self.fetched += 1
+            # Fallbacks stay local so a routing outage isn't cached for everyone
+            if self._shared is not None and not segment.estimated:
+                self._shared.put_segment(self.backend.name, repr(key), segment.distance_km,
+                                         segment.duration_s, segment.coordinates)
+        else:
+            self.reused += 1
+        return segment
+
+    def _shared_segment(self, key):
+        if self._shared is None:
+            return None
+        cached = self._shared.get_segment(self.backend.name, repr(key))
+        if cached is None:
+            return None
+        segment = Segment(*cached)
+        self._segments[key] = segment
+        return segment
+
+    def legs(self, route):
+        return [self.segment(route[i], route[i + 1]) for i in range(len(route) - 1)]
+
+    def route_distance(self, route):
+        return sum(leg.distance_km for leg in self.legs(route))
+
+    def route_duration(self, route):
+        return sum(leg.duration_s for leg in self.legs(route))
+
+    def geometry(self, route):
+        """Road geometry for a route, concatenated from stored legs"""
+        return RouteGeometry.from_legs([leg.coordinates for leg in self.legs(route)])
+
+    def retain(self, points):
+        """Keep only legs whose endpoints are both in `points` ((lat, lon) tuples)"""
+        self._segments = {k: v for k, v in self._segments.items() if k[0] in points and k[1] in points}
+
+    def nbytes(self):
+        return sum(leg.coordinates.nbytes for leg in self._segments.values())
+
+    def stats(self):
+        return {'segments': len(self._segments), 'fetched': self.fetched, 'reused': self.reused}
+
+    def __len__(self):
+        return len(self._segments)
@@ -0,0 +1,191 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+import numpy as np
+
+# Enabled by setting a path; serve.py points every worker at the same file
+SHARED_CACHE_PATH = os.environ.get('SHARED_CACHE_PATH')
+SEGMENT_TTL_S = float(os.environ.get('SEGMENT_CACHE_TTL_S', str(24 * 3600)))
+RESULT_TTL_S = float(os.environ.get('RESULT_CACHE_TTL_S', '300'))
+# Plans idle this long are gone for every worker, as with the in-memory store
+PLAN_TTL_S = float(os.environ.get('PLAN_TTL_SECONDS', str(6 * 3600)))
+# Expired rows are swept after this many writes
+PRUNE_EVERY = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS segments (
+    backend TEXT NOT NULL,
+    key TEXT NOT NULL,
+    distance_km REAL NOT NULL,
+    duration_s REAL NOT NULL,
+    coordinates BLOB NOT NULL,
+    created REAL NOT NULL,
+    PRIMARY KEY (backend, key)
+);
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    body BLOB NOT NULL,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS plans (
+    plan_id TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS worker_stats (
+    kind TEXT NOT NULL,
+    pid INTEGER NOT NULL,
+    stats TEXT NOT NULL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (kind, pid)
+);
+"""
+
+class SharedCache:
+    """Road segments, whole responses, plan sessions and worker stats in one SQLite file
+
+    WAL mode lets every worker read while one writes, so a leg routed by any
+    worker is a cache hit for the rest, and a plan created on one worker can
+    be edited on another. Connections are per thread and are reopened after
+    a fork.
+    """
+
+    def __init__(self, path, segment_ttl=SEGMENT_TTL_S, result_ttl=RESULT_TTL_S, plan_ttl=PLAN_TTL_S):
+        self.path = path
+        self.segment_ttl = segment_ttl
+        self.result_ttl = result_ttl
+        self.plan_ttl = plan_ttl
+        self._local = threading.local()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+
+    def _connect(self):
+        db = getattr(self._local, 'db', None)
+        if db is None or self._local.pid != os.getpid():
+            db = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return db
+
+    def get_segment(self, backend, key):
+        row = self._connect().execute(
+            'SELECT distance_km, duration_s, coordinates FROM segments WHERE backend = ? AND key = ? AND created > ?',
+            (backend, key, time.time() - self.segment_ttl)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        distance_km, duration_s, blob = row
+        return distance_km, duration_s, np.frombuffer(blob, dtype=np.float64).reshape(-1, 2)
+
+    def put_segment(self, backend, key, distance_km, duration_s, coordinates):
+        blob = np.ascontiguousarray(coordinates, dtype=np.float64).tobytes()
+        self._write('INSERT OR REPLACE INTO segments VALUES (?, ?, ?, ?, ?, ?)',
+                    (backend, key, distance_km, duration_s, blob, time.time()))
+
+    def get_result(self, key):
+        row = self._connect().execute('SELECT body FROM results WHERE key = ? AND created > ?',
+                                      (key, time.time() - self.result_ttl)).fetchone()
+        return row[0] if row else None
+
+    def put_result(self, key, body):
+        self._write('INSERT OR REPLACE INTO results VALUES (?, ?, ?)', (key, body, time.time()))
+
+    def get_plan_version(self, plan_id):
+        """Stored version of a live plan, or None when it is unknown or expired"""
+        row = self._connect().execute('SELECT version FROM plans WHERE plan_id = ? AND updated > ?',
+                                      (plan_id, time.time() - self.plan_ttl)).fetchone()
+        return row[0] if row else None
+
+    def get_plan(self, plan_id):
+        """(version, state dict) of a live plan, or None"""
+        row = self._connect().execute('SELECT version, state FROM plans WHERE plan_id = ? AND updated > ?',
+                                      (plan_id, time.time() - self.plan_ttl)).fetchone()
+        return (row[0], json.loads(row[1])) if row else None
+
+    def put_plan(self, plan_id, state, version):
+        """Store version `version` of a plan; False if another worker already moved it past version - 1
+
+        Unlike cached legs and results, a plan write is not optional, so
+        errors propagate instead of being skipped.
+        """
+        db = self._connect()
+        body = json.dumps(state, separators=(",", ":"))
+        if version == 1:
+            cursor = db.execute('INSERT OR IGNORE INTO plans VALUES (?, ?, ?, ?)', (plan_id, 1, body, time.time()))
+        else:
+            cursor = db.execute('UPDATE plans SET version = ?, state = ?, updated = ? WHERE plan_id = ? AND version = ?',
+                                (version, body, time.time(), plan_id, version - 1))
+        return cursor.rowcount == 1
+
+    def touch_plan(self, plan_id):
+        """Restart a plan's idle expiry without changing it"""
+        self._write('UPDATE plans SET updated = ? WHERE plan_id = ?', (time.time(), plan_id))
+
+    def delete_plan(self, plan_id):
+        cursor = self._connect().execute('DELETE FROM plans WHERE plan_id = ? AND updated > ?',
+                                         (plan_id, time.time() - self.plan_ttl))
+        return cursor.rowcount == 1
+
+    def put_worker_stats(self, kind, stats):
+        self._write('INSERT OR REPLACE INTO worker_stats VALUES (?, ?, ?, ?)',
+                    (kind, os.getpid(), json.dumps(stats), time.time()))
+
+    def worker_stats(self, kind, max_age):
+        """{pid: stats} from every worker that published within max_age seconds"""
+        rows = self._connect().execute('SELECT pid, stats FROM worker_stats WHERE kind = ? AND updated > ?',
+                                       (kind, time.time() - max_age)).fetchall()
+        return {pid: json.loads(stats) for pid, stats in rows}
+
+    def _write(self, sql, params):
+        db = self._connect()
+        try:
+            db.execute(sql, params)
+        except sqlite3.OperationalError as e:
+            # A busy cache is not worth failing a request over
+            print(f"Shared cache write skipped: {e}")
+            return
+        self._writes += 1
+        if self._writes % PRUNE_EVERY == 0:
+            self.prune()
+
+    def prune(self):
+        now = time.time()
+        db = self._connect()
+        db.execute('DELETE FROM segments WHERE created <= ?', (now - self.segment_ttl,))
+        db.execute('DELETE FROM results WHERE created <= ?', (now - self.result_ttl,))
+        db.execute('DELETE FROM plans WHERE updated <= ?', (now - self.plan_ttl,))
+        # Rows of workers that have since exited
+        db.execute('DELETE FROM worker_stats WHERE updated <= ?', (now - self.result_ttl,))
+
+    def stats(self):
+        db = self._connect()
+        return {
+            'path': self.path,
+            'segments': db.execute('SELECT COUNT(*) FROM segments').fetchone()[0],
+            'results': db.execute('SELECT COUNT(*) FROM results').fetchone()[0],
+            'plans': db.execute('SELECT COUNT(*) FROM plans').fetchone()[0],
+            'segment_hits': self.hits,
+            'segment_misses': self.misses
+        }
+
+_shared = None
+_lock = threading.Lock()
+
+def get_shared_cache():
+    """Process-wide shared cache, or None when SHARED_CACHE_PATH is unset"""
+    global _shared
+    if SHARED_CACHE_PATH is None:
+        return None
+    with _lock:
+        if _shared is None:
+            _shared = SharedCache(SHARED_CACHE_PATH)
+        return _shared
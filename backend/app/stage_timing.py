@@ -0,0 +1,30 @@
+import time
+from contextlib import contextmanager
+
+class StageTimer:
+    """Wall-clock time per named request stage, reported as a Server-Timing header"""
+
+    def __init__(self):
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + (time.perf_counter() - start) * 1000
+
+    def header(self):
+        return ', '.join(f"{name};dur={ms:.1f}" for name, ms in self.stages.items())
+
+def parse_server_timing(value):
+    """{stage: ms} from a Server-Timing header value"""
+    stages = {}
+    for entry in (value or '').split(','):
+        name, _, params = entry.strip().partition(';')
+        for param in params.split(';'):
+            key, _, number = param.strip().partition('=')
+            if name and key == 'dur':
+                stages[name] = float(number)
+    return stages
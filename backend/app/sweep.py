@@ -0,0 +1,146 @@
+import os
+import csv
+import time
+import random
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import torch
+from ai_model import RouteScorer
+from train_model import (DATASET_CSV, CACHE_DIR, prepare_data, cache_paths, split_indices,
+                         fit_scaler, fit_model, make_loader)
+
+# Worker-local dataset, loaded once per process from the shared memory-mapped cache
+_worker_data = {}
+
+def parse_widths(spec):
+    """Parse '16,8;32,16' into [(16, 8), (32, 16)]"""
+    return [tuple(int(w) for w in group.split(',') if w) for group in spec.split(';') if group]
+
+def parse_list(spec, cast):
+    """Parse a comma-separated list of numbers"""
+    return [cast(v) for v in spec.split(',') if v]
+
+def build_trials(widths, lrs, batch_sizes, epochs, mode='grid', samples=20, seed=42):
+    """Expand the search space into a list of trial configs"""
+    grid = [
+        {'hidden_sizes': h, 'lr': lr, 'batch_size': bs, 'max_epochs': ep}
+        for h, lr, bs, ep in itertools.product(widths, lrs, batch_sizes, epochs)
+    ]
+    if mode == 'random' and samples < len(grid):
+        return random.Random(seed).sample(grid, samples)
+    return grid
+
+def _init_worker(x_path, y_path, seed):
+    """Open the cached dataset in each worker; the OS shares the mapped pages"""
+    # One thread per worker, the pool itself provides the parallelism
+    torch.set_num_threads(1)
+    X = np.load(x_path, mmap_mode='r')
+    y = np.load(y_path, mmap_mode='r')
+    train_idx, val_idx = split_indices(len(X), seed=seed)
+    _worker_data.update({
+        'X': X, 'y': y, 'train_idx': train_idx, 'val_idx': val_idx,
+        'scaler': fit_scaler(X, train_idx)
+    })
+
+def measure_inference_cost(model, features, repeats=20):
+    """Average forward-pass time per sample in microseconds"""
+    model.eval()
+    with torch.no_grad():
+        model(features)  # warm-up
+        start = time.perf_counter()
+        for _ in range(repeats):
+            model(features)
+        elapsed = time.perf_counter() - start
+    return elapsed / (repeats * len(features)) * 1e6
+
+def run_trial(trial, patience=10, seed=42):
+    """Train one configuration and report validation loss and serving cost"""
+    data = _worker_data
+    model = RouteScorer(trial['hidden_sizes'])
+    start = time.perf_counter()
+    best_val_loss, epochs_run = fit_model(
+        model, data['X'], data['y'], data['train_idx'], data['val_idx'], data['scaler'],
+        lr=trial['lr'], batch_size=trial['batch_size'], max_epochs=trial['max_epochs'],
+        patience=patience, seed=seed, verbose=False
+    )
+    train_seconds = time.perf_counter() - start
+
+    # Time inference on a realistic batch of validation rows
+    loader = make_loader(data['X'], data['y'], data['val_idx'][:1024], data['scaler'], 1024, shuffle=False)
+    features, _ = next(iter(loader))
+
+    return {
+        'hidden_sizes': ','.join(map(str, trial['hidden_sizes'])),
+        'lr': trial['lr'],
+        'batch_size': trial['batch_size'],
+        'max_epochs': trial['max_epochs'],
+        'epochs_run': epochs_run,
+        'val_loss': round(best_val_loss, 4),
+        'parameters': sum(p.numel() for p in model.parameters()),
+        'inference_us_per_sample': round(measure_inference_cost(model, features), 4),
+        'train_seconds': round(train_seconds, 2)
+    }
+
+def run_sweep(trials, csv_path=DATASET_CSV, cache_dir=CACHE_DIR, workers=None,
+              patience=10, seed=42, output='sweep_leaderboard.csv'):
+    """Run all trials across a process pool and write a leaderboard"""
+    # Build the cache once up front so every worker maps the same files
+    prepare_data(csv_path, cache_dir)
+    x_path, y_path = cache_paths(csv_path, cache_dir)
+
+    workers = workers or os.cpu_count() or 1
+    print(f"🔬 Running {len(trials)} trials on {workers} workers...")
+
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(x_path, y_path, seed)) as pool:
+        futures = {pool.submit(run_trial, trial, patience, seed): trial for trial in trials}
+        for future in as_completed(futures):
+            trial = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"Trial failed {trial}: {e}")
+                continue
+            results.append(result)
+            print(f"  {result['hidden_sizes']:>12} lr={result['lr']:<8} bs={result['batch_size']:<5} "
+                  f"val={result['val_loss']:.4f} cost={result['inference_us_per_sample']:.3f}µs")
+
+    # Lowest validation loss first, cheaper model breaks ties
+    results.sort(key=lambda r: (r['val_loss'], r['inference_us_per_sample']))
+
+    if results:
+        with open(output, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(results[0].keys()))
+            writer.writeheader()
+            writer.writerows(results)
+        best = results[0]
+        print(f"\n✅ Leaderboard written to {output}")
+        print(f"✅ Best: hidden={best['hidden_sizes']} lr={best['lr']} batch={best['batch_size']} "
+              f"val_loss={best['val_loss']:.4f}")
+
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hyperparameter sweep for RouteScorer")
+    parser.add_argument('--csv', default=DATASET_CSV, help="Source emission CSV")
+    parser.add_argument('--cache-dir', default=CACHE_DIR, help="Directory for cached feature matrices")
+    parser.add_argument('--widths', default='8;16,8;32,16;64,32,16', help="Semicolon-separated layer width groups")
+    parser.add_argument('--lr', default='0.001,0.003,0.01', help="Comma-separated learning rates")
+    parser.add_argument('--batch-size', default='128,512', help="Comma-separated batch sizes")
+    parser.add_argument('--epochs', default='100', help="Comma-separated max epoch counts")
+    parser.add_argument('--mode', choices=['grid', 'random'], default='grid')
+    parser.add_argument('--samples', type=int, default=20, help="Trials to draw in random mode")
+    parser.add_argument('--patience', type=int, default=10)
+    parser.add_argument('--workers', type=int, default=None, help="Process pool size (default: all cores)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='sweep_leaderboard.csv')
+    args = parser.parse_args()
+
+    trials = build_trials(parse_widths(args.widths), parse_list(args.lr, float),
+                          parse_list(args.batch_size, int), parse_list(args.epochs, int),
+                          mode=args.mode, samples=args.samples, seed=args.seed)
+    run_sweep(trials, args.csv, args.cache_dir, workers=args.workers, patience=args.patience,
+              seed=args.seed, output=args.output)
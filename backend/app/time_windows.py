@@ -0,0 +1,232 @@
+import numpy as np
+
+# Travel times are estimated from the straight-line matrix the optimizer already uses
+TRAFFIC_SPEEDS_KMH = {'Free flow': 70, 'Moderate': 45, 'Heavy': 25}
+ROAD_DETOUR = 1.3  # road km per straight-line km, as in the routing fallback
+
+# Moves may not add more lateness than this (minutes), so float noise is ignored
+WARP_EPS = 1e-6
+
+def minutes_per_km(traffic_conditions):
+    """Driving minutes per straight-line km under the given traffic"""
+    return ROAD_DETOUR * 60.0 / TRAFFIC_SPEEDS_KMH.get(traffic_conditions, 45)
+
+def has_time_windows(stops):
+    return any('time_window' in s or 'service_minutes' in s for s in stops)
+
+class TimeWindows:
+    """Per-stop service windows and service times, in minutes from the start of the route
+
+    Feasibility uses segment summaries (duration, time warp, earliest start,
+    latest start). Joining two summaries is O(1), so with prefix and suffix
+    summaries of the current path an insertion, a relocated segment or a
+    reversed 2-opt segment is checked in constant time. The latest start of a
+    suffix is the forward time slack of its first stop; time warp is the
+    lateness a path cannot avoid even when it leaves at the earliest moment.
+
+    Stops opt in with "time_window": [open, close] and "service_minutes".
+    The route leaves its first stop at minute 0, waiting is allowed, late
+    arrival is not.
+    """
+
+    def __init__(self, opens, closes, service, minutes_per_km):
+        self.opens = np.asarray(opens, dtype=np.float64)
+        self.closes = np.asarray(closes, dtype=np.float64)
+        self.service = np.asarray(service, dtype=np.float64)
+        self.minutes_per_km = minutes_per_km
+        # Plain floats: the joins below are scalar code on the hot path
+        self._nodes = list(zip(self.service.tolist(), [0.0] * len(self.service),
+                               self.opens.tolist(), self.closes.tolist()))
+
+    @classmethod
+    def from_stops(cls, stops, minutes_per_km):
+        """Windows for a stop list, or None when no stop has a window or service time"""
+        if not has_time_windows(stops):
+            return None
+        opens, closes, service = [], [], []
+        for k, stop in enumerate(stops):
+            window = stop.get('time_window')
+            opening, closing = (0.0, np.inf) if window is None else window
+            opening = 0.0 if opening is None else float(opening)
+            closing = np.inf if closing is None else float(closing)
+            if opening > closing:
+                raise ValueError(f"Stop {k + 1} has a time window that closes before it opens")
+            minutes = float(stop.get('service_minutes') or 0.0)
+            if minutes < 0:
+                raise ValueError(f"Stop {k + 1} has a negative service time")
+            opens.append(opening)
+            closes.append(closing)
+            service.append(minutes)
+        # The route leaves its first stop at minute 0 at the earliest, whichever stop
+        # starts the tour; for any later stop arrival is past 0 anyway
+        return cls(np.maximum(opens, 0.0), closes, service, minutes_per_km)
+
+    def node(self, i):
+        return self._nodes[i]
+
+    def join(self, D, first, last, second, head):
+        """Summary of segment `first` (ending at stop last) followed by `second` (starting at head)
+
+        Either side may be None for an empty segment.
+        """
+        if first is None:
+            return second
+        if second is None:
+            return first
+        d1, w1, e1, l1 = first
+        d2, w2, e2, l2 = second
+        travel = float(D[last, head]) * self.minutes_per_km
+        delta = d1 - w1 + travel
+        wait = max(e2 - delta - l1, 0.0)
+        warp = max(e1 + delta - l2, 0.0)
+        return (d1 + d2 + travel + wait, w1 + w2 + warp,
+                max(e2 - delta, e1) - wait, min(l2 - delta, l1) + warp)
+
+    def prefixes(self, tour, D):
+        """Summary of tour[:k + 1] for every k"""
+        out = []
+        seg = None
+        for k, node in enumerate(tour):
+            seg = self.join(D, seg, tour[k - 1] if k else None, self.node(node), node)
+            out.append(seg)
+        return out
+
+    def suffixes(self, tour, D):
+        """Summary of tour[k:] for every k, plus None for the empty suffix"""
+        out = [None] * (len(tour) + 1)
+        seg = None
+        for k in range(len(tour) - 1, -1, -1):
+            seg = self.join(D, self.node(tour[k]), tour[k], seg, tour[k + 1] if seg is not None else None)
+            out[k] = seg
+        return out
+
+    def summary(self, nodes, D):
+        """Summary of a short explicit sequence of stops"""
+        seg = None
+        for k, node in enumerate(nodes):
+            seg = self.join(D, seg, nodes[k - 1] if k else None, self.node(node), node)
+        return seg
+
+    def time_warp(self, tour, D):
+        """Total unavoidable lateness (minutes) of an open path; 0 means every window is met"""
+        seg = self.summary(list(tour), D)
+        return 0.0 if seg is None else seg[1]
+
+    def feasible_reversal(self, t, D, i, js, delta, prefix, suffix, max_warp):
+        """Best-delta j among improving 2-opt moves reversing t[i..j] that keeps time warp <= max_warp
+
+        The reversed segment is grown one stop at a time, only as far as the
+        candidates tried need, so each is a constant-time join against the
+        prefix and suffix summaries.
+        """
+        improving = np.flatnonzero(delta < -1e-9)
+        if len(improving) == 0:
+            return None
+        reversed_segments = [self.node(t[i])]
+        for k in improving[np.argsort(delta[improving], kind='stable')]:
+            j = int(js[k])
+            while i + len(reversed_segments) <= j:
+                m = i + len(reversed_segments)
+                reversed_segments.append(self.join(D, self.node(t[m]), t[m], reversed_segments[-1], t[m - 1]))
+            total = self.join(D, prefix[i - 1], t[i - 1], reversed_segments[j - i], t[j])
+            total = self.join(D, total, t[i], suffix[j + 1], t[j + 1] if j + 1 < len(t) else None)
+            if total[1] <= max_warp + WARP_EPS:
+                return j
+        return None
+
+    def chain(self, D, pieces):
+        """Join (summary, first stop, last stop) pieces in order, skipping empty ones"""
+        total, tail = None, None
+        for seg, head, last in pieces:
+            if seg is None:
+                continue
+            total = self.join(D, total, tail, seg, head)
+            tail = last
+        return total
+
+    def feasible_relocation(self, t, D, i, length, moves, prefix, suffix, max_warp):
+        """First (slot, reverse) in moves that relocates t[i:i + length] without exceeding max_warp
+
+        Slots follow or_opt: insert after position slot of the path without
+        the segment. The stretch the segment jumps over is grown one stop at a
+        time in each direction, so each candidate is a constant-time chain of
+        prefix, segment, stretch and suffix summaries.
+        """
+        if not moves:
+            return None
+        n = len(t)
+        end = i + length
+
+        def at(position):
+            return t[position] if position < n else None
+
+        segment = t[i:end]
+        summaries = {False: self.summary(list(segment), D), True: self.summary(list(segment[::-1]), D)}
+        # Stretch between the new slot and the old position: t[k + 1..i - 1] or t[end..k + length],
+        # extended only as far as the candidates tried so far need
+        stretch = {i - 1: None}
+        back, ahead = i - 1, i - 1
+
+        for k, reverse in moves:
+            while back > k:
+                back -= 1
+                stretch[back] = self.join(D, self.node(t[back + 1]), t[back + 1], stretch[back + 1], t[back + 2])
+            while ahead < k:
+                ahead += 1
+                stretch[ahead] = self.join(D, stretch[ahead - 1] if ahead > i else None, t[ahead + length - 1],
+                                           self.node(t[ahead + length]), t[ahead + length])
+            nodes = segment[::-1] if reverse else segment
+            moved = (summaries[reverse], nodes[0], nodes[-1])
+            if k < i:
+                pieces = ((prefix[k], t[0], t[k]), moved, (stretch[k], t[k + 1], t[i - 1]),
+                          (suffix[end], at(end), t[-1]))
+            else:
+                pieces = ((prefix[i - 1], t[0], t[i - 1]), (stretch[k], t[end], t[k + length]), moved,
+                          (suffix[k + length + 1], at(k + length + 1), t[-1]))
+            if self.chain(D, pieces)[1] <= max_warp + WARP_EPS:
+                return k, reverse
+        return None
+
+    def insertion_warps(self, tour, D, node):
+        """Time warp of the path after inserting node before each position 1..n"""
+        prefix = self.prefixes(tour, D)
+        suffix = self.suffixes(tour, D)
+        single = self.node(node)
+        warps = np.empty(len(tour))
+        for k in range(1, len(tour) + 1):
+            total = self.join(D, prefix[k - 1], tour[k - 1], single, node)
+            total = self.join(D, total, node, suffix[k], tour[k] if k < len(tour) else None)
+            warps[k - 1] = total[1]
+        return warps
+
+    def schedule(self, tour, D):
+        """Arrival, service start and departure (minutes) per visit, leaving the first stop at 0"""
+        visits = []
+        clock = 0.0
+        previous = None
+        for node in tour:
+            node = int(node)
+            if previous is not None:
+                clock += D[previous, node] * self.minutes_per_km
+            arrival = clock
+            start = max(arrival, self.opens[node])
+            clock = start + self.service[node]
+            visits.append({
+                'arrival_minutes': round(arrival, 1),
+                'service_start_minutes': round(start, 1),
+                'departure_minutes': round(clock, 1),
+                'late_minutes': round(max(start - self.closes[node], 0.0), 1)
+            })
+            previous = node
+        return visits
+
+    def report(self, tour, D):
+        visits = self.schedule(tour, D)
+        late = [v['late_minutes'] for v in visits]
+        return {
+            'feasible': self.time_warp(tour, D) <= WARP_EPS,
+            'late_stops': sum(1 for minutes in late if minutes > 0),
+            'total_late_minutes': round(sum(late), 1),
+            'finish_minutes': visits[-1]['departure_minutes'] if visits else 0.0,
+            'visits': visits
+        }
@@ -1,32 +1,57 @@
+import os
+import hashlib
+import argparse
 import pandas as pd
 import torch
 import torch.nn as nn
 import numpy as np
+from torch.utils.data import Dataset, DataLoader, BatchSampler, RandomSampler
 from sklearn.preprocessing import StandardScaler
-from sklearn.model_selection import train_test_split
 from ai_model import RouteScorer
+from model_registry import REGISTRY_DIR, LEGACY_MODEL_PATH, LEGACY_SCALER_PATH, publish_model
 import joblib
 
-def prepare_data():
-    """Load and prepare the vehicle emission dataset"""
-    print("Loading vehicle emission dataset...")
-    
-    # Load the dataset
-    df = pd.read_csv('../../vehicle_emission_dataset.csv')
+DATASET_CSV = os.environ.get('EMISSION_DATASET_CSV', '../../vehicle_emission_dataset.csv')
+CACHE_DIR = os.environ.get(
+    'DATASET_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.dataset_cache')
+)
+
+# Bump whenever the encoding below changes so stale caches are ignored
+FEATURE_VERSION = 1
+
+# Create mappings for categorical variables
+VEHICLE_MAP = {'Car': 0, 'Truck': 1, 'Bus': 2, 'Motorcycle': 3}
+FUEL_MAP = {'Electric': 0, 'Hybrid': 1, 'Petrol': 2, 'Diesel': 3}
+TRAFFIC_MAP = {'Free flow': 0, 'Moderate': 1, 'Heavy': 2}
+
+def file_sha256(path, chunk_size=1 << 20):
+    """Hash the source CSV so the cache is invalidated when the data changes"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def cache_paths(csv_path, cache_dir=CACHE_DIR):
+    """Return the (features, target) .npy paths for a given source CSV"""
+    key = f"{file_sha256(csv_path)[:16]}_v{FEATURE_VERSION}"
+    return (os.path.join(cache_dir, f"emissions_{key}_X.npy"),
+            os.path.join(cache_dir, f"emissions_{key}_y.npy"))
+
+def encode_dataset(csv_path):
+    """Parse the CSV and encode the routing features"""
+    # Only read the columns we actually train on
+    columns = ['Speed', 'Engine Size', 'Traffic Conditions', 'Vehicle Type',
+               'Fuel Type', 'CO2 Emissions']
+    df = pd.read_csv(csv_path, usecols=columns)
     print(f"Loaded {len(df)} records")
-    
-    # Create mappings for categorical variables
-    vehicle_map = {'Car': 0, 'Truck': 1, 'Bus': 2, 'Motorcycle': 3}
-    fuel_map = {'Electric': 0, 'Hybrid': 1, 'Petrol': 2, 'Diesel': 3}
-    road_map = {'City': 0, 'Highway': 1, 'Rural': 2}
-    traffic_map = {'Free flow': 0, 'Moderate': 1, 'Heavy': 2}
-    
+
     # Map categorical variables to numeric
-    df['Vehicle_Encoded'] = df['Vehicle Type'].map(vehicle_map)
-    df['Fuel_Encoded'] = df['Fuel Type'].map(fuel_map)
-    df['Road_Encoded'] = df['Road Type'].map(road_map)
-    df['Traffic_Encoded'] = df['Traffic Conditions'].map(traffic_map)
-    
+    df['Vehicle_Encoded'] = df['Vehicle Type'].map(VEHICLE_MAP)
+    df['Fuel_Encoded'] = df['Fuel Type'].map(FUEL_MAP)
+    df['Traffic_Encoded'] = df['Traffic Conditions'].map(TRAFFIC_MAP)
+
     # Select features that match our routing context
     features = [
         'Speed',           # Average speed (km/h)
@@ -35,82 +60,191 @@ def prepare_data():
         'Vehicle_Encoded', # Vehicle type (0-3)
         'Fuel_Encoded'     # Fuel type (0-3)
     ]
-    
-    X = df[features].values
-    y = df['CO2 Emissions'].values
-    
+
     # Handle missing values
-    X = np.nan_to_num(X)
-    y = np.nan_to_num(y)
-    
+    X = np.nan_to_num(df[features].to_numpy(dtype=np.float32))
+    y = np.nan_to_num(df['CO2 Emissions'].to_numpy(dtype=np.float32))
+    return X, y
+
+def prepare_data(csv_path=DATASET_CSV, cache_dir=CACHE_DIR):
+    """Load the encoded emission dataset, memory-mapped from the cache when possible"""
+    print("Loading vehicle emission dataset...")
+
+    x_path, y_path = cache_paths(csv_path, cache_dir)
+    if os.path.exists(x_path) and os.path.exists(y_path):
+        print(f"Using cached features: {x_path}")
+    else:
+        X, y = encode_dataset(csv_path)
+        os.makedirs(cache_dir, exist_ok=True)
+        # Write to temp files first so a crashed run never leaves a half-written cache
+        for path, array in ((x_path, X), (y_path, y)):
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                np.save(f, array)
+            os.replace(tmp_path, path)
+        print(f"Cached encoded features to {x_path}")
+
+    X = np.load(x_path, mmap_mode='r')
+    y = np.load(y_path, mmap_mode='r')
+
     print(f"Features shape: {X.shape}")
     print(f"Target shape: {y.shape}")
-    
+
     return X, y
 
-def train_model():
+def split_indices(n, val_fraction=0.2, seed=42):
+    """Shuffle row indices into train/validation sets"""
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(n)
+    n_val = max(1, int(n * val_fraction))
+    # Sorted indices keep reads from the memory map mostly sequential
+    return np.sort(order[n_val:]), np.sort(order[:n_val])
+
+def fit_scaler(X, indices, chunk_size=65536):
+    """Fit the feature scaler in chunks so the full matrix is never copied"""
+    scaler = StandardScaler()
+    for start in range(0, len(indices), chunk_size):
+        scaler.partial_fit(X[indices[start:start + chunk_size]])
+    return scaler
+
+class EmissionBatches(Dataset):
+    """Serves whole scaled mini-batches straight from the memory-mapped arrays"""
+
+    def __init__(self, X, y, indices, scaler):
+        self.X = X
+        self.y = y
+        self.indices = indices
+        self.mean = scaler.mean_.astype(np.float32)
+        self.scale = scaler.scale_.astype(np.float32)
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, positions):
+        rows = np.sort(self.indices[positions])
+        features = (np.asarray(self.X[rows], dtype=np.float32) - self.mean) / self.scale
+        target = np.asarray(self.y[rows], dtype=np.float32)
+        return torch.from_numpy(features), torch.from_numpy(target).unsqueeze(1)
+
+def make_loader(X, y, indices, scaler, batch_size, shuffle, seed=42):
+    """Build a DataLoader that yields vectorised mini-batches"""
+    dataset = EmissionBatches(X, y, indices, scaler)
+    if shuffle:
+        generator = torch.Generator().manual_seed(seed)
+        sampler = RandomSampler(range(len(indices)), generator=generator)
+    else:
+        sampler = range(len(indices))
+    batches = BatchSampler(sampler, batch_size=batch_size, drop_last=False)
+    return DataLoader(dataset, sampler=batches, batch_size=None)
+
+def evaluate(model, loader, criterion):
+    """Mean loss over a loader, weighted by batch size"""
+    model.eval()
+    total, count = 0.0, 0
+    with torch.no_grad():
+        for features, target in loader:
+            total += criterion(model(features), target).item() * len(target)
+            count += len(target)
+    return total / max(count, 1)
+
+def configure_threads(threads=None):
+    """Let torch use every available core for the matrix multiplies"""
+    threads = threads or os.cpu_count() or 1
+    torch.set_num_threads(threads)
+    return threads
+
+def fit_model(model, X, y, train_idx, val_idx, scaler, lr=0.001, batch_size=256,
+              max_epochs=200, patience=15, seed=42, verbose=True):
+    """Train with shuffled mini-batches and stop once validation loss stalls"""
+    torch.manual_seed(seed)
+    criterion = nn.MSELoss()
+    optimizer = torch.optim.Adam(model.parameters(), lr=lr)
+    train_loader = make_loader(X, y, train_idx, scaler, batch_size, shuffle=True, seed=seed)
+    val_loader = make_loader(X, y, val_idx, scaler, max(batch_size, 4096), shuffle=False)
+
+    best_val_loss = float('inf')
+    best_state = None
+    stale_epochs = 0
+    epochs_run = 0
+
+    for epoch in range(max_epochs):
+        # Training
+        model.train()
+        train_total, train_count = 0.0, 0
+        for features, target in train_loader:
+            optimizer.zero_grad()
+            loss = criterion(model(features), target)
+            loss.backward()
+            optimizer.step()
+            train_total += loss.item() * len(target)
+            train_count += len(target)
+        epochs_run = epoch + 1
+
+        # Validation after every epoch drives early stopping
+        val_loss = evaluate(model, val_loader, criterion)
+        if val_loss < best_val_loss:
+            best_val_loss = val_loss
+            best_state = {k: v.detach().clone() for k, v in model.state_dict().items()}
+            stale_epochs = 0
+        else:
+            stale_epochs += 1
+
+        if verbose and epochs_run % 10 == 0:
+            print(f'Epoch [{epochs_run}/{max_epochs}] - Train Loss: {train_total / max(train_count, 1):.4f}, '
+                  f'Val Loss: {val_loss:.4f}')
+
+        if stale_epochs >= patience:
+            if verbose:
+                print(f"Early stopping after {epochs_run} epochs (no improvement for {patience})")
+            break
+
+    # Keep the weights from the best validation epoch
+    if best_state is not None:
+        model.load_state_dict(best_state)
+
+    return best_val_loss, epochs_run
+
+def train_model(csv_path=DATASET_CSV, cache_dir=CACHE_DIR, hidden_sizes=(16, 8), lr=0.001,
+                batch_size=256, max_epochs=200, patience=15, threads=None, publish=False):
     """Train the neural network on emission data"""
     print("=== Training AI Model on Real Emission Data ===")
-    
+    print(f"Using {configure_threads(threads)} CPU threads")
+
     # Prepare data
-    X, y = prepare_data()
-    
-    # Split into train/test
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-    
+    X, y = prepare_data(csv_path, cache_dir)
+
+    # Split into train/validation
+    train_idx, val_idx = split_indices(len(X))
+
     # Scale features for better training
-    scaler = StandardScaler()
-    X_train_scaled = scaler.fit_transform(X_train)
-    X_test_scaled = scaler.transform(X_test)
-    
-    # Convert to PyTorch tensors
-    X_train_tensor = torch.FloatTensor(X_train_scaled)
-    y_train_tensor = torch.FloatTensor(y_train).unsqueeze(1)
-    X_test_tensor = torch.FloatTensor(X_test_scaled)
-    y_test_tensor = torch.FloatTensor(y_test).unsqueeze(1)
-    
+    scaler = fit_scaler(X, train_idx)
+
     # Initialize model
-    model = RouteScorer()
-    criterion = nn.MSELoss()
-    optimizer = torch.optim.Adam(model.parameters(), lr=0.001)
-    
+    model = RouteScorer(hidden_sizes)
+
     print("Training neural network...")
-    
-    # Training loop
-    epochs = 1000
-    best_test_loss = float('inf')
-    
-    for epoch in range(epochs):
-        # Training
-        model.train()
-        optimizer.zero_grad()
-        
-        outputs = model(X_train_tensor)
-        loss = criterion(outputs, y_train_tensor)
-        loss.backward()
-        optimizer.step()
-        
-        # Validation every 100 epochs
-        if (epoch + 1) % 100 == 0:
-            model.eval()
-            with torch.no_grad():
-                test_outputs = model(X_test_tensor)
-                test_loss = criterion(test_outputs, y_test_tensor)
-                
-                if test_loss < best_test_loss:
-                    best_test_loss = test_loss
-                
-                print(f'Epoch [{epoch+1}/{epochs}] - Train Loss: {loss.item():.4f}, Test Loss: {test_loss.item():.4f}')
-    
-    # Save trained model and scaler
-    torch.save(model.state_dict(), 'route_scorer.pt')
-    joblib.dump(scaler, 'feature_scaler.pkl')
-    
+    best_val_loss, _ = fit_model(model, X, y, train_idx, val_idx, scaler, lr=lr,
+                                 batch_size=batch_size, max_epochs=max_epochs, patience=patience)
+
+    # Save trained model and scaler where the registry falls back to them
+    torch.save(model.state_dict(), LEGACY_MODEL_PATH)
+    joblib.dump(scaler, LEGACY_SCALER_PATH)
+
     print(f"✅ Model training completed!")
-    print(f"✅ Best test loss: {best_test_loss:.4f}")
-    print(f"✅ Model saved as 'route_scorer.pt'")
-    print(f"✅ Scaler saved as 'feature_scaler.pkl'")
-    
+    print(f"✅ Best validation loss: {best_val_loss:.4f}")
+    print(f"✅ Model saved as '{LEGACY_MODEL_PATH}'")
+    print(f"✅ Scaler saved as '{LEGACY_SCALER_PATH}'")
+
+    # Publish a new registry version so running servers can hot-swap it in
+    if publish:
+        version = publish_model(model, scaler, meta={
+            'source_csv': os.path.abspath(csv_path),
+            'best_val_loss': best_val_loss,
+            'lr': lr,
+            'batch_size': batch_size
+        })
+        print(f"✅ Published model version {version} to {REGISTRY_DIR}")
+
     # Test with sample predictions
     test_predictions(model, scaler)
 
@@ -147,4 +281,18 @@ def test_predictions(model, scaler):
             print(f"{label}: {prediction:.2f} kg CO2")
 
 if __name__ == "__main__":
-    train_model()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Train the route CO2 scorer")
+    parser.add_argument('--csv', default=DATASET_CSV, help="Source emission CSV")
+    parser.add_argument('--cache-dir', default=CACHE_DIR, help="Directory for cached feature matrices")
+    parser.add_argument('--hidden', default='16,8', help="Comma-separated hidden layer widths")
+    parser.add_argument('--lr', type=float, default=0.001)
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--epochs', type=int, default=200, help="Maximum epochs before early stopping")
+    parser.add_argument('--patience', type=int, default=15, help="Epochs without validation improvement")
+    parser.add_argument('--threads', type=int, default=None, help="Torch threads (default: all cores)")
+    parser.add_argument('--publish', action='store_true', help="Also publish the model to the registry")
+    args = parser.parse_args()
+
+    hidden_sizes = tuple(int(w) for w in args.hidden.split(',') if w)
+    train_model(args.csv, args.cache_dir, hidden_sizes=hidden_sizes, lr=args.lr, batch_size=args.batch_size,
+                max_epochs=args.epochs, patience=args.patience, threads=args.threads, publish=args.publish)
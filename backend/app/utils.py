@@ -1,6 +1,6 @@
 import math
-import requests
-import time
+import numpy as np
+import kernels
 
 def haversine_distance(a, b):
     # a, b: dict with 'lat' and 'lon'
@@ -13,50 +13,99 @@ def haversine_distance(a, b):
     c = 2 * math.asin(math.sqrt(a_calc))
     return R * c
 
-def get_real_route(a, b):
-    """Get actual road route using free OSRM service"""
+def stop_coordinates(stops):
+    """Latitude and longitude arrays for a list of stop dicts"""
+    lats = np.fromiter((s['lat'] for s in stops), dtype=np.float64, count=len(stops))
+    lons = np.fromiter((s['lon'] for s in stops), dtype=np.float64, count=len(stops))
+    return lats, lons
+
+def haversine_matrix(stops):
+    """Pairwise great-circle distances (km) between all stops in one vectorized pass"""
+    return haversine_matrix_from_coords(*stop_coordinates(stops))
+
+def haversine_matrix_from_coords(lats, lons):
+    """Pairwise great-circle distances (km) from latitude and longitude arrays"""
+    if kernels.ENABLED:
+        return kernels.haversine_matrix(lats, lons)
+    lat = np.radians(lats)
+    lon = np.radians(lons)
+    dlat = lat[:, None] - lat[None, :]
+    dlon = lon[:, None] - lon[None, :]
+    a_calc = np.sin(dlat / 2) ** 2 + np.cos(lat)[:, None] * np.cos(lat)[None, :] * np.sin(dlon / 2) ** 2
+    return 2 * 6371 * np.arcsin(np.sqrt(np.clip(a_calc, 0.0, 1.0)))
+
+def haversine_row(point, lats, lons):
+    """Distances (km) from one point to many, for growing a matrix incrementally"""
+    lat1 = math.radians(point['lat'])
+    lat2 = np.radians(lats)
+    dlat = lat2 - lat1
+    dlon = np.radians(lons) - math.radians(point['lon'])
+    a_calc = np.sin(dlat / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * 6371 * np.arcsin(np.sqrt(np.clip(a_calc, 0.0, 1.0)))
+
+def haversine_pairs(lat1, lon1, lat2, lon2):
+    """Element-wise great-circle distances (km) between two sets of points"""
+    lat1, lat2 = np.radians(lat1), np.radians(lat2)
+    dlat = lat2 - lat1
+    dlon = np.radians(lon2) - np.radians(lon1)
+    a_calc = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * 6371 * np.arcsin(np.sqrt(np.clip(a_calc, 0.0, 1.0)))
+
+# Rough urban driving speed for fallback durations when the router is unavailable
+FALLBACK_SPEED_KMH = 30
+
+def fetch_road_segment(a, b, backend=None):
+    """Road distance (km), duration (s), (N, 2) [lon, lat] geometry and whether it is an estimate
+
+    Uses the given routing backend, or the deployment default, and falls back
+    to a detoured straight line when it has no route or fails.
+    """
     try:
-        # OSRM free service - no API key needed
-        url = f"http://router.project-osrm.org/route/v1/driving/{a['lon']},{a['lat']};{b['lon']},{b['lat']}"
-        params = {
-            'overview': 'full',
-            'geometries': 'geojson'
-        }
-        
-        response = requests.get(url, params=params, timeout=10)
+        if backend is None:
+            from routing_backends import get_backend
+            backend = get_backend()
+        segment = backend.route(a, b)
         
-        if response.status_code == 200:
-            data = response.json()
-            if data['routes']:
-                route = data['routes'][0]
-                # Distance in meters, convert to km
-                distance_km = route['distance'] / 1000
-                # Get actual road coordinates
-                coordinates = route['geometry']['coordinates']
-                # Convert to lat/lon format
-                waypoints = [{'lat': coord[1], 'lon': coord[0]} for coord in coordinates]
-                
-                print(f"Real routing: {distance_km:.2f}km via actual roads ({len(waypoints)} waypoints)")
-                return distance_km, waypoints
+        if segment is not None:
+            distance_km, duration_s, coordinates = segment
+            if backend.road_network:
+                print(f"Real routing: {distance_km:.2f}km via actual roads ({len(coordinates)} waypoints)")
+            return distance_km, duration_s, coordinates, False
         
         # Fallback
         straight_distance = haversine_distance(a, b)
         fallback_distance = straight_distance * 1.3
         print(f"Routing fallback: {fallback_distance:.2f}km (estimated)")
-        return fallback_distance, [a, b]
+        return fallback_distance, fallback_distance / FALLBACK_SPEED_KMH * 3600, straight_line(a, b), True
             
     except Exception as e:
         print(f"Routing error: {e}, using fallback")
         straight_distance = haversine_distance(a, b)
-        return straight_distance * 1.3, [a, b]
+        fallback_distance = straight_distance * 1.3
+        return fallback_distance, fallback_distance / FALLBACK_SPEED_KMH * 3600, straight_line(a, b), True
+
+def straight_line(a, b):
+    """Two-point geometry used when no road route is available"""
+    return np.array([[a['lon'], a['lat']], [b['lon'], b['lat']]], dtype=np.float64)
+
+def get_real_route(a, b, backend=None):
+    """Get actual road route from the configured routing backend"""
+    distance_km, _, coordinates, _ = fetch_road_segment(a, b, backend)
+    # Convert to lat/lon format
+    return distance_km, [{'lat': lat, 'lon': lon} for lon, lat in coordinates.tolist()]
 
 def road_aware_distance(a, b):
     """Get road distance (wrapper for compatibility)"""
     distance, _ = get_real_route(a, b)
     return distance
 
-def calculate_route_distance(route):
-    """Calculate total route distance using road-aware calculations"""
+def calculate_route_distance(route, segments=None):
+    """Calculate total route distance using road-aware calculations
+
+    With a SegmentStore, legs already routed in this request are reused.
+    """
+    if segments is not None:
+        return segments.route_distance(route)
     total_distance = 0
     
     for i in range(len(route) - 1):
@@ -0,0 +1,17 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+# Server processes on this node; serve.py sets it so per-process limits add up to the node's
+SERVER_WORKERS = max(1, int(os.environ.get('SERVER_WORKERS', '1')))
+# Solver processes per server process, so all server workers together use each core about once
+SOLVER_PROCESSES = int(os.environ.get('SOLVER_PROCESSES', str(max(1, (os.cpu_count() or 1) // SERVER_WORKERS))))
+
+# One pool per process, created on first use and shared by all CPU-bound solvers
+_pool = None
+
+def get_process_pool():
+    """Lazily created process pool, this server process's share of the machine"""
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=SOLVER_PROCESSES)
+    return _pool
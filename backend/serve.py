@@ -0,0 +1,124 @@
+"""Production entry point: preload once, then fork uvicorn workers on one shared socket
+
+The parent imports torch, loads the model and builds the emission tables
+before forking, so workers share those pages copy-on-write instead of each
+holding its own copy. Road segments, recent responses, plan sessions and
+admission stats go to a SQLite (WAL) cache that every worker reads and
+writes, so any worker can serve any plan. Model reloads are broadcast
+through the registry, admission limits and solver pools are split across
+the workers so they hold for the node, and dead workers are replaced.
+
+    cd backend && python serve.py --workers 4 --port 8000
+"""
+import os
+import gc
+import sys
+import time
+import signal
+import socket
+import argparse
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app')
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Prefork server for the green routing API")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--shared-cache', default=os.path.join(APP_DIR, '.shared_cache.sqlite'),
+                        help="SQLite file for the cross-worker segment and result cache")
+    parser.add_argument('--backlog', type=int, default=2048)
+    parser.add_argument('--log-level', default='info')
+    return parser.parse_args()
+
+def bind_socket(host, port, backlog):
+    sock = socket.socket(socket.AF_INET6 if ':' in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+# How often workers check for reload requests when not following new versions
+RELOAD_POLL_S = float(os.environ.get('MODEL_RELOAD_POLL_S', '2'))
+
+def run_worker(app, sock, log_level, watch_interval, model_registry, admission, shared_cache):
+    import uvicorn
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    # Threads don't survive fork, so each worker runs its own model watcher and stats publisher.
+    # The watcher always applies reload requests made through any worker.
+    model_registry.start_watcher(watch_interval if watch_interval > 0 else RELOAD_POLL_S,
+                                 follow_newest=watch_interval > 0)
+    if shared_cache is not None:
+        admission.start_publisher(shared_cache)
+    server = uvicorn.Server(uvicorn.Config(app, log_level=log_level))
+    server.run(sockets=[sock])
+
+def main():
+    args = parse_args()
+    # Settings read at import time must be in place before the app is preloaded
+    os.environ.setdefault('SHARED_CACHE_PATH', args.shared_cache)
+    # Admission lanes and solver pools divide the node's limits by this
+    os.environ['SERVER_WORKERS'] = str(args.workers)
+    # OpenMP thread pools started before fork can deadlock in the children
+    os.environ.setdefault('OMP_NUM_THREADS', '1')
+    watch_interval = float(os.environ.pop('MODEL_WATCH_INTERVAL', '0'))
+    # Modules inside app/ import each other by bare name
+    sys.path.insert(0, APP_DIR)
+
+    import torch
+    torch.set_num_threads(1)
+    from app.main import app, model_registry, admission, shared_cache
+
+    sock = bind_socket(args.host, args.port, args.backlog)
+    # Keep the preloaded heap out of the collector so workers don't touch (and copy) it
+    gc.freeze()
+    print(f"🏭 Preloaded model {model_registry.current().version}; forking {args.workers} workers "
+          f"on {args.host}:{args.port}")
+
+    workers = {}
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            try:
+                run_worker(app, sock, args.log_level, watch_interval, model_registry, admission, shared_cache)
+            finally:
+                os._exit(0)
+        workers[pid] = time.monotonic()
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(args.workers):
+        spawn()
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        started = workers.pop(pid, None)
+        if started is None or stopping:
+            continue
+        print(f"⚠️  Worker {pid} exited with status {status}; restarting")
+        # Don't spin if workers die straight after starting
+        if time.monotonic() - started < 1.0:
+            time.sleep(1.0)
+        spawn()
+    sock.close()
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,9 @@ export interface Location {
   lat: number
   lon: number
   name?: string
+  // Minutes from the start of the route: [opens, closes]
+  time_window?: [number, number]
+  service_minutes?: number
 }
 
 export interface OptimizeRequest {
@@ -9,11 +12,81 @@ export interface OptimizeRequest {
   vehicle_type: string
   fuel_type: string
   traffic_conditions: string
+  time_budget_ms?: number
+  metaheuristic?: "annealing" | "genetic"
+  metaheuristic_starts?: number
+  routing_backend?: string
+  // "columns" returns route_geometry arrays instead of route_waypoints
+  geometry_format?: "waypoints" | "columns"
+  // Also return the CO2 / distance / duration trade-off front
+  pareto?: boolean
+}
+
+export interface SearchStats {
+  time_budget_ms: number | null
+  used_ms: number
+  final_length_km: number
+  // Anytime search
+  budget_used?: number
+  iterations?: number
+  improvements?: number
+  construction_length_km?: number
+  time_warp_minutes?: number
+  // Metaheuristic multistart
+  method?: string
+  starts?: number
+  best_seed?: number
+  start_lengths_km?: number[]
+  // Pareto search
+  tours?: number
+  archive_size?: number
+  front_size?: number
+}
+
+export interface ScheduleVisit {
+  arrival_minutes: number
+  service_start_minutes: number
+  departure_minutes: number
+  late_minutes: number
+}
+
+export interface Schedule {
+  feasible: boolean
+  late_stops: number
+  total_late_minutes: number
+  finish_minutes: number
+  visits: ScheduleVisit[]
+}
+
+export interface RouteGeometryColumns {
+  lats: number[]
+  lons: number[]
+  // Leg k spans points leg_offsets[k]..leg_offsets[k + 1]
+  leg_offsets: number[]
+}
+
+// Present when the server has DEM tiles; grade_co2 is already in predicted_co2
+export interface ElevationProfile {
+  climb_m: number
+  descent_m: number
+  grade_co2: number
+  leg_climb_m: number[]
+  leg_descent_m: number[]
+}
+
+export interface ParetoRoute {
+  route_mapping: number[]
+  predicted_co2: number
+  total_distance: number
+  duration_minutes: number
+  // Objectives this route is best at within the front
+  best_for: ("co2_kg" | "distance_km" | "duration_min")[]
 }
 
 export interface OptimizeResponse {
   best_route: Location[]
-  route_waypoints: Location[]
+  route_waypoints?: Location[]
+  route_geometry?: RouteGeometryColumns
   route_mapping: number[]
   predicted_co2: number
   total_distance: number
@@ -24,6 +97,11 @@ export interface OptimizeResponse {
     derived_engine_size: number
     derived_speed: number
   }
+  search?: SearchStats
+  schedule?: Schedule
+  elevation?: ElevationProfile
+  // Greenest first; the top-level route is its first entry
+  pareto_front?: ParetoRoute[]
 }
 
 const API_BASE_URL = "http://localhost:8000"